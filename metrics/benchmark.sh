@@ -0,0 +1,3 @@
+#!/bin/sh
+cd $VIRTUAL_ENV/src
+python manage.py benchmark --output $VIRTUAL_ENV/metrics/benchmarks.jsonl
@@ -1,4 +1,5 @@
 #!/bin/sh
 $VIRTUAL_ENV/metrics/lint.sh
 $VIRTUAL_ENV/metrics/test.sh
+$VIRTUAL_ENV/metrics/benchmark.sh
 $VIRTUAL_ENV/metrics/report.sh
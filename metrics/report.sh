@@ -2,4 +2,5 @@
 
 tail -n 2 -v $VIRTUAL_ENV/metrics/pylint/*.txt | grep -E -v '^[[:space:]]*$'
 tail -c 6 -v $VIRTUAL_ENV/metrics/coverage.txt
+tail -n 1 -v $VIRTUAL_ENV/metrics/benchmarks.jsonl
 
@@ -0,0 +1,3 @@
+#!/bin/sh
+cd $VIRTUAL_ENV/src
+python manage.py request_report --output $VIRTUAL_ENV/metrics/requests.txt
@@ -0,0 +1 @@
+default_app_config = 'photo.apps.PhotoConfig' #pylint: disable=invalid-name
@@ -2,23 +2,72 @@
 Admin classes for photo application
 """
 
+from django import forms
 from django.contrib import admin
 from django.contrib.admin.filters import RelatedOnlyFieldListFilter
+from django.core.exceptions import ValidationError
+from django.utils.html import format_html
 
+from photo.compatibility import compatibility
+from photo.contacts import crop_url
+from photo.derivatives import derivative_url
+from photo.imports import create_frames
 from photo.models import FilmFormat, Manufacturer, Film, Developer, FilmRoll, \
-    PhotoPaper, PhotoPaperFinish, Frame, Print, Enlarger
+    PhotoPaper, PhotoPaperFinish, Frame, Print, Enlarger, ScanMetadata
 
 
+def add_frames_action(count, double_zero=False):
+    """
+    Build an admin action that adds a full range of frames to film rolls.
+
+    Args:
+        count: the number of numbered frames to add to each roll.
+        double_zero: whether to add frame 00 to each roll.
+    """
+    def add_frames(modeladmin, request, queryset):
+        """Add frames to the selected film rolls."""
+        frames = create_frames(queryset, count, double_zero)
+        modeladmin.message_user(request,
+                                "Added {} frames.".format(len(frames)))
+
+    if double_zero:
+        add_frames.__name__ = 'add_frames_00_{}'.format(count)
+        add_frames.short_description = "Add frames 00-{}".format(count)
+    else:
+        add_frames.__name__ = 'add_frames_{}'.format(count)
+        add_frames.short_description = "Add frames 1-{}".format(count)
+    return add_frames
+
+def thumbnail_column(field_name, description):
+    """
+    Build an admin list column showing a thumbnail of an image field.
+
+    Args:
+        field_name: the name of the image field.
+        description: the column heading.
+    """
+    def thumbnail(obj):
+        """Thumbnail of an image field, for display in admin lists."""
+        field_file = getattr(obj, field_name)
+        if not field_file:
+            return ""
+        return format_html('<img src="{}" alt="">',
+                           derivative_url(field_file, 'thumbnail'))
+
+    thumbnail.short_description = description
+    return thumbnail
+
 class FilmAdmin(admin.ModelAdmin):
     """
     Admin class for :model:`photo.Film`
     """
     list_display = ('film_short_name', 'manufacturer_short_name', 'speed',)
     list_filter = ('manufacturer', 'speed', 'formats', 'process')
+    list_select_related = ('manufacturer',)
 
     def film_short_name(self, obj):
         """Short name of film, for display in admin lists."""
-        return "%s %s" % (obj.manufacturer.short_name, obj.name)
+        return obj.display_name
 
     def manufacturer_short_name(self, obj):
         """Short name of film manufacturer, for display in admin lists."""
@@ -36,9 +85,13 @@ class FilmRollAdmin(admin.ModelAdmin):
     """
     Admin class for :model:`photo.FilmRoll`
     """
-    list_display = ('name', 'film', 'format', 'shot_date', 'developed_date')
+    list_display = ('name', 'film', 'format', 'shot_date', 'developed_date',
+                    thumbnail_column('contact_sheet', "Contact sheet"))
     list_filter = ('film', 'format', 'shot_date', 'developed_date',)
+    list_select_related = ('film', 'format')
     prepopulated_fields = {'developed_speed': ('shot_speed',)}
+    actions = [add_frames_action(12), add_frames_action(24),
+               add_frames_action(36), add_frames_action(36, double_zero=True)]
 
     def get_changeform_initial_data(self, request):
         initial = super().get_changeform_initial_data(request)
@@ -51,9 +104,11 @@ class PhotoPaperAdmin(admin.ModelAdmin):
     """
     list_display = ('name', 'manufacturer_short_name', 'multigrade', 'grade')
     list_filter = ('manufacturer', 'multigrade',)
+    list_select_related = ('manufacturer',)
+
     def paper_short_name(self, obj):
         """Short name of photo paper, for display in admin lists."""
-        return "%s %s" % (obj.manufacturer.short_name, obj.name)
+        return obj.display_name
 
     def manufacturer_short_name(self, obj):
         """
@@ -70,19 +125,103 @@ class FrameAdmin(admin.ModelAdmin):
     """
     Admin class for :model:`photo.Frame`
     """
-    list_display = ('film_roll', 'frame_number', 'description')
+    list_display = ('film_roll', 'frame_number', 'description', 'preview')
     list_filter = (('film_roll', RelatedOnlyFieldListFilter),
                    'film_roll__format', 'film_roll__film',
                    'film_roll__shot_date', 'film_roll__developed_date')
+    list_select_related = ('film_roll',)
 
     def frame_number(self, obj):
         """Wrap the frame_number method as a method of FrameAdmin"""
         return obj.frame_number()
 
+    def preview(self, obj):
+        """
+        Thumbnail of the frame's scan, or else its crop from the roll's
+        contact sheet, for display in admin lists.
+        """
+        if obj.scan:
+            url = derivative_url(obj.scan, 'thumbnail')
+        elif obj.film_roll.contact_sheet:
+            url = crop_url(obj)
+        else:
+            return ""
+        return format_html('<img src="{}" alt="">', url)
+
     frame_number.admin_order_field = 'index'
+    preview.short_description = "Scan"
 
     ordering = ('film_roll', 'index')
 
+class PrintAdminForm(forms.ModelForm):
+    """
+    Admin form for :model:`photo.Print`, which only offers the finishes the
+    chosen paper comes in, and the enlargers that take the chosen frame's
+    format, using :data:`photo.compatibility.compatibility`.
+    """
+    class Meta:
+        """Meta class for PrintAdminForm"""
+        model = Print
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        paper_id = self.chosen_id('paper')
+        if paper_id is not None and 'finish' in self.fields:
+            self.limit_choices('finish',
+                               compatibility.finishes_for_paper(paper_id))
+        frame_id = self.chosen_id('frame')
+        if frame_id is not None and 'enlarger' in self.fields:
+            format_id = Frame.objects.filter(pk=frame_id).values_list(
+                'film_roll__format_id', flat=True).first()
+            self.limit_choices('enlarger',
+                               compatibility.enlargers_for_format(format_id))
+
+    def chosen_id(self, name):
+        """
+        Return the id of the object chosen for a foreign key, from the
+        submitted data or else the initial data, or None if there is none.
+        """
+        value = self.data.get(self.add_prefix(name)) if self.is_bound \
+            else self.initial.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return Print._meta.get_field(name).related_model._meta.pk \
+                .to_python(value)
+        except ValidationError:
+            return None
+
+    def limit_choices(self, name, ids):
+        """
+        Limit a foreign key's choices to objects with the given ids.
+        """
+        field = self.fields[name]
+        field.queryset = field.queryset.filter(pk__in=ids)
+        # the admin's related widget wrapper keeps the original choices on
+        # the widget it wraps
+        wrapped = getattr(field.widget, 'widget', None)
+        if wrapped is not None:
+            wrapped.choices = field.widget.choices
+
+class PrintAdmin(admin.ModelAdmin):
+    """
+    Admin class for :model:`photo.Print`
+    """
+    form = PrintAdminForm
+    list_display = ('__str__', 'frame', 'paper', 'finish', 'enlarger',
+                    thumbnail_column('scan', "Scan"))
+    list_select_related = ('frame', 'paper', 'finish', 'enlarger')
+
+class ScanMetadataAdmin(admin.ModelAdmin):
+    """
+    Admin class for :model:`photo.ScanMetadata`
+    """
+    list_display = ('name', 'kind', 'width', 'height', 'mode', 'bits',
+                    'dpi_x', 'scanner', 'file_size')
+    list_filter = ('kind', 'bits', 'mode', 'format')
+    search_fields = ('name', 'scanner', 'content_hash')
+
 # Register your models here.
 admin.site.register(FilmFormat)
 admin.site.register(Manufacturer)
@@ -92,5 +231,6 @@ admin.site.register(FilmRoll, FilmRollAdmin)
 admin.site.register(PhotoPaper, PhotoPaperAdmin)
 admin.site.register(PhotoPaperFinish)
 admin.site.register(Frame, FrameAdmin)
-admin.site.register(Print)
+admin.site.register(Print, PrintAdmin)
 admin.site.register(Enlarger)
+admin.site.register(ScanMetadata, ScanMetadataAdmin)
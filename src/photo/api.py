@@ -0,0 +1,232 @@
+"""
+Read-only JSON API for the photo catalog.
+
+Each resource is listed in a fixed, unique order, and paginated by cursor:
+a page ends with a ``next`` cursor encoding the ordering values of its last
+row, and the next page selects the rows after those values. Unlike offset
+pagination, every page is a single indexed range query, however deep into
+the catalog it is. Rows are read with ``values_list()`` and streamed as they
+are serialized, without building model instances.
+"""
+import base64
+from collections import OrderedDict
+import json
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST, require_safe
+
+from . import similarity
+from .models import Film, FilmRoll, Frame, PhotoPaper, Print
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_SIMILAR_LIMIT = 100
+
+
+class Resource(object):
+    """
+    A model exposed through the API.
+    """
+    def __init__(self, model, fields, ordering):
+        """
+        Args:
+            model: the model class.
+            fields: a sequence of (key, lookup) tuples, giving the JSON key
+                and the values() lookup of each field.
+            ordering: the lookups to order and paginate by, which together
+                must be unique.
+        """
+        self.model = model
+        self.keys = [key for key, _ in fields]
+        self.lookups = [lookup for _, lookup in fields]
+        self.ordering = list(ordering)
+
+    def page(self, cursor=None, limit=DEFAULT_LIMIT):
+        """
+        Get a queryset of the rows of a page, as tuples of the ordering
+        values followed by the field values. One more row than the limit is
+        selected, to tell whether there is a next page.
+
+        Args:
+            cursor: the ordering values of the last row of the previous page,
+                or None for the first page.
+            limit: the number of rows in the page.
+        """
+        queryset = self.model.objects.order_by(*self.ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(cursor))
+        return queryset.values_list(*(self.ordering + self.lookups))[
+            :limit + 1]
+
+    def after(self, cursor):
+        """
+        Build a filter for the rows after a cursor in the resource ordering.
+
+        Args:
+            cursor: the ordering values of the last row of the previous page.
+        """
+        if len(cursor) != len(self.ordering):
+            raise ValueError("Invalid cursor")
+        condition = Q()
+        for index, lookup in enumerate(self.ordering):
+            equal = {self.ordering[previous]: cursor[previous]
+                     for previous in range(index)}
+            equal[lookup + '__gt'] = cursor[index]
+            condition |= Q(**equal)
+        return condition
+
+
+RESOURCES = {
+    'films': Resource(
+        Film,
+        (('id', 'id'), ('name', 'name'),
+         ('manufacturer', 'manufacturer__short_name'), ('speed', 'speed'),
+         ('process', 'process')),
+        ('manufacturer__short_name', 'name', 'id')),
+    'papers': Resource(
+        PhotoPaper,
+        (('id', 'id'), ('name', 'name'),
+         ('manufacturer', 'manufacturer__short_name'),
+         ('paper_type', 'paper_type'), ('multigrade', 'multigrade'),
+         ('grade', 'grade')),
+        ('manufacturer__short_name', 'name', 'id')),
+    'film-rolls': Resource(
+        FilmRoll,
+        (('id', 'id'), ('name', 'name'), ('film', 'film_id'),
+         ('format', 'format__name'), ('developer', 'developer_id'),
+         ('shot_speed', 'shot_speed'), ('developed_speed', 'developed_speed'),
+         ('shot_date', 'shot_date'), ('developed_date', 'developed_date'),
+         ('contact_sheet', 'contact_sheet')),
+        ('name',)),
+    'frames': Resource(
+        Frame,
+        (('id', 'id'), ('film_roll', 'film_roll_id'),
+         ('film_roll_name', 'film_roll__name'), ('index', 'index'),
+         ('description', 'description'), ('scan', 'scan')),
+        ('film_roll__name', 'index')),
+    'prints': Resource(
+        Print,
+        (('id', 'id'), ('date', 'date'), ('sequence', 'sequence'),
+         ('frame', 'frame_id'), ('paper', 'paper_id'),
+         ('finish', 'finish__name'), ('enlarger', 'enlarger__name'),
+         ('scan', 'scan')),
+        ('date', 'sequence')),
+}
+
+encoder = DjangoJSONEncoder() #pylint: disable=invalid-name
+
+
+def encode_cursor(values):
+    """
+    Encode the ordering values of a row as an opaque cursor string.
+    """
+    return base64.urlsafe_b64encode(encoder.encode(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor string into ordering values, raising ValueError if it is
+    invalid or holds anything other than scalar values.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not all(
+            value is None or isinstance(value, (str, int, float))
+            for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+def stream_page(resource, rows, limit):
+    """
+    Serialize a page of rows as JSON, one row at a time.
+    """
+    ordering_length = len(resource.ordering)
+    yield '{"results": ['
+    last = None
+    for count, row in enumerate(rows):
+        if count == limit:
+            break
+        if last is not None:
+            yield ', '
+        last = row[:ordering_length]
+        yield encoder.encode(OrderedDict(zip(resource.keys,
+                                             row[ordering_length:])))
+    else:
+        # the extra row past the limit was not found, so this is the last page
+        last = None
+    yield '], "next": {}}}'.format(
+        encoder.encode(None if last is None else encode_cursor(last)))
+
+@require_safe
+@staff_member_required
+def catalog_list(request, resource_name):
+    """
+    List a page of a catalog resource as JSON.
+
+    Query parameters:
+        cursor: the next cursor from the previous page.
+        limit: the number of rows per page, up to MAX_LIMIT.
+
+    Args:
+        resource_name: the name of the resource, ie frames.
+    """
+    try:
+        resource = RESOURCES[resource_name]
+    except KeyError:
+        raise Http404("Unknown resource")
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        if limit < 1:
+            raise ValueError("Invalid limit")
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            cursor = decode_cursor(cursor)
+        rows = resource.page(cursor, limit)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except ValidationError:
+        return JsonResponse({'error': "Invalid cursor"}, status=400)
+    return StreamingHttpResponse(stream_page(resource, rows.iterator(), limit),
+                                 content_type='application/json')
+
+@require_POST
+@staff_member_required
+def similar_scans(request):
+    """
+    Find the frame and print scans most similar to an uploaded image, by
+    their perceptual hashes, as JSON.
+
+    Form fields:
+        image: the image file.
+        algorithm: the hash to compare, ahash, dhash or phash.
+        distance: the largest number of differing bits.
+        limit: the number of scans to return, up to MAX_SIMILAR_LIMIT.
+        kind: the kind of scan to return, frame or print; may be repeated.
+    """
+    image_file = request.FILES.get('image')
+    if image_file is None:
+        return JsonResponse({'error': "No image"}, status=400)
+    try:
+        algorithm = request.POST.get('algorithm',
+                                     similarity.DEFAULT_ALGORITHM)
+        distance = int(request.POST.get('distance',
+                                        similarity.DEFAULT_DISTANCE))
+        limit = min(int(request.POST.get('limit', similarity.DEFAULT_LIMIT)),
+                    MAX_SIMILAR_LIMIT)
+        if distance < 0 or limit < 1:
+            raise ValueError("Invalid distance or limit")
+        value, results = similarity.find_similar(
+            image_file, algorithm, distance, limit,
+            request.POST.getlist('kind') or None)
+    except OSError:
+        return JsonResponse({'error': "Invalid image"}, status=400)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'algorithm': algorithm,
+                         'hash': similarity.format_hash(value),
+                         'results': results})
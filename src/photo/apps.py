@@ -9,3 +9,7 @@ class PhotoConfig(AppConfig):
     Default config for the photo application.
     """
     name = 'photo'
+
+    def ready(self):
+        # connect signal handlers
+        from . import signals # pylint: disable=unused-variable
@@ -0,0 +1,347 @@
+"""
+Micro-benchmarks for the photo application.
+
+Benchmarks are registered with the :func:`benchmark` decorator, and run with
+the ``benchmark`` management command. Each benchmark returns a list of
+``(label, seconds)`` tuples. Benchmarks registered with ``database=True`` run
+against a throwaway test database seeded with a synthetic catalog.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+import random
+import threading
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import OperationalError, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, \
+    teardown_test_environment
+
+from .imports import import_film_rolls, import_prints
+from .models import FilmRoll, Frame, PendingDerivative, Print
+from .synthetic import CatalogGenerator
+from .utils import PointMultiplierTable, StopTimeConversion
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, database=False):
+    """
+    Register a function as a named benchmark.
+
+    Args:
+        name: the name used to select the benchmark from the command line.
+        database: whether the benchmark needs a seeded database.
+    """
+    def register(function):
+        function.database = database
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+def best_of(function, repeat=5, number=1):
+    """
+    Time a callable, returning the best time for a single run.
+
+    Args:
+        function: the callable to time.
+        repeat: how many times to repeat the measurement.
+        number: how many calls make up one measurement.
+    """
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+def time_once(function):
+    """
+    Time a single call of a callable.
+
+    Args:
+        function: the callable to time.
+    """
+    start = timeit.default_timer()
+    function()
+    return timeit.default_timer() - start
+
+@contextmanager
+def benchmark_database(name=None):
+    """
+    Run the enclosed block against a freshly migrated test database, which is
+    destroyed afterwards, so benchmarks never touch the real catalog.
+
+    Args:
+        name: the test database name, if not the default; for SQLite, giving
+            a file name puts the database on disk rather than in memory.
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0,
+                                                  autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+
+CHANGELISTS = (
+    ('frames', 'admin:photo_frame_changelist', {}),
+    ('frames by format', 'admin:photo_frame_changelist',
+     {'film_roll__format__id__exact': 1}),
+    ('frames by film', 'admin:photo_frame_changelist',
+     {'film_roll__film__id__exact': 1}),
+    ('frames by shot date', 'admin:photo_frame_changelist',
+     {'film_roll__shot_date__gte': '2000-03-01',
+      'film_roll__shot_date__lt': '2000-04-01'}),
+    ('film rolls by developed date', 'admin:photo_filmroll_changelist',
+     {'developed_date__gte': '2000-03-01',
+      'developed_date__lt': '2000-04-01'}),
+    ('prints', 'admin:photo_print_changelist', {}),
+)
+
+# the indexes added for the admin changelists, as (model, fields, suffix)
+# tuples; the suffix is the one Django names the index with
+ADMIN_INDEXES = (
+    (FilmRoll, ('developed_date',), ''),
+    (FilmRoll, ('shot_date',), ''),
+    (FilmRoll, ('film', 'shot_date'), '_idx'),
+    (FilmRoll, ('format', 'shot_date'), '_idx'),
+    (Frame, ('film_roll', 'index'), '_idx'),
+)
+
+def _index_names(editor, model, fields):
+    """
+    Find the names of the indexes on exactly the columns of some fields.
+    """
+    columns = [model._meta.get_field(name).column for name in fields]
+    # pylint: disable=protected-access
+    return editor._constraint_names(model, columns, index=True)
+
+@contextmanager
+def without_admin_indexes():
+    """
+    Drop the indexes in :data:`ADMIN_INDEXES` for the enclosed block, and
+    create them again afterwards. Only these indexes are changed, so the rest
+    of the schema stays at the latest migration.
+    """
+    # pylint: disable=protected-access
+    with connection.schema_editor() as editor:
+        for model, fields, _ in ADMIN_INDEXES:
+            for name in _index_names(editor, model, fields):
+                editor.execute(editor._delete_constraint_sql(
+                    editor.sql_delete_index, model, name))
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, fields, suffix in ADMIN_INDEXES:
+                if not _index_names(editor, model, fields):
+                    editor.execute(editor._create_index_sql(
+                        model, [model._meta.get_field(name)
+                                for name in fields], suffix=suffix))
+
+@benchmark('changelists', database=True)
+def changelist_times(repeat=3):
+    """
+    Time the admin changelists in :data:`CHANGELISTS`, returning a list of
+    ``(label, seconds)`` tuples with the best time of the whole request, and
+    the time spent in SQL queries during it.
+
+    Args:
+        repeat: how many times to request each changelist.
+    """
+    user, _ = User.objects.get_or_create(
+        username='benchmark', defaults={'is_staff': True,
+                                        'is_superuser': True})
+    client = Client()
+    client.force_login(user)
+    results = []
+    for label, url_name, params in CHANGELISTS:
+        url = reverse(url_name)
+
+        def request():
+            return client.get(url, params)
+
+        results.append((label, best_of(request, repeat=repeat)))
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        results.append(('{}, queries'.format(label),
+                        sum(float(query['time']) for query in queries)))
+    return results
+
+@benchmark('stop_time_batch')
+def stop_time_batch(size=10000):
+    """
+    Compare the batch StopTimeConversion methods with a loop over the scalar
+    methods.
+
+    Args:
+        size: the number of exposure times to convert.
+    """
+    rng = random.Random(0)
+    times = [rng.uniform(1, 60) for _ in range(size)]
+    stops = [rng.uniform(-3, 3) for _ in range(size)]
+    points = [rng.randint(-36, 36) for _ in range(size)]
+
+    def scalar_stops():
+        return [StopTimeConversion.adjust_time_by_stops(time, stop)
+                for time, stop in zip(times, stops)]
+
+    def batch_stops():
+        return StopTimeConversion.adjust_times_by_stops(times, stops)
+
+    def scalar_points():
+        return [StopTimeConversion.adjust_time_by_points(time, point)
+                for time, point in zip(times, points)]
+
+    def batch_points():
+        return StopTimeConversion.adjust_times_by_points(times, points)
+
+    return [
+        ('adjust_time_by_stops loop', best_of(scalar_stops)),
+        ('adjust_times_by_stops', best_of(batch_stops)),
+        ('adjust_time_by_points loop', best_of(scalar_points)),
+        ('adjust_times_by_points', best_of(batch_points)),
+    ]
+
+@benchmark('point_multiplier_table')
+def point_multiplier_table(size=10000):
+    """
+    Compare StopTimeConversion.adjust_time_by_points with and without the
+    points multiplier lookup table.
+
+    Args:
+        size: the number of exposure times to adjust.
+    """
+    rng = random.Random(0)
+    times = [rng.uniform(1, 60) for _ in range(size)]
+    points = [rng.randint(-72, 72) / 2 for _ in range(size)]
+
+    def adjust():
+        return [StopTimeConversion.adjust_time_by_points(time, point)
+                for time, point in zip(times, points)]
+
+    saved_table = StopTimeConversion.point_table
+    try:
+        StopTimeConversion.point_table = None
+        exact = best_of(adjust)
+        StopTimeConversion.point_table = PointMultiplierTable()
+        table = best_of(adjust)
+    finally:
+        StopTimeConversion.point_table = saved_table
+
+    return [
+        ('adjust_time_by_points, exact', exact),
+        ('adjust_time_by_points, lookup table', table),
+    ]
+
+@benchmark('model_clean', database=True)
+def model_clean(size=200):
+    """
+    Time model validation of existing film rolls and prints, per object.
+
+    Args:
+        size: the number of objects of each model to validate.
+    """
+    film_rolls = list(FilmRoll.objects.select_related('film')[:size])
+    prints = list(Print.objects.select_related('frame')[:size])
+
+    def clean(objects):
+        for obj in objects:
+            obj.clean()
+
+    def full_clean(objects):
+        for obj in objects:
+            obj.full_clean()
+
+    results = []
+    for label, objects in (('FilmRoll', film_rolls), ('Print', prints)):
+        count = max(len(objects), 1)
+        results.append(('{}.clean'.format(label),
+                        best_of(partial(clean, objects)) / count))
+        results.append(('{}.full_clean'.format(label),
+                        best_of(partial(full_clean, objects)) / count))
+    return results
+
+@benchmark('bulk_ingest', database=True)
+def bulk_ingest(rolls=100, repeat=3):
+    """
+    Time importing film rolls, with their frames, and then their prints, as
+    the import commands do.
+
+    Args:
+        rolls: the number of film rolls in each import.
+        repeat: how many imports to time; each imports new rolls.
+    """
+    generator = CatalogGenerator(seed=1, name_prefix='I')
+    roll_times = []
+    print_times = []
+    for _ in range(repeat):
+        roll_rows, print_rows = generator.import_rows(rolls)
+        roll_times.append(time_once(partial(import_film_rolls, roll_rows)))
+        print_times.append(time_once(partial(import_prints, print_rows)))
+    return [
+        ('import_film_rolls, {} rolls'.format(rolls), min(roll_times)),
+        ('import_prints, {} rolls'.format(rolls), min(print_times)),
+    ]
+
+def concurrent_writes(writers=4, writes=100, readers=2):
+    """
+    Time several threads committing small write transactions at once, each
+    on its own connection, while other threads read the catalog. Returns the
+    number of transactions committed per second, and the number that failed
+    because the database stayed locked.
+
+    Args:
+        writers: the number of writing threads.
+        writes: the number of transactions each writer commits.
+        readers: the number of reading threads.
+    """
+    frame_ids = list(Frame.objects.values_list('pk', flat=True)[:1000])
+    PendingDerivative.objects.filter(name__startswith='load/').delete()
+    failures = []
+    writing = threading.Event()
+
+    def write(number):
+        rng = random.Random(number)
+        try:
+            for write_number in range(writes):
+                try:
+                    with transaction.atomic():
+                        Frame.objects.filter(pk=rng.choice(frame_ids)).update(
+                            description="write {}".format(write_number))
+                        PendingDerivative.objects.create(
+                            name="load/{}/{}".format(number, write_number))
+                except OperationalError:
+                    failures.append(number)
+        finally:
+            connection.close()
+
+    def read():
+        try:
+            while writing.is_set():
+                list(FilmRoll.objects.order_by('-shot_date')[:100])
+                Print.objects.count()
+        finally:
+            connection.close()
+
+    writing.set()
+    reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=write, args=(number,))
+                      for number in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    start = timeit.default_timer()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = timeit.default_timer() - start
+    writing.clear()
+    for thread in reader_threads:
+        thread.join()
+    return (writers * writes - len(failures)) / elapsed, len(failures)
@@ -0,0 +1,108 @@
+"""
+Which finishes each paper comes in, and which formats each enlarger takes.
+
+The many-to-many tables behind these rules are small and rarely change, so
+they are loaded once into sets, and reloaded after the signal handlers in
+:mod:`photo.signals` invalidate them, when the change is made and again when
+it is committed. Other processes' copies are not invalidated, so each copy
+is also reloaded after PHOTO_COMPATIBILITY_TIMEOUT seconds.
+"""
+import threading
+from timeit import default_timer
+
+from django.apps import apps
+from django.conf import settings
+
+# seconds a loaded copy of the tables is used for
+DEFAULT_TIMEOUT = 60
+
+
+class Compatibility(object):
+    """
+    In-memory copy of the paper finish and enlarger format tables.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = None
+        self._loaded = None
+
+    def invalidate(self):
+        """
+        Discard the loaded tables, so they are reloaded when next used.
+        """
+        with self._lock:
+            self._tables = None
+
+    def load(self):
+        """
+        Load the tables, unless a current copy is already loaded, and return
+        them as dictionaries of paper finishes, enlarger formats and format
+        enlargers.
+        """
+        timeout = getattr(settings, 'PHOTO_COMPATIBILITY_TIMEOUT',
+                          DEFAULT_TIMEOUT)
+        with self._lock:
+            if self._tables is None or \
+                    default_timer() - self._loaded > timeout:
+                # models are looked up here, as models.py uses this module
+                paper_finishes = {}
+                for paper_id, finish_id in apps.get_model(
+                        'photo', 'PhotoPaper').finishes.through.objects \
+                        .values_list('photopaper_id', 'photopaperfinish_id'):
+                    paper_finishes.setdefault(paper_id, set()).add(finish_id)
+                enlarger_formats = {}
+                format_enlargers = {}
+                for enlarger_id, format_id in apps.get_model(
+                        'photo', 'Enlarger').formats.through.objects \
+                        .values_list('enlarger_id', 'filmformat_id'):
+                    enlarger_formats.setdefault(enlarger_id, set()).add(
+                        format_id)
+                    format_enlargers.setdefault(format_id, set()).add(
+                        enlarger_id)
+                self._tables = (paper_finishes, enlarger_formats,
+                                format_enlargers)
+                self._loaded = default_timer()
+            return self._tables
+
+    def finishes_for_paper(self, paper_id):
+        """
+        Return the set of ids of the finishes a paper comes in.
+
+        Args:
+            paper_id: the id of a :model:`photo.PhotoPaper`.
+        """
+        return frozenset(self.load()[0].get(paper_id, ()))
+
+    def formats_for_enlarger(self, enlarger_id):
+        """
+        Return the set of ids of the film formats an enlarger takes.
+
+        Args:
+            enlarger_id: the id of an :model:`photo.Enlarger`.
+        """
+        return frozenset(self.load()[1].get(enlarger_id, ()))
+
+    def enlargers_for_format(self, format_id):
+        """
+        Return the set of ids of the enlargers that take a film format.
+
+        Args:
+            format_id: the id of a :model:`photo.FilmFormat`.
+        """
+        return frozenset(self.load()[2].get(format_id, ()))
+
+    def paper_has_finish(self, paper_id, finish_id):
+        """
+        Return whether a paper comes in a finish.
+        """
+        return finish_id in self.load()[0].get(paper_id, ())
+
+    def enlarger_takes_format(self, enlarger_id, format_id):
+        """
+        Return whether an enlarger takes a film format.
+        """
+        return format_id in self.load()[1].get(enlarger_id, ())
+
+
+compatibility = Compatibility() # pylint: disable=invalid-name
@@ -0,0 +1,342 @@
+"""
+Previews of frames cut from their roll's contact sheet, for frames that have
+not been scanned.
+
+The negatives of a roll are contact printed in strips laid one under another,
+so a contact sheet is a grid with a row for each strip, and the roll's
+:model:`photo.FilmFormat` gives the number of frames in a strip and their
+shape. The strips are found from where the sheet differs from its
+background, a row of pixels at a time, and then their extent along the
+strip; each strip is divided evenly into frames, and each frame's crop is
+trimmed to the frame's shape. Where the strips cannot be found, the area the
+negatives cover is divided evenly instead.
+
+Crops are cached under a ``crops`` directory next to the contact sheet, ie
+``contacts/crops/<uuid>.<key>/<frame number>.jpg`` for
+``contacts/<uuid>.tif``. The key depends on the contact sheet file, the
+layout and the roll's frames, so a changed sheet or roll gets new crops and
+the stale ones are removed. Crops are cut by the ``slice_contact_sheets``
+command, or on first request.
+
+Settings:
+    PHOTO_CONTACT_CROP_SIZE: the maximum (width, height) of the crops,
+        defaulting to :data:`DEFAULT_CROP_SIZE`.
+"""
+import glob
+import math
+import os
+import shutil
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from PIL import Image
+
+from .derivatives import DerivativeCache, derivative_key, save_jpeg
+
+DEFAULT_CROP_SIZE = (400, 400)
+
+# frames per strip when a roll film format does not give it
+DEFAULT_FRAMES_PER_STRIP = 6
+
+CROP_DIRECTORY = 'crops'
+
+# the long edge contact sheets are analysed at
+ANALYSIS_SIZE = 1200
+
+# how far a pixel must differ from the background to be part of a negative,
+# and the fraction of a row or column that must be, to be part of a strip;
+# the last strip of a roll may hold a single frame, so this is low
+PIXEL_THRESHOLD = 40
+LINE_THRESHOLD = 0.08
+
+# the smallest strip found, as a fraction of the tallest
+MIN_STRIP = 0.4
+
+
+def sheet_layout(film_format):
+    """
+    Get the frames per strip, and the width to height ratio of a frame or
+    None if it is not known, of a film format.
+
+    Args:
+        film_format: a :model:`photo.FilmFormat`.
+    """
+    frames_per_strip = film_format.frames_per_strip or (
+        DEFAULT_FRAMES_PER_STRIP if film_format.roll_film else 1)
+    aspect = None
+    if film_format.frame_width and film_format.frame_height:
+        aspect = film_format.frame_width / film_format.frame_height
+    return frames_per_strip, aspect
+
+def frame_number(index):
+    """
+    Get the number printed on the film for a frame's index.
+    """
+    return "00" if index == -1 else str(index)
+
+def _runs(profile, threshold):
+    """
+    Find the runs of a profile above a threshold, as (start, end) pairs.
+    """
+    runs = []
+    start = None
+    for position, value in enumerate(profile):
+        if value > threshold and start is None:
+            start = position
+        elif value <= threshold and start is not None:
+            runs.append((start, position))
+            start = None
+    if start is not None:
+        runs.append((start, len(profile)))
+    return runs
+
+def _merge_runs(runs, count):
+    """
+    Merge the runs separated by the smallest gaps until there are no more
+    than a count of them.
+    """
+    runs = list(runs)
+    while len(runs) > count:
+        gap = min(range(len(runs) - 1),
+                  key=lambda number: runs[number + 1][0] - runs[number][1])
+        runs[gap:gap + 2] = [(runs[gap][0], runs[gap + 1][1])]
+    return runs
+
+def _profiles(mask):
+    """
+    Get the fraction of each row, and of each column, of a mask that is set.
+    """
+    width, height = mask.size
+    rows = mask.tobytes()
+    columns = mask.transpose(Image.ROTATE_90).tobytes()
+    return ([sum(rows[row * width:(row + 1) * width]) / 255 / width
+             for row in range(height)],
+            [sum(columns[column * height:(column + 1) * height]) / 255 /
+             height for column in reversed(range(width))])
+
+def _background(image):
+    """
+    Estimate the background level of a grayscale contact sheet from the
+    median of its outermost pixels.
+    """
+    width, height = image.size
+    edges = []
+    for box in ((0, 0, width, 1), (0, height - 1, width, height),
+                (0, 0, 1, height), (width - 1, 0, width, height)):
+        edges.extend(image.crop(box).getdata())
+    edges.sort()
+    return edges[len(edges) // 2]
+
+def _fit_aspect(box, aspect):
+    """
+    Shrink a box about its centre to a width to height ratio.
+    """
+    left, upper, right, lower = box
+    width, height = right - left, lower - upper
+    if aspect is None or not width or not height:
+        return box
+    if width / height > aspect:
+        inset = (width - height * aspect) / 2
+        return left + inset, upper, right - inset, lower
+    inset = (height - width / aspect) / 2
+    return left, upper + inset, right, lower - inset
+
+def detect_grid(image, count, frames_per_strip, aspect=None):
+    """
+    Find the boxes of the frames on a contact sheet, in the order the frames
+    are on the roll, as (left, upper, right, lower) tuples in the sheet's
+    coordinates.
+
+    Args:
+        image: the contact sheet, as a grayscale PIL image.
+        count: the number of frames on the sheet.
+        frames_per_strip: the number of frames in each strip.
+        aspect: the width to height ratio of a frame, or None to keep the
+            whole of each frame's share of its strip.
+    """
+    if not count:
+        return []
+    width, height = image.size
+    strips = int(math.ceil(count / frames_per_strip))
+    background = _background(image)
+    mask = image.point(lambda value: 255 if abs(value - background) >
+                       PIXEL_THRESHOLD else 0)
+
+    runs = _runs(_profiles(mask)[0], LINE_THRESHOLD)
+    if runs:
+        longest = max(lower - upper for upper, lower in runs)
+        runs = _merge_runs([run for run in runs if run[1] - run[0] >=
+                            MIN_STRIP * longest], strips)
+    if len(runs) != strips:
+        # divide the area the negatives cover evenly
+        upper, lower = (runs[0][0], runs[-1][1]) if runs else (0, height)
+        runs = [(upper + (lower - upper) * strip / strips,
+                 upper + (lower - upper) * (strip + 1) / strips)
+                for strip in range(strips)]
+
+    # the first strip is the longest, and gives the frame pitch
+    extents = []
+    for upper, lower in runs:
+        columns = _runs(_profiles(mask.crop(
+            (0, int(upper), width, int(math.ceil(lower)))))[1],
+                        LINE_THRESHOLD)
+        extents.append((columns[0][0], columns[-1][1]) if columns
+                       else (0, width))
+    pitch = (extents[0][1] - extents[0][0]) / min(count, frames_per_strip)
+    boxes = []
+    for (upper, lower), (start, _) in zip(runs, extents):
+        for frame in range(frames_per_strip):
+            if len(boxes) == count:
+                break
+            boxes.append(_fit_aspect(
+                (start + pitch * frame, upper,
+                 start + pitch * (frame + 1), lower), aspect))
+    return boxes
+
+def slice_sheet(source_path, directory, indexes, frames_per_strip,
+                aspect=None, size=DEFAULT_CROP_SIZE):
+    """
+    Cut a contact sheet into a JPEG crop of each frame, named by its frame
+    number, in a directory.
+
+    Args:
+        source_path: the path of the contact sheet.
+        directory: the directory to write the crops to.
+        indexes: the indexes of the roll's frames, in order.
+        frames_per_strip: the number of frames in each strip.
+        aspect: the width to height ratio of a frame, or None.
+        size: the maximum (width, height) of the crops.
+    """
+    with open(source_path, 'rb') as source_file:
+        sheet = Image.open(source_file)
+        sheet.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        if sheet.mode not in ('RGB', 'L'):
+            sheet = sheet.convert('RGB')
+        else:
+            sheet.load()
+    analysis = sheet.convert('L')
+    analysis.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.ANTIALIAS)
+    scale = sheet.size[0] / analysis.size[0]
+    boxes = detect_grid(analysis, len(indexes), frames_per_strip, aspect)
+
+    os.makedirs(directory, exist_ok=True)
+    for index, box in zip(indexes, boxes):
+        crop = sheet.crop(tuple(int(round(value * scale)) for value in box))
+        crop.thumbnail(size, Image.ANTIALIAS)
+        save_jpeg(crop, os.path.join(directory, "{}.jpg".format(
+            frame_number(index))))
+
+
+class ContactCropCache(object):
+    """
+    Cache of frame crops of contact sheets under a media root.
+    """
+
+    def __init__(self, root=None, size=None):
+        """
+        Args:
+            root: the media root; defaults to the MEDIA_ROOT setting.
+            size: the maximum (width, height) of the crops; defaults to the
+                PHOTO_CONTACT_CROP_SIZE setting.
+        """
+        self.sources = DerivativeCache(root, sizes={}, max_size=0)
+        self.root = self.sources.root
+        self.size = tuple(size or getattr(settings, 'PHOTO_CONTACT_CROP_SIZE',
+                                          DEFAULT_CROP_SIZE))
+
+    def crop_directory(self, name, indexes, frames_per_strip, aspect):
+        """
+        Get the absolute path of the directory of the current crops of a
+        contact sheet.
+
+        Args:
+            name: the name of the contact sheet, relative to the media root.
+            indexes: the indexes of the roll's frames, in order.
+            frames_per_strip: the number of frames in each strip.
+            aspect: the width to height ratio of a frame, or None.
+        """
+        source_path = self.sources.source_path(name)
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        key = derivative_key(source_path, self.size + (
+            frames_per_strip, aspect, ','.join(str(index)
+                                               for index in indexes)))
+        return os.path.join(os.path.dirname(source_path), CROP_DIRECTORY,
+                            "{}.{}".format(stem, key))
+
+    def is_cached(self, name, indexes, frames_per_strip, aspect):
+        """
+        Check whether the crops of a contact sheet are cached.
+        """
+        directory = self.crop_directory(name, indexes, frames_per_strip,
+                                        aspect)
+        return all(os.path.exists(os.path.join(
+            directory, "{}.jpg".format(frame_number(index))))
+                   for index in indexes)
+
+    def slice(self, name, indexes, frames_per_strip, aspect):
+        """
+        Cut the crops of a contact sheet, returning their directory, and
+        remove stale crops.
+
+        Args:
+            name: the name of the contact sheet, relative to the media root.
+            indexes: the indexes of the roll's frames, in order.
+            frames_per_strip: the number of frames in each strip.
+            aspect: the width to height ratio of a frame, or None.
+        """
+        directory = self.crop_directory(name, indexes, frames_per_strip,
+                                        aspect)
+        slice_sheet(self.sources.source_path(name), directory, indexes,
+                    frames_per_strip, aspect, self.size)
+        self.remove_stale(directory)
+        return directory
+
+    def get(self, film_roll, index):
+        """
+        Get the path of the crop of a frame of a film roll, cutting the
+        roll's contact sheet if its crops are not cached. Raises ValueError
+        if the roll has no contact sheet or no such frame.
+
+        Args:
+            film_roll: a :model:`photo.FilmRoll`.
+            index: the index of the frame.
+        """
+        if not film_roll.contact_sheet:
+            raise ValueError("'{}' has no contact sheet".format(film_roll))
+        indexes = list(film_roll.frame_set.order_by('index').values_list(
+            'index', flat=True))
+        if index not in indexes:
+            raise ValueError("'{}' has no frame {}".format(
+                film_roll, frame_number(index)))
+        layout = sheet_layout(film_roll.format)
+        name = film_roll.contact_sheet.name
+        directory = self.crop_directory(name, indexes, *layout)
+        path = os.path.join(directory, "{}.jpg".format(frame_number(index)))
+        if not os.path.exists(path):
+            self.slice(name, indexes, *layout)
+        return path
+
+    @staticmethod
+    def remove_stale(directory):
+        """
+        Remove crops of the same contact sheet as a directory of crops, but
+        with a different key.
+        """
+        stem = os.path.basename(directory).split('.')[0]
+        pattern = os.path.join(os.path.dirname(directory),
+                               "{}.*".format(stem))
+        for stale_directory in glob.glob(pattern):
+            if stale_directory != directory:
+                shutil.rmtree(stale_directory, ignore_errors=True)
+
+
+def crop_url(frame):
+    """
+    Get the url of the crop of a frame from its roll's contact sheet.
+
+    Args:
+        frame: a :model:`photo.Frame`, whose roll has a contact sheet.
+    """
+    return reverse('photo:contact-crop', kwargs={
+        'name': frame.film_roll.contact_sheet.name,
+        'frame_number': frame.frame_number()})
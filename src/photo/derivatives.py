@@ -0,0 +1,349 @@
+"""
+Derivative images, such as thumbnails and previews, for scans and contact
+sheets.
+
+Derivatives are generated with Pillow on first request, and cached under a
+``derivatives`` directory next to their source, ie
+``frames/derivatives/<uuid>.<size>.<key>.jpg`` for ``frames/<uuid>.tif``.
+The key is derived from the source file's name, inode, length and
+modification time, so a changed or replaced source gets a new derivative and
+the stale one is removed. The key is not a hash of the source's content, as
+hashing a large scan on every request would cost more than rendering its
+thumbnail: a file rewritten in place with its length and modification time
+preserved keeps its old derivatives, and identical files have a derivative
+each.
+
+The total size of the cache is kept as a running total in a file under the
+media root, and when it goes over the maximum size, the least recently used
+derivatives are evicted; only then is the cache listed, and the total
+counted again.
+
+Settings:
+    PHOTO_DERIVATIVE_SIZES: a dictionary of size names to maximum (width,
+        height), defaulting to :data:`DEFAULT_SIZES`.
+    PHOTO_DERIVATIVE_CACHE_SIZE: the maximum total size of derivatives, in
+        bytes, defaulting to :data:`DEFAULT_CACHE_SIZE`.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import locks
+from django.core.urlresolvers import reverse
+from PIL import Image
+
+from .scans import reduced_image
+
+DEFAULT_SIZES = {
+    'thumbnail': (200, 200),
+    'preview': (1024, 1024),
+}
+DEFAULT_CACHE_SIZE = 1024 ** 3
+
+# upload paths, from the upload_to of the image fields, that have derivatives
+SOURCE_DIRECTORIES = ('contacts', 'frames', 'prints')
+DERIVATIVE_DIRECTORY = 'derivatives'
+USAGE_FILE = '.derivatives-usage'
+
+
+def get_sizes():
+    """Get the configured derivative sizes."""
+    return getattr(settings, 'PHOTO_DERIVATIVE_SIZES', DEFAULT_SIZES)
+
+def derivative_url(field_file, size_name):
+    """
+    Get the url of a derivative of an image field's file.
+
+    Args:
+        field_file: the file of a scan or contact sheet field.
+        size_name: the name of the derivative size.
+    """
+    return reverse('photo:derivative', kwargs={'size_name': size_name,
+                                               'name': field_file.name})
+
+def derivative_key(source_path, size):
+    """
+    Build the cache key for a derivative of a source file, which changes
+    whenever the source file is replaced, or modified in length or
+    modification time.
+
+    Args:
+        source_path: the absolute path of the source file.
+        size: the (width, height) of the derivative, or a tuple of the
+            other values it is rendered with.
+    """
+    stat = os.stat(source_path)
+    identity = "{}\0{}\0{}\0{}\0{}".format(
+        os.path.basename(source_path), stat.st_ino, stat.st_size,
+        stat.st_mtime_ns, 'x'.join(str(value) for value in size))
+    return hashlib.sha1(identity.encode()).hexdigest()[:16]
+
+def render(source_path, destination_path, size):
+    """
+    Render a derivative of a source image as a JPEG.
+
+    Args:
+        source_path: the path of the source image.
+        destination_path: the path to write the derivative to.
+        size: the maximum (width, height) of the derivative.
+    """
+    # large uncompressed scans are shrunk a band at a time, without decoding
+    # them whole
+    image = reduced_image(source_path, size)
+    if image is None:
+        with open(source_path, 'rb') as source_file:
+            image = Image.open(source_file)
+            # let JPEG sources decode at a reduced scale
+            image.draft('RGB', size)
+            image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.thumbnail(size, Image.ANTIALIAS)
+    save_jpeg(image, destination_path)
+
+def save_jpeg(image, destination_path):
+    """
+    Save an image as a JPEG, writing to a temporary file first, so a partly
+    written file is never served.
+
+    Args:
+        image: the PIL image.
+        destination_path: the path to write the JPEG to.
+    """
+    directory = os.path.dirname(destination_path)
+    handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temporary_file:
+            image.save(temporary_file, 'JPEG', quality=85)
+        os.replace(temporary_path, destination_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+class CacheUsage(object):
+    """
+    The running total size of a cache, in bytes, kept in a file that every
+    process using the cache shares, so the cache can tell when it is over
+    its maximum size without listing its files.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: the path of the file the total is kept in.
+        """
+        self.path = path
+
+    def _update(self, function):
+        """
+        Replace the total with the result of a function of it, holding a lock
+        on the file, and return the new total. The total is None while it is
+        not known.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a+') as usage_file:
+            locks.lock(usage_file, locks.LOCK_EX)
+            try:
+                usage_file.seek(0)
+                try:
+                    total = int(usage_file.read())
+                except ValueError:
+                    total = None
+                total = function(total)
+                usage_file.seek(0)
+                usage_file.truncate()
+                if total is not None:
+                    usage_file.write(str(total))
+                usage_file.flush()
+            finally:
+                locks.unlock(usage_file)
+        return total
+
+    def add(self, size):
+        """
+        Add a number of bytes to the total, returning the new total, or None
+        if it is not known.
+        """
+        return self._update(
+            lambda total: None if total is None else max(total + size, 0))
+
+    def set(self, total):
+        """
+        Set the total, once it has been counted.
+        """
+        self._update(lambda _: total)
+
+
+class DerivativeCache(object):
+    """
+    Cache of derivative images under a media root.
+    """
+
+    def __init__(self, root=None, sizes=None, max_size=None):
+        """
+        Args:
+            root: the media root; defaults to the MEDIA_ROOT setting.
+            sizes: a dictionary of size names to (width, height); defaults to
+                the PHOTO_DERIVATIVE_SIZES setting.
+            max_size: the maximum total size of cached derivatives, in bytes;
+                defaults to the PHOTO_DERIVATIVE_CACHE_SIZE setting.
+        """
+        self.root = os.path.abspath(root or settings.MEDIA_ROOT)
+        self.sizes = sizes or get_sizes()
+        if max_size is None:
+            max_size = getattr(settings, 'PHOTO_DERIVATIVE_CACHE_SIZE',
+                               DEFAULT_CACHE_SIZE)
+        self.max_size = max_size
+        self.usage = CacheUsage(os.path.join(self.root, USAGE_FILE))
+
+    def source_path(self, name):
+        """
+        Get the absolute path of a source file, checking it is in one of the
+        source directories.
+
+        Args:
+            name: the name of the source file, relative to the media root,
+                as stored in an image field.
+        """
+        path = os.path.normpath(os.path.join(self.root, name))
+        directory = os.path.relpath(os.path.dirname(path), self.root)
+        if directory not in SOURCE_DIRECTORIES:
+            raise ValueError("'{}' is not a scan or contact sheet".format(
+                name))
+        return path
+
+    def derivative_path(self, name, size_name):
+        """
+        Get the absolute path of the current derivative of a source file.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+            size_name: the name of the derivative size.
+        """
+        size = self.sizes[size_name]
+        source_path = self.source_path(name)
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(
+            os.path.dirname(source_path), DERIVATIVE_DIRECTORY,
+            "{}.{}.{}.jpg".format(stem, size_name,
+                                  derivative_key(source_path, size)))
+
+    def get(self, name, size_name, evict=True):
+        """
+        Get the path of a derivative of a source file, rendering it if it is
+        not cached.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+            size_name: the name of the derivative size.
+            evict: whether to evict old derivatives if one is rendered and
+                the cache is over its maximum size.
+        """
+        path = self.derivative_path(name, size_name)
+        if os.path.exists(path):
+            # mark the derivative as recently used
+            os.utime(path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        render(self.source_path(name), path, self.sizes[size_name])
+        total = self.usage.add(os.stat(path).st_size -
+                               self.remove_stale(path))
+        if evict and (total is None or total > self.max_size):
+            self.evict()
+        return path
+
+    def is_cached(self, name):
+        """
+        Check whether every size of derivative of a source file is cached.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+        """
+        return all(os.path.exists(self.derivative_path(name, size_name))
+                   for size_name in self.sizes)
+
+    def prerender(self, name):
+        """
+        Render every size of derivative of a source file that is not cached,
+        without evicting old derivatives.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+        """
+        for size_name in self.sizes:
+            self.get(name, size_name, evict=False)
+
+    def source_names(self):
+        """
+        Iterate over the names of all source files under the media root.
+        """
+        for directory in SOURCE_DIRECTORIES:
+            try:
+                entries = sorted(os.listdir(os.path.join(self.root,
+                                                         directory)))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                name = os.path.join(directory, entry)
+                if os.path.isfile(os.path.join(self.root, name)):
+                    yield name
+
+    @staticmethod
+    def remove_stale(path):
+        """
+        Remove derivatives of the same source and size as a derivative, but
+        with a different key, returning the number of bytes removed.
+
+        Args:
+            path: the path of the current derivative.
+        """
+        stem, size_name = os.path.basename(path).split('.')[:2]
+        pattern = os.path.join(os.path.dirname(path),
+                               "{}.{}.*.jpg".format(stem, size_name))
+        removed = 0
+        for stale_path in glob.glob(pattern):
+            if stale_path != path:
+                try:
+                    size = os.stat(stale_path).st_size
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    continue
+                removed += size
+        return removed
+
+    def cached_files(self):
+        """
+        List the cached derivatives, as (mtime, size, path) tuples.
+        """
+        files = []
+        for directory in SOURCE_DIRECTORIES:
+            pattern = os.path.join(self.root, directory, DERIVATIVE_DIRECTORY,
+                                   '*.jpg')
+            for path in glob.glob(pattern):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self):
+        """
+        Remove the least recently used derivatives until the cache is no
+        larger than its maximum size, and count its total size again.
+        """
+        files = self.cached_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.usage.set(total)
@@ -0,0 +1,53 @@
+"""
+Bulk maintenance of the denormalized display_name columns.
+
+See :class:`photo.models.DisplayNameMixin`. These functions update display
+names in SQL, without loading the objects.
+"""
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Concat
+
+from .models import Developer, Film, FilmRoll, Frame, Manufacturer, PhotoPaper
+
+# models whose display name is their manufacturer's short name and their name
+MANUFACTURER_PRODUCTS = (Film, Developer, PhotoPaper)
+
+
+def update_manufacturer_products(manufacturer):
+    """
+    Update the display names of a manufacturer's films, developers and
+    papers.
+
+    Args:
+        manufacturer: the :model:`photo.Manufacturer`.
+    """
+    for model in MANUFACTURER_PRODUCTS:
+        model.objects.filter(manufacturer=manufacturer).update(
+            display_name=Concat(Value(manufacturer.short_name + " "),
+                                F('name'), output_field=CharField()))
+
+def update_film_roll_frames(film_roll):
+    """
+    Update the display names of a film roll's frames.
+
+    Args:
+        film_roll: the :model:`photo.FilmRoll`.
+    """
+    frames = Frame.objects.filter(film_roll=film_roll)
+    frames.filter(index=-1).update(display_name=film_roll.name + "-00")
+    frames.exclude(index=-1).update(
+        display_name=Concat(Value(film_roll.name + "-"), F('index'),
+                            output_field=CharField()))
+
+def rebuild_all():
+    """
+    Rebuild every display name, returning the number of manufacturers and
+    film rolls whose products and frames were updated.
+    """
+    manufacturers = Manufacturer.objects.all()
+    for manufacturer in manufacturers.iterator():
+        update_manufacturer_products(manufacturer)
+    film_rolls = FilmRoll.objects.only('name')
+    for film_roll in film_rolls.iterator():
+        update_film_roll_frames(film_roll)
+    return manufacturers.count(), film_rolls.count()
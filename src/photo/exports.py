@@ -0,0 +1,155 @@
+"""
+Streaming export of the photo catalog as CSV or NDJSON.
+
+Each table is read in chunks by cursor, as in :mod:`photo.api`, with the
+names of related objects joined in SQL. Tables are ordered by columns of
+their own, which an index serves, so each chunk reads on from the last
+without sorting the rest of the table: frames are ordered by the id of their
+roll, not its name. Rows are written as they are read, so memory use does
+not grow with the size of the catalog. Column names match those read by
+:mod:`photo.imports` where they overlap.
+"""
+from collections import OrderedDict
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .api import Resource
+from .models import FilmRoll, Frame, Print
+
+CHUNK_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+
+
+def frame_number(index):
+    """
+    Convert a frame index to the frame number printed on the film, as
+    :model:`photo.Frame`.frame_number does.
+    """
+    return "00" if index == -1 else str(index)
+
+
+class Table(object):
+    """
+    A table of the catalog export.
+    """
+    def __init__(self, model, ordering, columns):
+        """
+        Args:
+            model: the model class.
+            ordering: the lookups to order and read in chunks by, which
+                together must be unique.
+            columns: a sequence of (name, lookups, formatter) tuples, where
+                formatter converts the values of the lookups to the value of
+                the column, or is None for a column with a single lookup.
+        """
+        self.columns = columns
+        self.headers = [name for name, _, _ in columns]
+        lookups = [lookup for _, column_lookups, _ in columns
+                   for lookup in column_lookups]
+        self.resource = Resource(model, [(lookup, lookup)
+                                         for lookup in lookups], ordering)
+
+    def format_row(self, values):
+        """
+        Convert the values of a row's lookups to an ordered dictionary of its
+        columns.
+        """
+        row = OrderedDict()
+        position = 0
+        for name, lookups, formatter in self.columns:
+            column_values = values[position:position + len(lookups)]
+            position += len(lookups)
+            if formatter is None:
+                row[name] = column_values[0]
+            else:
+                row[name] = formatter(*column_values)
+        return row
+
+    def rows(self, chunk_size=CHUNK_SIZE):
+        """
+        Iterate over the rows of the table, reading them in chunks.
+
+        Args:
+            chunk_size: the number of rows to read per query.
+        """
+        ordering_length = len(self.resource.ordering)
+        cursor = None
+        while True:
+            count = 0
+            for values in self.resource.page(cursor, chunk_size).iterator():
+                count += 1
+                if count > chunk_size:
+                    break
+                cursor = values[:ordering_length]
+                yield self.format_row(values[ordering_length:])
+            if count <= chunk_size:
+                return
+
+
+TABLES = OrderedDict((
+    ('rolls', Table(
+        FilmRoll, ('name',),
+        (('name', ('name',), None),
+         ('film', ('film__display_name',), None),
+         ('format', ('format__name',), None),
+         ('developer', ('developer__display_name',), None),
+         ('shot_speed', ('shot_speed',), None),
+         ('developed_speed', ('developed_speed',), None),
+         ('shot_date', ('shot_date',), None),
+         ('developed_date', ('developed_date',), None),
+         ('photographer', ('photographer__username',), None),
+         ('contact_sheet', ('contact_sheet',), None)))),
+    ('frames', Table(
+        Frame, ('film_roll_id', 'index'),
+        (('film_roll', ('film_roll__name',), None),
+         ('frame', ('index',), frame_number),
+         ('film', ('film_roll__film__display_name',), None),
+         ('format', ('film_roll__format__name',), None),
+         ('description', ('description',), None),
+         ('scan', ('scan',), None)))),
+    ('prints', Table(
+        Print, ('date', 'sequence'),
+        (('date', ('date',), None),
+         ('sequence', ('sequence',), None),
+         ('film_roll', ('frame__film_roll__name',), None),
+         ('frame', ('frame__index',), frame_number),
+         ('paper', ('paper__display_name',), None),
+         ('finish', ('finish__name',), None),
+         ('enlarger', ('enlarger__name',), None),
+         ('scan', ('scan',), None)))),
+))
+
+
+class _Echo(object): # pylint: disable=too-few-public-methods
+    """
+    File-like object that returns what is written to it, so csv.writer can
+    produce lines for a streaming response.
+    """
+    @staticmethod
+    def write(value):
+        """Return the value instead of writing it."""
+        return value
+
+def export_lines(table_name, file_format, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over the lines of an export of a table.
+
+    Args:
+        table_name: the name of the table, ie frames.
+        file_format: 'csv', or 'ndjson' for one JSON object per line.
+        chunk_size: the number of rows to read per query.
+    """
+    table = TABLES[table_name]
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(table.headers)
+        for row in table.rows(chunk_size):
+            yield writer.writerow(['' if value is None else value
+                                   for value in row.values()])
+    elif file_format == 'ndjson':
+        encoder = DjangoJSONEncoder()
+        for row in table.rows(chunk_size):
+            yield encoder.encode(row) + '\n'
+    else:
+        raise ValueError("Unknown export format '{}'".format(file_format))
@@ -0,0 +1,330 @@
+"""
+Bulk import of catalog data for the photo application.
+
+Rows are dictionaries, as read from CSV or JSON with :func:`read_rows`.
+Related objects are looked up by name, and all the lookups for an import are
+loaded up front, with the compatibility rules checked against
+:data:`photo.compatibility.compatibility`, so the number of queries an import
+makes does not grow with the number of rows.
+"""
+import csv
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .compatibility import compatibility
+from .models import Developer, Enlarger, Film, FilmFormat, FilmRoll, Frame, \
+    PhotoPaper, PhotoPaperFinish, Print
+
+
+def read_rows(stream, file_format):
+    """
+    Read import rows from a file.
+
+    Args:
+        stream: a text file object.
+        file_format: 'csv', for a CSV file with a header row, or 'json', for
+            a JSON list of objects.
+    """
+    if file_format == 'csv':
+        return list(csv.DictReader(stream))
+    if file_format == 'json':
+        return json.load(stream)
+    raise ValueError("Unknown import format '{}'".format(file_format))
+
+def parse_frame_number(frame_number):
+    """
+    Convert a frame number, as printed on the film, into a frame index. This
+    is the inverse of :model:`photo.Frame`.frame_number.
+    """
+    frame_number = str(frame_number).strip()
+    if frame_number == "00":
+        return -1
+    return int(frame_number)
+
+def parse_date(value):
+    """
+    Convert a date, or an ISO 8601 date string, into a date.
+    """
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value).strip(),
+                                      '%Y-%m-%d').date()
+
+def parse_bool(value):
+    """
+    Convert a boolean, or a string such as 'yes' or 'false', into a boolean.
+    """
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def frame_indexes(count, double_zero=False):
+    """
+    List the frame indexes on a roll, from 1 to count, preceded by frame 00
+    if the roll has one.
+
+    Args:
+        count: the number of numbered frames on the roll.
+        double_zero: whether the roll has a frame 00.
+    """
+    indexes = list(range(1, count + 1))
+    if double_zero:
+        indexes.insert(0, -1)
+    return indexes
+
+def create_frames(film_rolls, count, double_zero=False):
+    """
+    Create the :model:`photo.Frame` objects for film rolls with a single
+    insert, skipping any that already exist.
+
+    Args:
+        film_rolls: an iterable of :model:`photo.FilmRoll` to add frames to.
+        count: the number of numbered frames on each roll.
+        double_zero: whether each roll has a frame 00.
+    """
+    film_rolls = list(film_rolls)
+    existing = set(Frame.objects.filter(film_roll__in=film_rolls)
+                   .values_list('film_roll_id', 'index'))
+    frames = [_build_frame(index, film_roll)
+              for film_roll in film_rolls
+              for index in frame_indexes(count, double_zero)
+              if (film_roll.pk, index) not in existing]
+    with transaction.atomic():
+        return Frame.objects.bulk_create(frames)
+
+def import_film_rolls(rows):
+    """
+    Validate and create :model:`photo.FilmRoll` objects and all their
+    frames.
+
+    Each row has the keys name, film (the film as displayed, ie manufacturer
+    short name and film name), format and frames (the number of frames), and
+    optionally developer (as displayed), shot_speed, developed_speed,
+    shot_date, developed_date and double_zero (whether the roll has a frame
+    00).
+
+    All rows are validated before any are saved, and then rolls and frames
+    are each saved with a single insert, in one transaction. A
+    ValidationError listing every invalid row is raised if any row is
+    invalid.
+
+    Args:
+        rows: an iterable of dictionaries, one per roll.
+    """
+    rows = list(rows)
+
+    films = {film.display_name: film for film in Film.objects.all()}
+    formats = {film_format.name: film_format for film_format
+               in FilmFormat.objects.all()}
+    developers = {developer.display_name: developer for developer
+                  in Developer.objects.all()}
+    names = set(FilmRoll.objects.filter(
+        name__in=[str(row.get('name')).strip() for row in rows])
+                .values_list('name', flat=True))
+
+    film_rolls = []
+    frames = []
+    errors = []
+    for row_number, row in enumerate(rows, 1):
+        try:
+            film_roll = _build_film_roll(row, films, formats, developers)
+            if film_roll.name in names:
+                raise ValidationError("roll '{}' already exists".format(
+                    film_roll.name))
+            names.add(film_roll.name)
+            indexes = frame_indexes(int(row['frames']),
+                                    parse_bool(row.get('double_zero', '')))
+        except (KeyError, ValueError, ValidationError) as error:
+            errors.append("Row {}: {}".format(row_number,
+                                              _error_message(error)))
+            continue
+        film_rolls.append(film_roll)
+        frames.extend(_build_frame(index, film_roll) for index in indexes)
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        FilmRoll.objects.bulk_create(film_rolls)
+        Frame.objects.bulk_create(frames)
+    return film_rolls
+
+def import_prints(rows, session_date=None):
+    """
+    Validate and create :model:`photo.Print` objects for a printing session.
+
+    Each row has the keys film_roll (the roll name), frame (the frame number
+    as printed on the film), paper (the paper as displayed, ie manufacturer
+    short name and paper name), finish and, optionally, enlarger, date and
+    sequence. Rows without a sequence are numbered after the last existing
+    print on their date, in the order given.
+
+    All rows are validated before any are saved, and then numbered and saved
+    in a single transaction. A ValidationError listing every invalid row is
+    raised if any row is invalid, or if another import saves a print with
+    the same sequence first.
+
+    Args:
+        rows: an iterable of dictionaries, one per print.
+        session_date: the date for rows that do not specify one.
+    """
+    rows = list(rows)
+
+    papers = {paper.display_name: paper for paper
+              in PhotoPaper.objects.all()}
+    finishes = {finish.name: finish for finish
+                in PhotoPaperFinish.objects.all()}
+    enlargers = {enlarger.name: enlarger for enlarger
+                 in Enlarger.objects.all()}
+    roll_names = set(str(row.get('film_roll')).strip() for row in rows)
+    frames = {(frame.film_roll.name, frame.index): frame for frame
+              in Frame.objects.filter(film_roll__name__in=roll_names)
+              .select_related('film_roll')}
+
+    prints = []
+    errors = []
+    for row_number, row in enumerate(rows, 1):
+        try:
+            prints.append(_build_print(
+                row, session_date, papers, finishes, enlargers, frames))
+        except (KeyError, ValueError, ValidationError) as error:
+            errors.append("Row {}: {}".format(row_number,
+                                              _error_message(error)))
+
+    if errors:
+        raise ValidationError(errors)
+
+    try:
+        with transaction.atomic():
+            errors = _assign_sequences(prints)
+            if errors:
+                raise ValidationError(errors)
+            return Print.objects.bulk_create(prints)
+    except IntegrityError:
+        raise ValidationError("Prints were saved on the same dates during "
+                              "the import; import them again.")
+
+def _error_message(error):
+    """
+    Describe an error raised while building an object from an import row.
+    """
+    if isinstance(error, KeyError):
+        return "missing {}".format(error)
+    if isinstance(error, ValidationError):
+        return "; ".join(error.messages)
+    return str(error)
+
+def _lookup(mapping, name, description):
+    """
+    Look up a related object by name, raising ValidationError if there is no
+    match.
+    """
+    try:
+        return mapping[str(name).strip()]
+    except KeyError:
+        raise ValidationError("unknown {} '{}'".format(description, name))
+
+def _build_frame(index, film_roll):
+    """
+    Build an unsaved :model:`photo.Frame`, with its display name set as
+    saving it would, since bulk_create does not call save.
+    """
+    frame = Frame(index=index, film_roll=film_roll)
+    frame.display_name = frame.build_display_name()
+    return frame
+
+def _build_film_roll(row, films, formats, developers):
+    """
+    Build an unsaved :model:`photo.FilmRoll` from an import row.
+    """
+    film_roll = FilmRoll(
+        name=str(row['name']).strip(),
+        film=_lookup(films, row['film'], 'film'),
+        format=_lookup(formats, row['format'], 'format'))
+    if not film_roll.name:
+        raise ValidationError("no name")
+    if row.get('developer'):
+        film_roll.developer = _lookup(developers, row['developer'],
+                                      'developer')
+    for field in ('shot_speed', 'developed_speed'):
+        if row.get(field) not in (None, ''):
+            setattr(film_roll, field, int(row[field]))
+    for field in ('shot_date', 'developed_date'):
+        if row.get(field):
+            setattr(film_roll, field, parse_date(row[field]))
+    film_roll.clean()
+    return film_roll
+
+# pylint: disable=too-many-arguments
+def _build_print(row, session_date, papers, finishes, enlargers, frames):
+    """
+    Build an unsaved :model:`photo.Print` from an import row, applying the
+    same rules as Print.clean.
+    """
+    frame_key = (str(row['film_roll']).strip(),
+                 parse_frame_number(row['frame']))
+    try:
+        frame = frames[frame_key]
+    except KeyError:
+        raise ValidationError("unknown frame '{}-{}'".format(
+            row['film_roll'], row['frame']))
+    paper = _lookup(papers, row['paper'], 'paper')
+    finish = _lookup(finishes, row['finish'], 'finish')
+    enlarger = None
+    if row.get('enlarger'):
+        enlarger = _lookup(enlargers, row['enlarger'], 'enlarger')
+
+    if row.get('date'):
+        print_date = parse_date(row['date'])
+    elif session_date is not None:
+        print_date = parse_date(session_date)
+    else:
+        raise ValidationError("no date")
+    sequence = None
+    if row.get('sequence') not in (None, ''):
+        sequence = int(row['sequence'])
+
+    if not compatibility.paper_has_finish(paper.pk, finish.pk):
+        raise ValidationError("Invalid combination of paper and finish.")
+    if enlarger is not None:
+        if not compatibility.enlarger_takes_format(
+                enlarger.pk, frame.film_roll.format_id):
+            raise ValidationError("Invalid combination of negative and "
+                                  "enlarger")
+
+    return Print(date=print_date, sequence=sequence, frame=frame,
+                 paper=paper, finish=finish, enlarger=enlarger)
+
+def _assign_sequences(prints):
+    """
+    Number prints without a sequence after the last sequence on their date,
+    returning a list of errors for sequences that are already used.
+
+    The existing prints on the dates are locked, where the database supports
+    it, so concurrent imports for the same dates are numbered one after the
+    other; this must be called in a transaction.
+    """
+    dates = set(new_print.date for new_print in prints)
+    used = set(Print.objects.select_for_update().filter(date__in=dates)
+               .values_list('date', 'sequence'))
+    last = dict(Print.objects.filter(date__in=dates).values('date')
+                .annotate(last=Max('sequence')).values_list('date', 'last'))
+
+    errors = []
+    for new_print in prints:
+        if new_print.sequence is None:
+            continue
+        key = (new_print.date, new_print.sequence)
+        if key in used:
+            errors.append("Print {} already exists".format(new_print))
+        used.add(key)
+        last[new_print.date] = max(last.get(new_print.date, 0),
+                                   new_print.sequence)
+    for new_print in prints:
+        if new_print.sequence is None:
+            new_print.sequence = last.get(new_print.date, 0) + 1
+            last[new_print.date] = new_print.sequence
+    return errors
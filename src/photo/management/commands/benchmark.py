@@ -0,0 +1,92 @@
+"""
+Management command to run the photo application benchmarks.
+"""
+from collections import OrderedDict
+import datetime
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from photo.benchmarks import BENCHMARKS, benchmark_database
+from photo.synthetic import seed_catalog
+
+
+def git_commit():
+    """
+    Return the commit the source tree is checked out at, or None if it is not
+    known.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Runs the benchmarks registered in :mod:`photo.benchmarks`.
+
+    Benchmarks that need a database run against a test database seeded with
+    a synthetic catalog. With --output, the results are appended to a file as
+    a line of JSON, with the commit they were measured at.
+    """
+    help = "Run photo application benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*',
+                            help="Benchmarks to run; defaults to all of "
+                            "them.")
+        parser.add_argument('--rolls', type=int, default=1000,
+                            help="Number of synthetic film rolls to seed "
+                            "the database with.")
+        parser.add_argument('--output',
+                            help="File to append JSON results to.")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError("Unknown benchmark '{}'".format(name))
+
+        results = OrderedDict()
+        self.run([name for name in names if not BENCHMARKS[name].database],
+                 results)
+        database_names = [name for name in names
+                          if BENCHMARKS[name].database]
+        if database_names:
+            with benchmark_database():
+                self.stdout.write("seeding {} rolls: {} rolls, {} frames, "
+                                  "{} prints".format(
+                                      options['rolls'],
+                                      *seed_catalog(options['rolls'])))
+                self.run(database_names, results)
+
+        if options['output']:
+            record = OrderedDict([
+                ('commit', git_commit()),
+                ('date', datetime.datetime.utcnow().isoformat()),
+                ('python', platform.python_version()),
+                ('django', django.get_version()),
+                ('rolls', options['rolls']),
+                ('results', results),
+            ])
+            with open(options['output'], 'a') as output:
+                output.write(json.dumps(record) + '\n')
+
+    def run(self, names, results):
+        """
+        Run benchmarks, writing their times and adding them to results.
+        """
+        for name in names:
+            self.stdout.write(name)
+            results[name] = OrderedDict()
+            for label, seconds in BENCHMARKS[name]():
+                results[name][label] = seconds
+                self.stdout.write("    {:<40} {:10.3f} ms".format(
+                    label, seconds * 1000))
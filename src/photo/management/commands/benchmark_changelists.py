@@ -0,0 +1,37 @@
+"""
+Management command to time the admin changelists against a synthetic catalog,
+with and without the indexes added for them.
+"""
+from django.core.management.base import BaseCommand
+
+from photo.benchmarks import benchmark_database, changelist_times, \
+    without_admin_indexes
+from photo.synthetic import seed_catalog
+
+
+class Command(BaseCommand):
+    """
+    Seeds a synthetic catalog in a test database, and reports changelist
+    times without and with the admin indexes.
+    """
+    help = "Time admin changelists with and without the admin indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rolls', type=int, default=1000,
+                            help="Number of synthetic film rolls to create.")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Number of times to request each "
+                            "changelist.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seed_catalog(rolls=options['rolls'])
+            with without_admin_indexes():
+                before = changelist_times(options['repeat'])
+            after = changelist_times(options['repeat'])
+
+        self.stdout.write("{:<44} {:>10} {:>10}".format(
+            "changelist", "before", "after"))
+        for (label, old), (_, new) in zip(before, after):
+            self.stdout.write("    {:<40} {:7.1f} ms {:7.1f} ms".format(
+                label, old * 1000, new * 1000))
@@ -0,0 +1,34 @@
+"""
+Management command to export the photo catalog.
+"""
+from django.core.management.base import BaseCommand
+
+from photo.exports import CHUNK_SIZE, FORMATS, TABLES, export_lines
+
+
+class Command(BaseCommand):
+    """
+    Exports a table of the catalog as CSV or NDJSON, using
+    :func:`photo.exports.export_lines`.
+    """
+    help = "Export rolls, frames or prints as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(TABLES))
+        parser.add_argument('--format', choices=FORMATS, default='csv',
+                            help="The output format; defaults to csv.")
+        parser.add_argument('--output',
+                            help="The file to write; defaults to standard "
+                            "output.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="The number of rows to read per query.")
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['table'], options['format'],
+                             options['chunk_size'])
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
@@ -0,0 +1,82 @@
+"""
+Management command to extract the metadata of scans and contact sheets.
+"""
+import json
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+
+from photo.metadata import delete_owners, extract, replace_rows, \
+    stale_scans, stored_scans
+from photo.models import ScanMetadata
+
+
+def extract_scan(arguments):
+    """
+    Extract the metadata of one file, in a worker process.
+
+    Returns the kind, owner and name of the file, and its metadata, or an
+    error message. As with ``render_derivatives``, any exception is reported,
+    so one corrupt file does not stop the run.
+
+    Args:
+        arguments: a tuple of the kind, owner, name and path of the file.
+    """
+    kind, owner, name, path = arguments
+    try:
+        return kind, owner, name, extract(path)
+    except Exception as error: # pylint: disable=broad-except
+        return kind, owner, name, "{}: {}".format(type(error).__name__,
+                                                  error)
+
+
+class Command(BaseCommand):
+    """
+    Stores the metadata of every scan and contact sheet in
+    :model:`photo.ScanMetadata`, reading the files in a pool of worker
+    processes.
+
+    Files whose name, size and modification time match their stored metadata
+    are skipped, and metadata of objects that no longer have a file is
+    removed, so each run only reads new and changed files.
+    """
+    help = "Extract the metadata of scans and contact sheets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            help="The number of worker processes; defaults "
+                            "to the number of CPUs.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="How many files' metadata to save at a "
+                            "time.")
+        parser.add_argument('--all', action='store_true',
+                            help="Read every file, even if its metadata is "
+                            "current.")
+
+    def handle(self, *args, **options):
+        scans, removed, errors = stale_scans(stored_scans(ScanMetadata),
+                                             options['all'])
+        delete_owners(ScanMetadata, removed, options['batch_size'])
+        for name, error in errors:
+            self.stderr.write("{}: {}".format(name, error))
+
+        extracted = 0
+        batch = []
+        with Pool(options['processes']) as pool:
+            for kind, owner, name, metadata in pool.imap_unordered(
+                    extract_scan, scans):
+                if isinstance(metadata, str):
+                    self.stderr.write("{}: {}".format(name, metadata))
+                    continue
+                metadata['tags'] = json.dumps(metadata['tags'],
+                                              sort_keys=True)
+                batch.append(ScanMetadata(kind=kind, owner=owner, name=name,
+                                          **metadata))
+                extracted += 1
+                if len(batch) >= options['batch_size']:
+                    replace_rows(ScanMetadata, batch)
+                    batch = []
+        replace_rows(ScanMetadata, batch)
+        self.stdout.write("Extracted metadata of {} of {} changed files, "
+                          "removed {}.".format(extracted, len(scans),
+                                               len(removed)))
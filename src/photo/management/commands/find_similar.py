@@ -0,0 +1,44 @@
+"""
+Management command to find the scans most similar to an image.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from photo.models import ScanMetadata
+from photo.similarity import ALGORITHMS, DEFAULT_ALGORITHM, \
+    DEFAULT_DISTANCE, DEFAULT_LIMIT, find_similar, format_hash
+
+
+class Command(BaseCommand):
+    """
+    Hashes an image file and lists the frame and print scans whose stored
+    hashes are nearest to it, as computed by ``hash_scans``.
+    """
+    help = "Find the frame and print scans most similar to an image."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The image file to search for.")
+        parser.add_argument('--algorithm', choices=ALGORITHMS,
+                            default=DEFAULT_ALGORITHM,
+                            help="The hash to compare.")
+        parser.add_argument('--distance', type=int, default=DEFAULT_DISTANCE,
+                            help="The largest number of differing bits.")
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                            help="The largest number of scans to list.")
+        parser.add_argument('--kind', action='append',
+                            choices=[ScanMetadata.FRAME, ScanMetadata.PRINT],
+                            help="Only list scans of this kind; may be "
+                            "repeated.")
+
+    def handle(self, *args, **options):
+        try:
+            value, results = find_similar(
+                options['path'], options['algorithm'], options['distance'],
+                options['limit'], options['kind'])
+        except (OSError, ValueError) as error:
+            raise CommandError("{}: {}".format(options['path'], error))
+        self.stdout.write("{} {}".format(options['algorithm'],
+                                         format_hash(value)))
+        for result in results:
+            self.stdout.write("{distance:>3} {kind:<7} {owner} {name}".format(
+                **result))
+        self.stdout.write("Found {} similar scans.".format(len(results)))
@@ -0,0 +1,89 @@
+"""
+Management command to compute the perceptual hashes of frame and print scans.
+"""
+from multiprocessing import Pool
+import os
+
+from django.core.management.base import BaseCommand
+
+from photo.metadata import delete_owners, replace_rows, stale_scans, \
+    stored_scans
+from photo.models import ScanHash, ScanMetadata
+from photo.similarity import format_hash, image_hashes, index
+
+# the kinds of scan that are hashed
+HASHED_KINDS = (ScanMetadata.FRAME, ScanMetadata.PRINT)
+
+
+def hash_scan(arguments):
+    """
+    Hash one file, in a worker process.
+
+    Returns the kind, owner and name of the file, and a dictionary of its
+    hashes, file size and modification time, or an error message. Any
+    exception is reported, so one corrupt file does not stop the run.
+
+    Args:
+        arguments: a tuple of the kind, owner, name and path of the file.
+    """
+    kind, owner, name, path = arguments
+    try:
+        stat = os.stat(path)
+        hashes = {algorithm: format_hash(value) for algorithm, value
+                  in image_hashes(path).items()}
+    except Exception as error: # pylint: disable=broad-except
+        return kind, owner, name, "{}: {}".format(type(error).__name__,
+                                                  error)
+    hashes['file_size'] = stat.st_size
+    hashes['modified'] = stat.st_mtime
+    return kind, owner, name, hashes
+
+
+class Command(BaseCommand):
+    """
+    Stores the perceptual hashes of every frame and print scan in
+    :model:`photo.ScanHash`, hashing the files in a pool of worker processes.
+
+    As with ``extract_metadata``, files whose name, size and modification
+    time match their stored hashes are skipped, and hashes of objects that no
+    longer have a scan are removed.
+    """
+    help = "Compute the perceptual hashes of frame and print scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            help="The number of worker processes; defaults "
+                            "to the number of CPUs.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="How many files' hashes to save at a time.")
+        parser.add_argument('--all', action='store_true',
+                            help="Hash every file, even if its hashes are "
+                            "current.")
+
+    def handle(self, *args, **options):
+        scans, removed, errors = stale_scans(stored_scans(ScanHash),
+                                             options['all'], HASHED_KINDS)
+        delete_owners(ScanHash, removed, options['batch_size'])
+        for name, error in errors:
+            self.stderr.write("{}: {}".format(name, error))
+
+        hashed = 0
+        batch = []
+        with Pool(options['processes']) as pool:
+            for kind, owner, name, hashes in pool.imap_unordered(hash_scan,
+                                                                 scans):
+                if isinstance(hashes, str):
+                    self.stderr.write("{}: {}".format(name, hashes))
+                    continue
+                batch.append(ScanHash(kind=kind, owner=owner, name=name,
+                                      **hashes))
+                hashed += 1
+                if len(batch) >= options['batch_size']:
+                    replace_rows(ScanHash, batch)
+                    batch = []
+        replace_rows(ScanHash, batch)
+        # bulk_create and queryset deletes do not send the signals that
+        # invalidate the index
+        index.invalidate()
+        self.stdout.write("Hashed {} of {} changed files, removed {}.".format(
+            hashed, len(scans), len(removed)))
@@ -0,0 +1,40 @@
+"""
+Management command to import a printing session.
+"""
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from photo.imports import import_prints, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Imports :model:`photo.Print` rows from a CSV or JSON file, using
+    :func:`photo.imports.import_prints`.
+    """
+    help = "Import prints from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The file to import.")
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help="The file format; defaults to the file "
+                            "extension.")
+        parser.add_argument('--date',
+                            help="The session date, as YYYY-MM-DD, for rows "
+                            "that do not specify one.")
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format is None:
+            file_format = os.path.splitext(options['path'])[1][1:].lower()
+        try:
+            with open(options['path'], newline='') as stream:
+                rows = read_rows(stream, file_format)
+            prints = import_prints(rows, options['date'])
+        except ValidationError as error:
+            raise CommandError("\n".join(error.messages))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write("Imported {} prints.".format(len(prints)))
@@ -0,0 +1,37 @@
+"""
+Management command to import film rolls and their frames.
+"""
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from photo.imports import import_film_rolls, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Imports :model:`photo.FilmRoll` rows, and creates their frames, from a
+    CSV or JSON file, using :func:`photo.imports.import_film_rolls`.
+    """
+    help = "Import film rolls and their frames from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The file to import.")
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help="The file format; defaults to the file "
+                            "extension.")
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format is None:
+            file_format = os.path.splitext(options['path'])[1][1:].lower()
+        try:
+            with open(options['path'], newline='') as stream:
+                rows = read_rows(stream, file_format)
+            film_rolls = import_film_rolls(rows)
+        except ValidationError as error:
+            raise CommandError("\n".join(error.messages))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write("Imported {} film rolls.".format(len(film_rolls)))
@@ -0,0 +1,69 @@
+"""
+Management command to measure concurrent write throughput.
+"""
+import os
+import shutil
+import tempfile
+
+from django.db import connection, connections
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from photo.benchmarks import benchmark_database, concurrent_writes
+from photo.signals import SQLITE_PRAGMAS
+from photo.synthetic import seed_catalog
+
+# SQLite's own defaults, for comparison
+DEFAULT_SQLITE_PRAGMAS = (
+    ('journal_mode', 'delete'),
+    ('synchronous', 'full'),
+)
+
+
+class Command(BaseCommand):
+    """
+    Seeds a synthetic catalog in a test database, and measures how many write
+    transactions concurrent threads commit per second, using
+    :func:`photo.benchmarks.concurrent_writes`.
+
+    For SQLite the database is put on disk, and the test is run with SQLite's
+    default journal and synchronization, and then with the pragmas the
+    application sets.
+    """
+    help = "Measure concurrent write throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rolls', type=int, default=200,
+                            help="Number of synthetic film rolls to create.")
+        parser.add_argument('--writers', type=int, default=4,
+                            help="Number of writing threads.")
+        parser.add_argument('--writes', type=int, default=100,
+                            help="Number of transactions per writer.")
+        parser.add_argument('--readers', type=int, default=2,
+                            help="Number of reading threads.")
+
+    def handle(self, *args, **options):
+        name = None
+        runs = [("configured", None)]
+        directory = None
+        if connection.vendor == 'sqlite':
+            directory = tempfile.mkdtemp()
+            name = os.path.join(directory, 'load_test.sqlite3')
+            runs = [("SQLite defaults", DEFAULT_SQLITE_PRAGMAS),
+                    ("application pragmas", SQLITE_PRAGMAS)]
+        try:
+            with benchmark_database(name):
+                seed_catalog(rolls=options['rolls'])
+                for label, pragmas in runs:
+                    with override_settings(PHOTO_SQLITE_PRAGMAS=pragmas):
+                        for each in connections.all():
+                            each.close()
+                        rate, failures = concurrent_writes(
+                            options['writers'], options['writes'],
+                            options['readers'])
+                    self.stdout.write(
+                        "{:<24} {:10.1f} commits/s {:6} failed".format(
+                            label, rate, failures))
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory)
@@ -0,0 +1,22 @@
+"""
+Management command to rebuild the denormalized display names.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from photo.display_names import rebuild_all
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the display_name columns of films, developers, papers and
+    frames, using :func:`photo.display_names.rebuild_all`.
+    """
+    help = "Rebuild the display names of films, developers, papers and " \
+        "frames."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            manufacturers, film_rolls = rebuild_all()
+        self.stdout.write("Rebuilt display names for {} manufacturers and {} "
+                          "film rolls.".format(manufacturers, film_rolls))
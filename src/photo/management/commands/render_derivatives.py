@@ -0,0 +1,93 @@
+"""
+Management command to render derivative images ahead of their first request.
+"""
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from photo.derivatives import DerivativeCache
+from photo.models import PendingDerivative
+
+
+def prerender(arguments):
+    """
+    Render the derivatives of one source file, in a worker process.
+
+    Returns the name of the source file and an error message, or None if it
+    was rendered successfully. Pillow raises many kinds of exception on
+    corrupt files, so any exception is reported, rather than stopping the
+    whole run.
+
+    Args:
+        arguments: a tuple of the media root, the derivative sizes and the
+            name of the source file.
+    """
+    root, sizes, name = arguments
+    try:
+        DerivativeCache(root, sizes).prerender(name)
+    except Exception as error: # pylint: disable=broad-except
+        return name, "{}: {}".format(type(error).__name__, error)
+    return name, None
+
+
+class Command(BaseCommand):
+    """
+    Renders the derivatives of scans and contact sheets queued by
+    :model:`photo.PendingDerivative`, or of every file under MEDIA_ROOT, with
+    a pool of worker processes.
+
+    Rendered files are removed from the queue as they are finished, and
+    derivatives that are already cached are skipped, so an interrupted run
+    resumes where it left off.
+    """
+    help = "Render derivative images of scans and contact sheets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help="Render derivatives for every file under "
+                            "MEDIA_ROOT, not only queued files.")
+        parser.add_argument('--processes', type=int,
+                            help="The number of worker processes; defaults "
+                            "to the number of CPUs.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="How many finished files to remove from the "
+                            "queue at a time.")
+
+    def handle(self, *args, **options):
+        cache = DerivativeCache()
+        started = timezone.now()
+        names = list(PendingDerivative.objects.values_list('name',
+                                                           flat=True))
+        if options['backfill']:
+            queued = set(names)
+            names.extend(name for name in cache.source_names()
+                         if name not in queued and not cache.is_cached(name))
+
+        rendered = 0
+        finished = []
+        with Pool(options['processes']) as pool:
+            results = pool.imap_unordered(
+                prerender, ((cache.root, cache.sizes, name) for name in names))
+            for name, error in results:
+                if error is None:
+                    rendered += 1
+                else:
+                    self.stderr.write("{}: {}".format(name, error))
+                finished.append(name)
+                if len(finished) >= options['batch_size']:
+                    self.dequeue(finished, started)
+        self.dequeue(finished, started)
+        cache.evict()
+        self.stdout.write("Rendered derivatives for {} of {} files.".format(
+            rendered, len(names)))
+
+    @staticmethod
+    def dequeue(names, started):
+        """
+        Remove finished files from the queue, unless they were queued again
+        since the run started, and clear the list of names.
+        """
+        PendingDerivative.objects.filter(name__in=names,
+                                         queued__lte=started).delete()
+        del names[:]
@@ -0,0 +1,65 @@
+"""
+Management command to report on the request timing log.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from photo.middleware import summarize_timings
+
+
+class Command(BaseCommand):
+    """
+    Aggregates the log written by
+    :class:`photo.middleware.RequestTimingMiddleware` into a report of the
+    slowest views, and the code making their slowest queries.
+    """
+    help = "Report request times and slow queries from the timing log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log',
+                            help="The timing log; defaults to "
+                            "PHOTO_REQUEST_TIMING_LOG.")
+        parser.add_argument('--output',
+                            help="The file to write; defaults to standard "
+                            "output.")
+        parser.add_argument('--call-sites', type=int, default=10,
+                            help="The number of call sites to list.")
+
+    def handle(self, *args, **options):
+        log_path = options['log'] or getattr(
+            settings, 'PHOTO_REQUEST_TIMING_LOG', None)
+        if not log_path:
+            raise CommandError("No timing log given.")
+        try:
+            with open(log_path) as log:
+                views, call_sites = summarize_timings(
+                    (json.loads(line) for line in log if line.strip()),
+                    options['call_sites'])
+        except FileNotFoundError:
+            raise CommandError("Timing log {} not found.".format(log_path))
+
+        lines = ["{:<40} {:>8} {:>10} {:>10} {:>10} {:>8} {:>10}".format(
+            "view", "requests", "median ms", "p95 ms", "max ms", "queries",
+            "db ms")]
+        for view in views:
+            lines.append("{:<40} {:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>8.1f} "
+                         "{:>10.1f}".format(
+                             view['view'], view['requests'],
+                             view['median'] * 1000, view['p95'] * 1000,
+                             view['max'] * 1000, view['queries'],
+                             view['db_time'] * 1000))
+        lines.append("")
+        lines.append("{:<70} {:>8} {:>10}".format("slow query call site",
+                                                  "queries", "total ms"))
+        for site in call_sites:
+            lines.append("{:<70} {:>8} {:>10.1f}".format(
+                str(site['call_site']), site['queries'], site['time'] * 1000))
+
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write('\n'.join(lines) + '\n')
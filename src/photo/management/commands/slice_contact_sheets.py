@@ -0,0 +1,103 @@
+"""
+Management command to cut contact sheets into previews of each frame.
+"""
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+
+from photo.contacts import ContactCropCache, sheet_layout
+from photo.models import FilmRoll, Frame
+
+
+def slice_roll(arguments):
+    """
+    Cut one contact sheet into crops of its frames, in a worker process.
+
+    Returns the name of the contact sheet and an error message, or None if
+    it was cut successfully.
+
+    Args:
+        arguments: a tuple of the media root, the crop size, the name of the
+            contact sheet, the indexes of its roll's frames, the frames per
+            strip and the frame aspect ratio.
+    """
+    root, size, name, indexes, frames_per_strip, aspect = arguments
+    try:
+        ContactCropCache(root, size).slice(name, indexes, frames_per_strip,
+                                           aspect)
+    except (OSError, ValueError, SyntaxError) as error:
+        return name, str(error)
+    return name, None
+
+
+class Command(BaseCommand):
+    """
+    Cuts the contact sheet of every film roll into a crop of each of its
+    frames, with a pool of worker processes, so frames without a scan have a
+    preview.
+
+    Rolls are read a batch at a time, with their frames, and sheets whose
+    crops are already cached are skipped.
+    """
+    help = "Cut contact sheets into previews of each frame."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            help="The number of worker processes; defaults "
+                            "to the number of CPUs.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="How many rolls to read at a time.")
+        parser.add_argument('--all', action='store_true',
+                            help="Cut every contact sheet, even if its crops "
+                            "are cached.")
+
+    def handle(self, *args, **options):
+        cache = ContactCropCache()
+        sheets = list(self.stale_sheets(cache, options['batch_size'],
+                                        options['all']))
+
+        sliced = 0
+        with Pool(options['processes']) as pool:
+            for name, error in pool.imap_unordered(slice_roll, sheets):
+                if error is None:
+                    sliced += 1
+                else:
+                    self.stderr.write("{}: {}".format(name, error))
+        self.stdout.write("Sliced {} of {} contact sheets.".format(
+            sliced, len(sheets)))
+
+    def stale_sheets(self, cache, batch_size, force):
+        """
+        Yield the arguments of :func:`slice_roll` for each contact sheet
+        whose crops are not cached, reading the rolls and their frames a
+        batch at a time.
+        """
+        rolls = FilmRoll.objects.exclude(contact_sheet='').exclude(
+            contact_sheet__isnull=True).select_related('format').order_by(
+                'pk')
+        last = None
+        while True:
+            batch = rolls if last is None else rolls.filter(pk__gt=last)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return
+            last = batch[-1].pk
+            indexes = {}
+            for film_roll_id, index in Frame.objects.filter(
+                    film_roll__in=batch).order_by('index').values_list(
+                        'film_roll_id', 'index'):
+                indexes.setdefault(film_roll_id, []).append(index)
+            for film_roll in batch:
+                if film_roll.pk not in indexes:
+                    continue
+                name = film_roll.contact_sheet.name
+                layout = sheet_layout(film_roll.format)
+                try:
+                    if not force and cache.is_cached(
+                            name, indexes[film_roll.pk], *layout):
+                        continue
+                except (OSError, ValueError) as error:
+                    self.stderr.write("{}: {}".format(name, error))
+                    continue
+                yield (cache.root, cache.size, name,
+                       indexes[film_roll.pk]) + layout
@@ -0,0 +1,234 @@
+"""
+Metadata of scans and contact sheets, read from their headers.
+
+Pillow opens images lazily, reading only the header until the pixels are
+needed, so the size, mode and resolution, and the EXIF or TIFF tags, are
+read here without decoding the image. The metadata is stored in
+:model:`photo.ScanMetadata` by the ``extract_metadata`` command, so scans can
+be found by resolution or bit depth with an indexed query.
+"""
+import os
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ExifTags, TiffTags
+
+from .models import FilmRoll, Frame, Print, ScanMetadata
+from .uploads import hash_file
+
+# bits per channel of Pillow's image modes
+MODE_BITS = {
+    '1': 1,
+    'I': 32,
+    'F': 32,
+    'I;16': 16,
+    'I;16B': 16,
+    'I;16L': 16,
+    'I;16S': 16,
+    'I;16BS': 16,
+    'I;16LS': 16,
+}
+
+# TIFF tag holding the bits per sample
+BITS_PER_SAMPLE = 258
+
+# EXIF tags holding rationals, which Pillow reads from JPEGs as (numerator,
+# denominator) pairs; TIFF rationals are read as numbers
+RATIONAL_TAGS = frozenset((
+    'XResolution', 'YResolution', 'WhitePoint', 'PrimaryChromaticities',
+    'YCbCrCoefficients', 'ReferenceBlackWhite', 'ExposureTime', 'FNumber',
+    'CompressedBitsPerPixel', 'ShutterSpeedValue', 'ApertureValue',
+    'BrightnessValue', 'ExposureBiasValue', 'MaxApertureValue',
+    'SubjectDistance', 'FocalLength', 'FocalPlaneXResolution',
+    'FocalPlaneYResolution', 'ExposureIndex', 'DigitalZoomRatio',
+    'LensSpecification',
+))
+
+# make and model are joined, so may be longer than the scanner field
+SCANNER_LENGTH = ScanMetadata._meta.get_field('scanner').max_length
+
+# image fields with metadata, by kind
+SCAN_FIELDS = (
+    (ScanMetadata.CONTACT_SHEET, FilmRoll, 'contact_sheet'),
+    (ScanMetadata.FRAME, Frame, 'scan'),
+    (ScanMetadata.PRINT, Print, 'scan'),
+)
+
+
+def _tag_value(value, rational=False):
+    """
+    Convert a tag value into something that can be stored as JSON, or None
+    if it is binary or too long to be useful.
+
+    Args:
+        value: the value, as read by Pillow.
+        rational: whether the tag holds rationals, as (numerator,
+            denominator) pairs.
+    """
+    if isinstance(value, (bytes, bool)):
+        return None
+    if isinstance(value, str):
+        value = value.strip('\x00 ')
+        return value if len(value) <= 200 else None
+    if isinstance(value, (int, float)):
+        return value
+    if hasattr(value, 'denominator'):
+        # TIFF rationals
+        return float(value) if value.denominator else None
+    if isinstance(value, tuple):
+        if rational and len(value) == 2 and \
+                all(isinstance(part, int) for part in value):
+            return value[0] / value[1] if value[1] else None
+        if len(value) > 16:
+            return None
+        values = [_tag_value(part, rational) for part in value]
+        return None if None in values else values
+    return None
+
+def _tags(image):
+    """
+    Read the EXIF tags of a JPEG, or the tags of a TIFF, by name.
+    """
+    if hasattr(image, 'tag_v2'):
+        items = ((TiffTags.lookup(tag).name, value)
+                 for tag, value in image.tag_v2.items())
+    elif hasattr(image, '_getexif'):
+        exif = image._getexif() or {} # pylint: disable=protected-access
+        items = ((ExifTags.TAGS.get(tag, str(tag)), value)
+                 for tag, value in exif.items())
+    else:
+        return {}
+    tags = {}
+    for name, value in items:
+        value = _tag_value(value, name in RATIONAL_TAGS)
+        if value is not None:
+            tags[name] = value
+    return tags
+
+def _bits(image):
+    """
+    Find the bits per channel of an image, from its TIFF tags or its mode.
+    """
+    tags = getattr(image, 'tag_v2', None)
+    if tags is not None and BITS_PER_SAMPLE in tags:
+        bits = tags[BITS_PER_SAMPLE]
+        return max(bits) if isinstance(bits, tuple) else bits
+    return MODE_BITS.get(image.mode, 8)
+
+def extract(path):
+    """
+    Read the metadata of an image file, without decoding its pixels.
+
+    Returns a dictionary of the fields of :model:`photo.ScanMetadata`, other
+    than the kind, owner and name.
+
+    Args:
+        path: the path of the image file.
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as image_file:
+        image = Image.open(image_file)
+        width, height = image.size
+        dpi = image.info.get('dpi')
+        tags = _tags(image)
+        metadata = {
+            'format': image.format or '',
+            'mode': image.mode,
+            'bits': _bits(image),
+            'channels': len(image.getbands()),
+            'width': width,
+            'height': height,
+            'long_edge': max(width, height),
+            'dpi_x': float(dpi[0]) if dpi else None,
+            'dpi_y': float(dpi[1]) if dpi else None,
+            'scanner': ' '.join(
+                str(tags[name]) for name in ('Make', 'Model')
+                if tags.get(name))[:SCANNER_LENGTH],
+            'software': str(tags.get('Software', '')),
+            'tags': tags,
+        }
+        metadata['content_hash'] = hash_file(image_file)
+    metadata['file_size'] = stat.st_size
+    metadata['modified'] = stat.st_mtime
+    return metadata
+
+def scan_names(kinds=None):
+    """
+    Yield the kind, owner id and file name of every stored scan and contact
+    sheet.
+
+    Args:
+        kinds: the kinds of scan to yield, or None for all of them.
+    """
+    for kind, model, field_name in SCAN_FIELDS:
+        if kinds is not None and kind not in kinds:
+            continue
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(
+            **{field_name + '__isnull': True}).order_by()
+        for owner, name in queryset.values_list('pk', field_name):
+            yield kind, owner, name
+
+def media_path(name):
+    """
+    Get the absolute path of a file under MEDIA_ROOT.
+    """
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+def stale_scans(stored, force=False, kinds=None):
+    """
+    Compare stored per-scan rows with the scans and their files.
+
+    Returns a list of ``(kind, owner, name, path)`` tuples for the scans that
+    are new or whose file has changed, by its name, size or modification
+    time; a list of the owners whose stored rows no longer have a scan; and a
+    list of ``(name, error)`` pairs for files that cannot be read.
+
+    Args:
+        stored: a dictionary of owner ids to the stored name, file size and
+            modification time.
+        force: whether to return every scan, changed or not.
+        kinds: the kinds of scan to compare, or None for all of them.
+    """
+    scans = []
+    errors = []
+    owners = set()
+    for kind, owner, name in scan_names(kinds):
+        owners.add(owner)
+        path = media_path(name)
+        try:
+            stat = os.stat(path)
+        except OSError as error:
+            errors.append((name, str(error)))
+            continue
+        if force or stored.get(owner) != (name, stat.st_size, stat.st_mtime):
+            scans.append((kind, owner, name, path))
+    return scans, [owner for owner in stored if owner not in owners], errors
+
+def stored_scans(model):
+    """
+    Read the stored name, file size and modification time of each owner's
+    row of a model, such as :model:`photo.ScanMetadata`, for
+    :func:`stale_scans`.
+    """
+    return {owner: (name, file_size, modified) for
+            owner, name, file_size, modified
+            in model.objects.values_list('owner', 'name', 'file_size',
+                                         'modified')}
+
+def delete_owners(model, owners, batch_size=500):
+    """
+    Delete the rows of a model belonging to a list of owners, a batch at a
+    time.
+    """
+    for start in range(0, len(owners), batch_size):
+        model.objects.filter(owner__in=owners[start:start + batch_size]) \
+            .delete()
+
+def replace_rows(model, rows):
+    """
+    Replace the stored rows of a model for the owners of a list of new rows,
+    in one transaction.
+    """
+    with transaction.atomic():
+        model.objects.filter(owner__in=[row.owner for row in rows]).delete()
+        model.objects.bulk_create(rows)
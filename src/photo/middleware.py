@@ -0,0 +1,249 @@
+"""
+Middleware for the photo application.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import traceback
+from timeit import default_timer
+
+import django
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+
+DJANGO_DIRECTORY = os.path.dirname(django.__file__)
+
+# number of slowest queries recorded for each request
+DEFAULT_SLOWEST = 5
+
+# the connection methods that create cursors
+CURSOR_FACTORIES = ('make_cursor', 'make_debug_cursor')
+
+
+def call_site():
+    """
+    Describe the innermost frame of the current stack outside Django and this
+    module, as "path:line in function".
+    """
+    for filename, line, function, _ in reversed(traceback.extract_stack()):
+        if not filename.startswith(DJANGO_DIRECTORY) and \
+                filename != __file__:
+            return "{}:{} in {}".format(filename, line, function)
+    return None
+
+
+class QueryRecorder(object):
+    """
+    Counts and times the queries made while handling a request, keeping the
+    slowest few with the code they were made from.
+
+    Args:
+        slowest: the number of slowest queries to keep.
+    """
+
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.count = 0
+        self.time = 0.0
+        self.limit = slowest
+        self._slowest = []
+        self._order = itertools.count()
+
+    def record(self, sql, duration):
+        """
+        Record a query. The call site is only looked up for queries slower
+        than those already kept.
+
+        Args:
+            sql: the SQL executed.
+            duration: the time the query took, in seconds.
+        """
+        self.count += 1
+        self.time += duration
+        if len(self._slowest) < self.limit:
+            heapq.heappush(self._slowest, (duration, next(self._order), sql,
+                                           call_site()))
+        elif self.limit and duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (duration, next(self._order),
+                                              sql, call_site()))
+
+    def slowest(self):
+        """
+        List the slowest queries, slowest first, as dictionaries.
+        """
+        return [{'sql': sql, 'time': duration, 'call_site': site}
+                for duration, _, sql, site
+                in sorted(self._slowest, reverse=True)]
+
+
+class TimingCursorWrapper(CursorWrapper):
+    """
+    Cursor wrapper that reports each query to a :class:`QueryRecorder`.
+    """
+
+    def __init__(self, cursor, db, recorder):
+        super().__init__(cursor, db)
+        self.recorder = recorder
+
+    def execute(self, sql, params=None):
+        start = default_timer()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.recorder.record(sql, default_timer() - start)
+
+    def executemany(self, sql, param_list):
+        start = default_timer()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            self.recorder.record(sql, default_timer() - start)
+
+
+class RequestTimingMiddleware(object):
+    """
+    Records the SQL queries and wall-clock time of each request.
+
+    The totals are sent in a Server-Timing header, and if
+    PHOTO_REQUEST_TIMING_LOG is set, each request is appended to it as a line
+    of JSON, with its slowest queries and where they were made from; the
+    ``request_report`` command aggregates the log.
+
+    Unless PHOTO_REQUEST_TIMING is set, the middleware removes itself when it
+    is loaded, so it costs nothing.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self):
+        if not getattr(settings, 'PHOTO_REQUEST_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.log = getattr(settings, 'PHOTO_REQUEST_TIMING_LOG', None)
+        self.slowest = getattr(settings, 'PHOTO_REQUEST_TIMING_SLOWEST',
+                               DEFAULT_SLOWEST)
+
+    def process_request(self, request):
+        """
+        Start timing the request, and route queries through the recorder.
+        """
+        recorder = QueryRecorder(self.slowest)
+        for connection in connections.all():
+            self._instrument(connection, recorder)
+        request.photo_timing = (default_timer(), recorder)
+
+    def process_response(self, request, response):
+        """
+        Stop timing the request, and report it.
+        """
+        if not hasattr(request, 'photo_timing'):
+            return response
+        start, recorder = request.photo_timing
+        elapsed = default_timer() - start
+        for connection in connections.all():
+            self._restore(connection)
+
+        response['Server-Timing'] = \
+            'db;dur={:.1f};desc="{} queries", total;dur={:.1f}'.format(
+                recorder.time * 1000, recorder.count, elapsed * 1000)
+        if self.log:
+            self._write(request, response, elapsed, recorder)
+        return response
+
+    @staticmethod
+    def _instrument(connection, recorder):
+        """
+        Wrap the cursors a connection makes in a TimingCursorWrapper.
+        """
+        for name in CURSOR_FACTORIES:
+            connection.__dict__.pop(name, None)
+            make = getattr(connection, name)
+            setattr(connection, name, lambda cursor, make=make:
+                    TimingCursorWrapper(make(cursor), connection, recorder))
+
+    @staticmethod
+    def _restore(connection):
+        """
+        Undo :meth:`_instrument`.
+        """
+        for name in CURSOR_FACTORIES:
+            connection.__dict__.pop(name, None)
+
+    def _write(self, request, response, elapsed, recorder):
+        """
+        Append a request's timings to the log.
+        """
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'time': elapsed,
+            'queries': recorder.count,
+            'db_time': recorder.time,
+            'slowest': recorder.slowest(),
+        }
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            with open(self.log, 'a') as log:
+                log.write(line)
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which a fraction of the sorted values fall.
+
+    Args:
+        values: a sorted, non-empty list.
+        fraction: the fraction, between 0 and 1.
+    """
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def summarize_timings(records, slowest=10):
+    """
+    Aggregate the records written by :class:`RequestTimingMiddleware`.
+
+    Returns a list of per-view dictionaries, with the number of requests, the
+    median, 95th percentile and maximum times, and the mean number of
+    queries and database time, slowest view first; and a list of the call
+    sites whose slow queries took the most time in total, with their query
+    counts and total time.
+
+    Args:
+        records: an iterable of dictionaries, as logged.
+        slowest: the number of call sites to list.
+    """
+    views = {}
+    sites = {}
+    for record in records:
+        view = views.setdefault(record['view'] or record['path'],
+                                {'times': [], 'queries': 0, 'db_time': 0.0})
+        view['times'].append(record['time'])
+        view['queries'] += record['queries']
+        view['db_time'] += record['db_time']
+        for query in record['slowest']:
+            site = sites.setdefault(query['call_site'],
+                                    {'queries': 0, 'time': 0.0})
+            site['queries'] += 1
+            site['time'] += query['time']
+
+    summary = []
+    for name, view in views.items():
+        times = sorted(view['times'])
+        summary.append({
+            'view': name,
+            'requests': len(times),
+            'median': percentile(times, 0.5),
+            'p95': percentile(times, 0.95),
+            'max': times[-1],
+            'queries': view['queries'] / len(times),
+            'db_time': view['db_time'] / len(times),
+        })
+    summary.sort(key=lambda view: view['p95'], reverse=True)
+    call_sites = sorted(
+        ({'call_site': name, 'queries': site['queries'],
+          'time': site['time']} for name, site in sites.items()),
+        key=lambda site: site['time'], reverse=True)[:slowest]
+    return summary, call_sites
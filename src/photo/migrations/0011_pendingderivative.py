@@ -0,0 +1,27 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 02:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0010_auto_20160325_2233'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('queued', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('queued',),
+            },
+        ),
+    ]
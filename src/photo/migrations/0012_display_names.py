@@ -0,0 +1,62 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Concat
+
+
+def populate_display_names(apps, schema_editor):
+    Manufacturer = apps.get_model('photo', 'Manufacturer')
+    FilmRoll = apps.get_model('photo', 'FilmRoll')
+    Frame = apps.get_model('photo', 'Frame')
+    for manufacturer in Manufacturer.objects.all():
+        for model_name in ('Film', 'Developer', 'PhotoPaper'):
+            apps.get_model('photo', model_name).objects.filter(
+                manufacturer=manufacturer).update(
+                    display_name=Concat(
+                        models.Value(manufacturer.short_name + " "),
+                        models.F('name'), output_field=models.CharField()))
+    for film_roll in FilmRoll.objects.all():
+        frames = Frame.objects.filter(film_roll=film_roll)
+        frames.filter(index=-1).update(display_name=film_roll.name + "-00")
+        frames.exclude(index=-1).update(
+            display_name=Concat(models.Value(film_roll.name + "-"),
+                                models.F('index'),
+                                output_field=models.CharField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0011_pendingderivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='developer',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=71),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=71),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='frame',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=60),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='photopaper',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=71),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_display_names,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 02:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0012_display_names'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filmroll',
+            name='developed_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='filmroll',
+            name='shot_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='filmroll',
+            index_together=set([('film', 'shot_date'), ('format', 'shot_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='frame',
+            index_together=set([('film_roll', 'index')]),
+        ),
+    ]
@@ -0,0 +1,48 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 03:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0013_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanMetadata',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.UUIDField(unique=True)),
+                ('kind', models.CharField(choices=[('contact', 'contact sheet'), ('frame', 'frame scan'), ('print', 'print scan')], max_length=7)),
+                ('name', models.CharField(max_length=100)),
+                ('file_size', models.BigIntegerField()),
+                ('modified', models.FloatField()),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('format', models.CharField(max_length=10)),
+                ('mode', models.CharField(max_length=10)),
+                ('bits', models.PositiveSmallIntegerField()),
+                ('channels', models.PositiveSmallIntegerField()),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('long_edge', models.PositiveIntegerField()),
+                ('dpi_x', models.FloatField(blank=True, null=True)),
+                ('dpi_y', models.FloatField(blank=True, null=True)),
+                ('scanner', models.CharField(blank=True, max_length=200)),
+                ('software', models.CharField(blank=True, max_length=200)),
+                ('tags', models.TextField(blank=True)),
+                ('extracted', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'scan metadata',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='scanmetadata',
+            index_together=set([('kind', 'dpi_x'), ('kind', 'bits', 'long_edge'), ('kind', 'long_edge')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 03:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0014_scan_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.UUIDField(unique=True)),
+                ('kind', models.CharField(choices=[('contact', 'contact sheet'), ('frame', 'frame scan'), ('print', 'print scan')], max_length=7)),
+                ('name', models.CharField(max_length=100)),
+                ('file_size', models.BigIntegerField()),
+                ('modified', models.FloatField()),
+                ('ahash', models.CharField(max_length=16)),
+                ('dhash', models.CharField(max_length=16)),
+                ('phash', models.CharField(db_index=True, max_length=16)),
+            ],
+            options={
+                'verbose_name': 'scan hash',
+                'verbose_name_plural': 'scan hashes',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+#pylint: skip-file
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 03:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# frame width, frame height and frames per strip of common formats
+LAYOUTS = {
+    '35mm': (36, 24, 6),
+    '120': (56, 56, 3),
+    '4x5': (120, 95, 1),
+}
+
+
+def populate_layouts(apps, schema_editor):
+    FilmFormat = apps.get_model('photo', 'FilmFormat')
+    for name, (frame_width, frame_height, frames_per_strip) \
+            in LAYOUTS.items():
+        FilmFormat.objects.filter(name=name).update(
+            frame_width=frame_width, frame_height=frame_height,
+            frames_per_strip=frames_per_strip)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photo', '0015_scan_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filmformat',
+            name='frame_height',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='The height of a frame, in mm.', null=True),
+        ),
+        migrations.AddField(
+            model_name='filmformat',
+            name='frame_width',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='The width of a frame, in mm.', null=True),
+        ),
+        migrations.AddField(
+            model_name='filmformat',
+            name='frames_per_strip',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='The number of frames in each strip of negatives on a contact sheet.', null=True),
+        ),
+        migrations.RunPython(populate_layouts, migrations.RunPython.noop),
+    ]
@@ -9,10 +9,14 @@ Models:
     :model:`photo.FilmRoll`: an individual roll of film
     :model:`photo.Frame`: a frame on a film roll
     :model:`photo.Manufacturer`: a manufacturer of photo products
+    :model:`photo.PendingDerivative`: an image waiting for its derivatives
+        to be rendered
     :model:`photo.PhotoPaper`: a type of photo paper
     :model:`photo.PhotoPaperFinish`: a finish for photo paper, ie
         glossy, matte
     :model:`photo.Print`: an individual print
+    :model:`photo.ScanHash`: the perceptual hashes of a frame or print scan
+    :model:`photo.ScanMetadata`: the metadata of a scan or contact sheet
 """
 import uuid
 
@@ -21,16 +25,52 @@ from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models.fields import CharField
 
+from .compatibility import compatibility
 from .utils import UploadToPathAndRename
 
 
+class DisplayNameMixin(object):
+    """
+    Mixin for models that store their __str__ in a display_name column, so
+    it can be listed without joining the related objects it is built from.
+
+    The column is kept up to date when the object is saved, and when the
+    related objects change by the handlers in :mod:`photo.signals`.
+    """
+    def build_display_name(self):
+        """Build the display name from the object's fields."""
+        raise NotImplementedError
+
+    def save(self, *args, **kwargs): # pylint: disable=missing-docstring
+        self.display_name = self.build_display_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and \
+                'display_name' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['display_name']
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.display_name or self.build_display_name()
+
 # Create your models here.
 class FilmFormat(models.Model):
     """
     Stores a film format.
+
+    The frame size and the number of frames in each strip of negatives lay
+    out the frames of a contact sheet, for cutting it into previews of each
+    frame.
     """
     name = models.CharField(max_length=50)
     roll_film = models.BooleanField()
+    frame_width = models.PositiveSmallIntegerField(
+        blank=True, null=True, help_text="The width of a frame, in mm.")
+    frame_height = models.PositiveSmallIntegerField(
+        blank=True, null=True, help_text="The height of a frame, in mm.")
+    frames_per_strip = models.PositiveSmallIntegerField(
+        blank=True, null=True,
+        help_text="The number of frames in each strip of negatives on a "
+        "contact sheet.")
 
     def __str__(self):
         return self.name
@@ -46,7 +86,7 @@ class Manufacturer(models.Model):
     def __str__(self):
         return self.name
 
-class Film(models.Model):
+class Film(DisplayNameMixin, models.Model):
     """
     Stores a type of film, related to :model:`photo.FilmFormat` and
     :model:`photo.Manufacturer`.
@@ -61,23 +101,27 @@ class Film(models.Model):
     speed = models.IntegerField()
     formats = models.ManyToManyField(FilmFormat)
     process = CharField(max_length=3, choices=PROCESSES)
+    display_name = models.CharField(max_length=71, db_index=True,
+                                    editable=False)
 
     class Meta:
         """Meta class for :model:`photo.Film`."""
         ordering = ('manufacturer__short_name', 'name')
 
-    def __str__(self):
+    def build_display_name(self):
         return "{} {}".format(self.manufacturer.short_name, self.name)
 
-class Developer(models.Model):
+class Developer(DisplayNameMixin, models.Model):
     """
     Stores a film developer, related to :model:`photo.Manufacturer`.
     """
     name = models.CharField(max_length=50)
     manufacturer = models.ForeignKey(Manufacturer)
     powder = models.BooleanField()
+    display_name = models.CharField(max_length=71, db_index=True,
+                                    editable=False)
 
-    def __str__(self):
+    def build_display_name(self):
         return "{} {}".format(self.manufacturer.short_name, self.name)
 
 class FilmRoll(models.Model):
@@ -92,13 +136,22 @@ class FilmRoll(models.Model):
     developer = models.ForeignKey(Developer, blank=True, null=True)
     shot_speed = models.PositiveIntegerField(blank=True)
     developed_speed = models.PositiveIntegerField(blank=True)
-    shot_date = models.DateField(blank=True, null=True)
-    developed_date = models.DateField(blank=True, null=True)
+    shot_date = models.DateField(blank=True, null=True, db_index=True)
+    developed_date = models.DateField(blank=True, null=True, db_index=True)
     photographer = models.ForeignKey(auth.models.User, blank=True, null=True)
     contact_sheet = models.ImageField(blank=True,
                                       upload_to=UploadToPathAndRename
                                       ('contacts'))
 
+    class Meta:
+        """
+        Meta class for :model:`photo.FilmRoll`
+
+        The composite indexes serve the admin's film and format filters
+        combined with a date.
+        """
+        index_together = (('film', 'shot_date'), ('format', 'shot_date'))
+
     def clean(self):
         """
         Sets shot_speed and developed_speed if they are not already specified.
@@ -123,7 +176,7 @@ class PhotoPaperFinish(models.Model):
     def __str__(self):
         return self.name
 
-class PhotoPaper(models.Model):
+class PhotoPaper(DisplayNameMixin, models.Model):
     """
     Stores a type of photo paper, related to :model:'photo.Manufacturer' and
     :model:`photo.PhotoPaperFinish`.
@@ -148,6 +201,8 @@ class PhotoPaper(models.Model):
     multigrade = models.BooleanField()
     grade = models.IntegerField(choices=GRADE_CHOICES, blank=True, null=True)
     finishes = models.ManyToManyField(PhotoPaperFinish)
+    display_name = models.CharField(max_length=71, db_index=True,
+                                    editable=False)
 
     def clean(self):
         """
@@ -163,10 +218,10 @@ class PhotoPaper(models.Model):
                 raise ValidationError("Graded papers must have a grade "
                                       "specified")
 
-    def __str__(self):
+    def build_display_name(self):
         return "{} {}".format(self.manufacturer.short_name, self.name)
 
-class Frame(models.Model):
+class Frame(DisplayNameMixin, models.Model):
     """
     Stores an individual negative, related to :model:`photo.FilmRoll`.
     """
@@ -176,6 +231,8 @@ class Frame(models.Model):
     description = models.TextField(blank=True)
     scan = models.ImageField(blank=True,
                              upload_to=UploadToPathAndRename('frames'))
+    display_name = models.CharField(max_length=60, db_index=True,
+                                    editable=False)
 
     class Meta:
         """
@@ -183,6 +240,7 @@ class Frame(models.Model):
         """
         ordering = ('film_roll__name', 'index')
         unique_together = ('index', 'film_roll')
+        index_together = ('film_roll', 'index')
 
     def frame_number(self):
         """
@@ -194,7 +252,7 @@ class Frame(models.Model):
         else:
             return str(self.index)
 
-    def __str__(self):
+    def build_display_name(self):
         return "{}-{}".format(self.film_roll.name, self.frame_number())
 
 class Enlarger(models.Model):
@@ -232,14 +290,32 @@ class Print(models.Model):
     def clean(self):
         """
         Validates that the selected paper finish is valid for the selected
-        paper.
+        paper, and the selected enlarger takes the negative's format, using
+        :data:`photo.compatibility.compatibility`.
         """
-        if self.finish not in self.paper.finishes.all():
-            raise ValidationError("Invalid combination of paper and finish.")
-        if self.enlarger is not None:
-            if self.frame.film_roll.format not in self.enlarger.formats.all():
+        if self.paper_id is not None and self.finish_id is not None:
+            if not compatibility.paper_has_finish(self.paper_id,
+                                                  self.finish_id):
+                raise ValidationError("Invalid combination of paper and "
+                                      "finish.")
+        if self.enlarger_id is not None and self.frame_id is not None:
+            if not compatibility.enlarger_takes_format(self.enlarger_id,
+                                                       self._format_id()):
                 raise ValidationError("Invalid combination of negative and "
                                       "enlarger")
+
+    def _format_id(self):
+        """
+        Return the id of the format of the print's negative, querying for it
+        unless the frame and its roll are already loaded.
+        """
+        frame = getattr(self, '_frame_cache', None)
+        if frame is not None and frame.pk == self.frame_id and \
+                hasattr(frame, '_film_roll_cache'):
+            return frame.film_roll.format_id
+        return Frame.objects.filter(pk=self.frame_id).values_list(
+            'film_roll__format_id', flat=True).first()
+
     class Meta:
         """Metadata for :model:`photo.Print`"""
         ordering = ('date', 'sequence')
@@ -248,3 +324,94 @@ class Print(models.Model):
     def __str__(self):
         return "{:%Y%m%d}-{}".format(self.date, self.sequence)
 
+
+class PendingDerivative(models.Model):
+    """
+    Stores the name of a scan or contact sheet whose derivative images need
+    to be rendered by the ``render_derivatives`` command.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    queued = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """Metadata for :model:`photo.PendingDerivative`"""
+        ordering = ('queued',)
+
+    def __str__(self):
+        return self.name
+
+
+class ScanMetadata(models.Model):
+    """
+    Stores the metadata of a scan or contact sheet, read from its headers by
+    the ``extract_metadata`` command, keyed by the id of the
+    :model:`photo.Frame`, :model:`photo.Print` or :model:`photo.FilmRoll`
+    it belongs to.
+    """
+    CONTACT_SHEET = 'contact'
+    FRAME = 'frame'
+    PRINT = 'print'
+    KIND_CHOICES = (
+        (CONTACT_SHEET, "contact sheet"),
+        (FRAME, "frame scan"),
+        (PRINT, "print scan"),
+    )
+    owner = models.UUIDField(unique=True)
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    name = models.CharField(max_length=100)
+    file_size = models.BigIntegerField()
+    modified = models.FloatField()
+    content_hash = models.CharField(max_length=64, db_index=True)
+    format = models.CharField(max_length=10)
+    mode = models.CharField(max_length=10)
+    bits = models.PositiveSmallIntegerField()
+    channels = models.PositiveSmallIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    long_edge = models.PositiveIntegerField()
+    dpi_x = models.FloatField(blank=True, null=True)
+    dpi_y = models.FloatField(blank=True, null=True)
+    scanner = models.CharField(max_length=200, blank=True)
+    software = models.CharField(max_length=200, blank=True)
+    tags = models.TextField(blank=True)
+    extracted = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """
+        Metadata for :model:`photo.ScanMetadata`
+
+        The indexes serve searches of one kind of scan by bit depth and size,
+        or by resolution.
+        """
+        index_together = (('kind', 'bits', 'long_edge'),
+                          ('kind', 'long_edge'), ('kind', 'dpi_x'))
+        verbose_name_plural = "scan metadata"
+
+    def __str__(self):
+        return "{} ({}x{} {})".format(self.name, self.width, self.height,
+                                      self.mode)
+
+
+class ScanHash(models.Model):
+    """
+    Stores the perceptual hashes of a frame or print scan, computed by the
+    ``hash_scans`` command, keyed by the id of the object it belongs to. The
+    hashes are 64 bit, as 16 hexadecimal digits.
+    """
+    owner = models.UUIDField(unique=True)
+    kind = models.CharField(max_length=7,
+                            choices=ScanMetadata.KIND_CHOICES)
+    name = models.CharField(max_length=100)
+    file_size = models.BigIntegerField()
+    modified = models.FloatField()
+    ahash = models.CharField(max_length=16)
+    dhash = models.CharField(max_length=16)
+    phash = models.CharField(max_length=16, db_index=True)
+
+    class Meta:
+        """Metadata for :model:`photo.ScanHash`"""
+        verbose_name = "scan hash"
+        verbose_name_plural = "scan hashes"
+
+    def __str__(self):
+        return "{} ({})".format(self.name, self.phash)
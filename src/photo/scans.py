@@ -0,0 +1,407 @@
+"""
+Memory-mapped, read-only access to the pixels of uncompressed scans.
+
+Batch jobs over scans, such as histograms and derivative builds, would
+otherwise decode each scan whole with Pillow. Uncompressed TIFFs, and binary
+PGM and PPM files, store their pixels as they are laid out in memory, so
+here the file is mapped read-only and its rows are read in bands straight
+from the mapping, as buffers numpy can view without copying. Pages of the
+mapping are read as they are touched, and are cached by the operating system
+rather than held by the process, so processing a scan a band at a time keeps
+the memory a worker uses bounded, however large the scan is.
+
+Only scans whose rows are stored in order can be read this way. Tiled TIFFs
+store squares of pixels rather than rows, so, like compressed scans, they
+are rejected with ValueError and read with Pillow instead, as
+:func:`reduced_image` does.
+
+Samples are scaled to 8 bits by the maximum value of the scan, which for a
+PGM or PPM is given in its header, so 12 bit scans saved with a maximum of
+4095 are not left dark.
+
+numpy is optional: without it, bands are copied into arrays of samples.
+"""
+import array
+import mmap
+import struct
+import sys
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# the size of the bands rows are read in, when not given, in bytes
+DEFAULT_BAND_BYTES = 8 * 1024 ** 2
+
+# TIFF tags
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+PLANAR_CONFIGURATION = 284
+TILE_WIDTH = 322
+SAMPLE_FORMAT = 339
+
+# struct formats of the TIFF field types that hold integers
+TIFF_TYPES = {1: 'B', 3: 'H', 4: 'I'}
+
+# PNM magic numbers, and their number of channels
+PNM_CHANNELS = {b'P5': 1, b'P6': 3}
+
+
+def _tiff_fields(data):
+    """
+    Read the fields of the first image file directory of a TIFF, returning
+    the byte order and a dictionary of tags to tuples of integer values.
+    """
+    byte_order = {b'II': '<', b'MM': '>'}.get(bytes(data[:2]))
+    if byte_order is None or struct.unpack_from(
+            byte_order + 'H', data, 2)[0] != 42:
+        raise ValueError("Not a TIFF")
+    offset = struct.unpack_from(byte_order + 'I', data, 4)[0]
+    fields = {}
+    for entry in range(struct.unpack_from(byte_order + 'H', data,
+                                          offset)[0]):
+        tag, field_type, count, value = struct.unpack_from(
+            byte_order + 'HHI4s', data, offset + 2 + entry * 12)
+        if field_type not in TIFF_TYPES:
+            continue
+        value_format = '{}{}{}'.format(byte_order, count,
+                                       TIFF_TYPES[field_type])
+        if struct.calcsize(value_format) <= 4:
+            fields[tag] = struct.unpack_from(value_format, value)
+        else:
+            fields[tag] = struct.unpack_from(
+                value_format, data,
+                struct.unpack(byte_order + 'I', value)[0])
+    return byte_order, fields
+
+def _pnm_header(data):
+    """
+    Read the header of a binary PGM or PPM, returning its width, height,
+    maximum value and the offset of its pixels.
+    """
+    tokens = []
+    position = 2
+    while len(tokens) < 3:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b'#':
+            while data[position:position + 1] not in (b'\n', b'\r', b''):
+                position += 1
+            continue
+        start = position
+        while data[position:position + 1].isdigit():
+            position += 1
+        if start == position:
+            raise ValueError("Invalid PNM header")
+        tokens.append(int(data[start:position]))
+    # a single whitespace character separates the header from the pixels
+    return tokens[0], tokens[1], tokens[2], position + 1
+
+
+class MappedScan(object):
+    """
+    A read-only memory mapping of the pixels of an uncompressed scan.
+
+    Attributes:
+        width: the width of the scan, in pixels.
+        height: the height of the scan, in pixels.
+        channels: the number of samples per pixel.
+        bits: the bits per sample, 8 or 16.
+        maximum: the largest value of a sample.
+        byte_order: '<' or '>', the byte order of 16 bit samples.
+        row_bytes: the length of a row of pixels, in bytes.
+    """
+
+    def __init__(self, path):
+        """
+        Map a scan, raising ValueError if it is not an uncompressed TIFF or a
+        binary PGM or PPM, with 8 or 16 bits per sample.
+
+        Args:
+            path: the path of the scan.
+        """
+        with open(path, 'rb') as scan_file:
+            try:
+                self._map = mmap.mmap(scan_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Empty file")
+        try:
+            if self._map[:2] in PNM_CHANNELS:
+                self._read_pnm()
+            else:
+                self._read_tiff()
+        except ValueError:
+            self._map.close()
+            raise
+        except (KeyError, IndexError, struct.error):
+            self._map.close()
+            raise ValueError("Invalid header")
+        self.row_bytes = self.width * self.channels * self.bits // 8
+        for _, rows, offset in self._segments:
+            if offset + rows * self.row_bytes > len(self._map):
+                self._map.close()
+                raise ValueError("Truncated file")
+
+    def _read_pnm(self):
+        """
+        Read the layout of a binary PGM or PPM, whose pixels follow the
+        header in one piece.
+        """
+        self.channels = PNM_CHANNELS[self._map[:2]]
+        self.width, self.height, maximum, offset = _pnm_header(self._map)
+        if not 0 < maximum < 65536:
+            raise ValueError("Invalid PNM maximum value")
+        self.bits = 8 if maximum < 256 else 16
+        self.maximum = maximum
+        self.byte_order = '>'
+        self._segments = [(0, self.height, offset)]
+
+    def _read_tiff(self):
+        """
+        Read the layout of an uncompressed TIFF, as runs of strips that
+        follow each other in the file.
+        """
+        self.byte_order, fields = _tiff_fields(self._map)
+        self.width = fields[IMAGE_WIDTH][0]
+        self.height = fields[IMAGE_LENGTH][0]
+        self.channels = fields.get(SAMPLES_PER_PIXEL, (1,))[0]
+        bits = set(fields.get(BITS_PER_SAMPLE, (1,)))
+        if fields.get(COMPRESSION, (1,))[0] != 1 or TILE_WIDTH in fields \
+                or STRIP_OFFSETS not in fields:
+            raise ValueError("Not an uncompressed, striped TIFF")
+        if len(bits) != 1 or bits - {8, 16} or \
+                fields.get(SAMPLE_FORMAT, (1,))[0] != 1 or \
+                fields.get(PHOTOMETRIC, (1,))[0] not in (1, 2) or \
+                (self.channels > 1 and
+                 fields.get(PLANAR_CONFIGURATION, (1,))[0] != 1):
+            raise ValueError("Unsupported TIFF pixel layout")
+        self.bits = bits.pop()
+        self.maximum = (1 << self.bits) - 1
+        rows_per_strip = min(fields.get(ROWS_PER_STRIP, (self.height,))[0],
+                             self.height)
+        row_bytes = self.width * self.channels * self.bits // 8
+        self._segments = []
+        for strip, offset in enumerate(fields[STRIP_OFFSETS]):
+            first_row = strip * rows_per_strip
+            rows = min(rows_per_strip, self.height - first_row)
+            if rows <= 0:
+                break
+            if self._segments:
+                last_row, last_rows, last_offset = self._segments[-1]
+                if last_offset + last_rows * row_bytes == offset:
+                    self._segments[-1] = (last_row, last_rows + rows,
+                                          last_offset)
+                    continue
+            self._segments.append((first_row, rows, offset))
+        if sum(rows for _, rows, _ in self._segments) != self.height:
+            raise ValueError("Missing TIFF strips")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the mapping. If buffers or arrays viewing it are still in use,
+        it is closed when the last of them is released instead.
+        """
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    @property
+    def dtype(self):
+        """
+        The numpy type string of the samples, ie '|u1' or '<u2'.
+        """
+        if self.bits == 8:
+            return '|u1'
+        return '{}u2'.format(self.byte_order)
+
+    @property
+    def contiguous(self):
+        """
+        Whether every row follows the last in the file, so any band of rows
+        can be viewed without copying.
+        """
+        return len(self._segments) == 1
+
+    def rows(self, start, stop):
+        """
+        Get a read-only buffer of a band of rows. The buffer views the
+        mapping without copying, unless the band spans strips that do not
+        follow each other in the file, when their rows are copied.
+
+        Args:
+            start: the first row.
+            stop: the row after the last.
+        """
+        if not 0 <= start < stop <= self.height:
+            raise ValueError("Invalid rows {}-{}".format(start, stop))
+        pieces = []
+        for first_row, rows, offset in self._segments:
+            if first_row + rows <= start or first_row >= stop:
+                continue
+            begin = max(start, first_row)
+            end = min(stop, first_row + rows)
+            pieces.append(memoryview(self._map)[
+                offset + (begin - first_row) * self.row_bytes:
+                offset + (end - first_row) * self.row_bytes])
+        if len(pieces) == 1:
+            return pieces[0]
+        return memoryview(b''.join(pieces))
+
+    def bands(self, rows=None):
+        """
+        Iterate over bands of rows, as ``(first row, buffer)`` tuples.
+
+        Args:
+            rows: the number of rows in each band, except perhaps the last;
+                defaults to as many as fit in DEFAULT_BAND_BYTES.
+        """
+        if rows is None:
+            rows = max(1, DEFAULT_BAND_BYTES // self.row_bytes)
+        for start in range(0, self.height, rows):
+            yield start, self.rows(start, min(start + rows, self.height))
+
+    def array(self, buffer):
+        """
+        View a band's buffer as samples. With numpy, this is a read-only
+        array of (rows, width, channels), which does not copy the buffer;
+        without it, a flat array.array of the samples.
+
+        Args:
+            buffer: a buffer from :meth:`rows` or :meth:`bands`.
+        """
+        if numpy is not None:
+            return numpy.frombuffer(buffer, self.dtype).reshape(
+                -1, self.width, self.channels)
+        samples = array.array('B' if self.bits == 8 else 'H')
+        samples.frombytes(buffer)
+        if self.bits == 16 and self.byte_order != \
+                {'little': '<', 'big': '>'}[sys.byteorder]:
+            samples.byteswap()
+        return samples
+
+
+def open_scan(path):
+    """
+    Map a scan read-only, raising ValueError if its format cannot be mapped.
+
+    Args:
+        path: the path of the scan.
+    """
+    return MappedScan(path)
+
+def levels(scan):
+    """
+    Get a table of the 8 bit level of each value a sample of a scan can
+    have, scaled by the scan's maximum value; values above the maximum are
+    the top level.
+
+    Args:
+        scan: a :class:`MappedScan`.
+    """
+    return [min(value * 256 // (scan.maximum + 1), 255)
+            for value in range(1 << scan.bits)]
+
+def histogram(scan, rows=None):
+    """
+    Count the samples of each channel of a scan at each of 256 levels, a
+    band at a time, returning a list of lists of counts.
+
+    Args:
+        scan: a :class:`MappedScan`.
+        rows: the number of rows in each band.
+    """
+    table = levels(scan)
+    if numpy is not None:
+        table = numpy.array(table, numpy.uint8)
+    counts = [[0] * 256 for _ in range(scan.channels)]
+    for _, buffer in scan.bands(rows):
+        samples = scan.array(buffer)
+        for channel in range(scan.channels):
+            if numpy is not None:
+                band_counts = numpy.bincount(
+                    table[samples[..., channel]].ravel(), minlength=256)
+                counts[channel] = [total + int(count) for total, count
+                                   in zip(counts[channel], band_counts)]
+            else:
+                channel_counts = counts[channel]
+                for sample in samples[channel::scan.channels]:
+                    channel_counts[table[sample]] += 1
+    return counts
+
+def reduce(scan, factor, rows=None):
+    """
+    Shrink a scan by a whole factor, averaging each square of pixels, a band
+    at a time, returning an array of 8 bit samples of (height, width,
+    channels). Rows and columns past the last whole square are dropped.
+    Requires numpy.
+
+    Args:
+        scan: a :class:`MappedScan`.
+        factor: the side of the squares averaged into each pixel.
+        rows: about the number of rows in each band.
+    """
+    if numpy is None:
+        raise RuntimeError("Reducing scans requires numpy")
+    if rows is None:
+        rows = DEFAULT_BAND_BYTES // scan.row_bytes
+    # bands must hold whole squares
+    rows = max(1, rows // factor) * factor
+    width = scan.width // factor
+    height = scan.height // factor
+    table = numpy.array(levels(scan), numpy.uint8)
+    reduced = numpy.empty((height, width, scan.channels), numpy.uint8)
+    for start in range(0, height * factor, rows):
+        stop = min(start + rows, height * factor)
+        samples = scan.array(scan.rows(start, stop))[:, :width * factor]
+        sums = samples.reshape(
+            (stop - start) // factor, factor, width, factor, scan.channels
+        ).sum(axis=(1, 3), dtype=numpy.uint32)
+        reduced[start // factor:stop // factor] = \
+            table[sums // (factor * factor)]
+        del samples
+    return reduced
+
+def reduced_image(path, size):
+    """
+    Read a scan shrunk to about twice a size, a band at a time from its
+    mapping, as an 8 bit grayscale or RGB PIL image. Returns None if numpy
+    is not installed, the scan cannot be mapped, or it is already small,
+    for it to be read with Pillow instead.
+
+    Args:
+        path: the path of the scan.
+        size: the (width, height) the image is to be shrunk to.
+    """
+    if numpy is None:
+        return None
+    try:
+        scan = open_scan(path)
+    except (OSError, ValueError):
+        return None
+    with scan:
+        factor = min(scan.width // (2 * size[0]),
+                     scan.height // (2 * size[1]))
+        if factor < 2 or scan.channels not in (1, 3, 4):
+            return None
+        reduced = reduce(scan, factor)
+    if scan.channels == 1:
+        return Image.fromarray(reduced[:, :, 0], 'L')
+    return Image.fromarray(numpy.ascontiguousarray(reduced[:, :, :3]),
+                           'RGB')
@@ -0,0 +1,116 @@
+"""
+Signal handlers for the photo application.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .compatibility import compatibility
+from .display_names import update_film_roll_frames, \
+    update_manufacturer_products
+from .models import Enlarger, FilmFormat, FilmRoll, Frame, Manufacturer, \
+    PendingDerivative, PhotoPaper, PhotoPaperFinish, Print, ScanHash
+from .similarity import index
+
+# image fields whose files have derivatives, by model
+DERIVATIVE_FIELDS = {
+    FilmRoll: 'contact_sheet',
+    Frame: 'scan',
+    Print: 'scan',
+}
+
+# pragmas set on every new SQLite connection: write-ahead logging lets readers
+# carry on while a transaction commits, and with it NORMAL synchronization is
+# safe and avoids an fsync per commit
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'wal'),
+    ('synchronous', 'normal'),
+    ('temp_store', 'memory'),
+    ('cache_size', -20000),
+    ('mmap_size', 268435456),
+)
+
+
+@receiver(post_save)
+def queue_derivatives(sender, instance, **kwargs):
+    """
+    Queue an image for its derivatives to be rendered when an object with a
+    scan or contact sheet is saved.
+    """
+    field_name = DERIVATIVE_FIELDS.get(sender)
+    if field_name is None or kwargs.get('raw'):
+        return
+    field_file = getattr(instance, field_name)
+    if field_file:
+        PendingDerivative.objects.update_or_create(name=field_file.name)
+
+@receiver(post_save, sender=Manufacturer)
+def update_manufacturer_display_names(sender, instance, **kwargs): # pylint: disable=unused-argument
+    """
+    Update the display names of a manufacturer's products when it is saved.
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        update_manufacturer_products(instance)
+
+@receiver(post_save, sender=FilmRoll)
+def update_frame_display_names(sender, instance, **kwargs): # pylint: disable=unused-argument
+    """
+    Update the display names of a film roll's frames when it is saved.
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        update_film_roll_frames(instance)
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs): # pylint: disable=unused-argument
+    """
+    Set the pragmas in PHOTO_SQLITE_PRAGMAS, or SQLITE_PRAGMAS, on new SQLite
+    connections.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    cursor = connection.cursor()
+    for name, value in getattr(settings, 'PHOTO_SQLITE_PRAGMAS',
+                               SQLITE_PRAGMAS):
+        cursor.execute('PRAGMA {} = {}'.format(name, value))
+    cursor.close()
+
+def _invalidate_compatibility():
+    """
+    Discard the cached compatibility tables now, so the rest of the
+    transaction sees the change, and again when it commits, as other threads
+    may have reloaded them as they were before the commit in the meantime.
+    """
+    compatibility.invalidate()
+    transaction.on_commit(compatibility.invalidate)
+
+@receiver(m2m_changed, sender=PhotoPaper.finishes.through)
+@receiver(m2m_changed, sender=Enlarger.formats.through)
+def invalidate_compatibility(sender, **kwargs): # pylint: disable=unused-argument
+    """
+    Discard the cached compatibility tables when paper finishes or enlarger
+    formats change.
+    """
+    if kwargs.get('action', '').startswith('post_'):
+        _invalidate_compatibility()
+
+@receiver(post_delete, sender=PhotoPaper)
+@receiver(post_delete, sender=PhotoPaperFinish)
+@receiver(post_delete, sender=Enlarger)
+@receiver(post_delete, sender=FilmFormat)
+def invalidate_compatibility_on_delete(sender, **kwargs): # pylint: disable=unused-argument
+    """
+    Discard the cached compatibility tables when deleting an object also
+    deletes its rows in them, which does not send m2m_changed.
+    """
+    _invalidate_compatibility()
+
+@receiver(post_save, sender=ScanHash)
+@receiver(post_delete, sender=ScanHash)
+def invalidate_similarity_index(sender, **kwargs): # pylint: disable=unused-argument
+    """
+    Discard the in-memory trees of scan hashes when a hash is saved or
+    deleted.
+    """
+    index.invalidate()
@@ -0,0 +1,286 @@
+"""
+Perceptual hashes of scans, and search for similar scans.
+
+Each frame and print scan has three 64 bit perceptual hashes, stored in
+:model:`photo.ScanHash` by the ``hash_scans`` command: an average hash, a
+difference hash and a DCT hash. Similar images have hashes that differ in
+few bits, so near duplicates are found by Hamming distance, using a BK-tree
+of the stored hashes, which only visits the parts of the tree that can be
+within the distance searched for, rather than every row.
+
+The tree is built on first use and kept in memory; saving or deleting hashes
+invalidates it, and other processes' trees expire after
+PHOTO_SIMILARITY_TIMEOUT seconds.
+"""
+import math
+import threading
+from timeit import default_timer
+
+from django.apps import apps
+from django.conf import settings
+from PIL import Image
+
+ALGORITHMS = ('ahash', 'dhash', 'phash')
+DEFAULT_ALGORITHM = 'phash'
+DEFAULT_DISTANCE = 10
+DEFAULT_LIMIT = 10
+
+# seconds a tree built in memory is used for
+DEFAULT_TIMEOUT = 60
+
+# the side of the hashes' bit grids, and of the image the DCT is taken of
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+# cosines for the lowest HASH_SIZE frequencies of a DCT_SIZE point DCT
+_DCT_COSINES = [[math.cos(math.pi * (2 * x + 1) * u / (2 * DCT_SIZE))
+                 for x in range(DCT_SIZE)] for u in range(HASH_SIZE)]
+
+
+def _bits_to_int(bits):
+    """
+    Pack a sequence of booleans into an integer, first bit highest.
+    """
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+def _grayscale(image, size):
+    """
+    Reduce an image to grayscale pixels of the given size, returned as a list
+    of rows.
+    """
+    width, height = size
+    pixels = list(image.resize(size, Image.ANTIALIAS).getdata())
+    return [pixels[row * width:(row + 1) * width] for row in range(height)]
+
+def average_hash(image):
+    """
+    Hash an image by whether each pixel of an 8x8 reduction is brighter than
+    their mean.
+
+    Args:
+        image: a grayscale PIL image.
+    """
+    pixels = [pixel for row in _grayscale(image, (HASH_SIZE, HASH_SIZE))
+              for pixel in row]
+    mean = sum(pixels) / len(pixels)
+    return _bits_to_int(pixel > mean for pixel in pixels)
+
+def difference_hash(image):
+    """
+    Hash an image by whether each pixel of a 9x8 reduction is brighter than
+    the one to its right.
+
+    Args:
+        image: a grayscale PIL image.
+    """
+    rows = _grayscale(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _bits_to_int(row[x] > row[x + 1] for row in rows
+                        for x in range(HASH_SIZE))
+
+def perceptual_hash(image):
+    """
+    Hash an image by whether each of the lowest 8x8 frequencies of the DCT
+    of a 32x32 reduction is above their median.
+
+    Args:
+        image: a grayscale PIL image.
+    """
+    rows = _grayscale(image, (DCT_SIZE, DCT_SIZE))
+    # the DCT is separable: transform each row, then each column of the
+    # result, keeping only the frequencies the hash uses
+    row_terms = [[sum(pixel * cosine for pixel, cosine in zip(row, cosines))
+                  for cosines in _DCT_COSINES] for row in rows]
+    coefficients = [sum(row_terms[y][u] * cosines[y]
+                        for y in range(DCT_SIZE))
+                    for cosines in _DCT_COSINES for u in range(HASH_SIZE)]
+    median = sorted(coefficients)[len(coefficients) // 2]
+    return _bits_to_int(coefficient > median
+                        for coefficient in coefficients)
+
+def image_hashes(image_file):
+    """
+    Compute the perceptual hashes of an image, returning a dictionary of
+    algorithm names to hashes.
+
+    The image is decoded at reduced size where the format allows it. Pillow
+    raises many kinds of exception on corrupt files, so any failure to
+    decode the image is raised as ValueError.
+
+    Args:
+        image_file: a path or file object.
+    """
+    if isinstance(image_file, str):
+        with open(image_file, 'rb') as opened_file:
+            return image_hashes(opened_file)
+    try:
+        image = Image.open(image_file)
+        image.draft('L', (DCT_SIZE * 4, DCT_SIZE * 4))
+        image = image.convert('L')
+    except Exception as error: # pylint: disable=broad-except
+        raise ValueError("Invalid image ({}: {})".format(
+            type(error).__name__, error))
+    image.thumbnail((DCT_SIZE * 4, DCT_SIZE * 4), Image.ANTIALIAS)
+    return {
+        'ahash': average_hash(image),
+        'dhash': difference_hash(image),
+        'phash': perceptual_hash(image),
+    }
+
+def hamming(hash_1, hash_2):
+    """
+    Count the bits that differ between two hashes.
+    """
+    return bin(hash_1 ^ hash_2).count('1')
+
+def format_hash(value):
+    """
+    Format a hash as 16 hexadecimal digits.
+    """
+    return '{:016x}'.format(value)
+
+
+class BKTree(object):
+    """
+    A Burkhard-Keller tree of hashes, for finding the hashes within a
+    Hamming distance of another.
+
+    Each node's children are keyed by their distance from it, so by the
+    triangle inequality a search for hashes within ``d`` of a target only
+    needs to visit the children whose key is within ``d`` of the target's
+    distance from the node.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        """
+        Add an item with its hash to the tree.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            node_value, items, children = node
+            distance = hamming(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """
+        Find the items whose hashes are within a distance of a hash,
+        returning a list of ``(distance, item)`` tuples, nearest first.
+        """
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                results.extend((distance, item) for item in items)
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    stack.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
+
+
+class SimilarityIndex(object):
+    """
+    In-memory BK-trees of the stored hashes of each algorithm.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trees = {}
+
+    def invalidate(self):
+        """
+        Discard the trees, so they are rebuilt when next used.
+        """
+        with self._lock:
+            self._trees = {}
+
+    def tree(self, algorithm):
+        """
+        Get the tree of an algorithm's hashes, building it unless a current
+        one is already built. Items are ``(kind, owner, name)`` tuples.
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown hash algorithm '{}'".format(algorithm))
+        timeout = getattr(settings, 'PHOTO_SIMILARITY_TIMEOUT',
+                          DEFAULT_TIMEOUT)
+        with self._lock:
+            tree, built = self._trees.get(algorithm, (None, None))
+            if tree is None or default_timer() - built > timeout:
+                tree = BKTree()
+                # the model is looked up here, as models.py is imported
+                # before this module is used
+                rows = apps.get_model('photo', 'ScanHash').objects \
+                    .order_by().values_list(algorithm, 'kind', 'owner',
+                                            'name')
+                for value, kind, owner, name in rows.iterator():
+                    tree.add(int(value, 16), (kind, owner, name))
+                self._trees[algorithm] = (tree, default_timer())
+            return tree
+
+    def search(self, value, algorithm=DEFAULT_ALGORITHM,
+               max_distance=DEFAULT_DISTANCE, limit=DEFAULT_LIMIT,
+               kinds=None):
+        """
+        Find the scans whose hashes are nearest to a hash, returning a list
+        of dictionaries with their kind, owner, name and distance, nearest
+        first.
+
+        Args:
+            value: the hash to search for.
+            algorithm: the name of the hash algorithm.
+            max_distance: the largest Hamming distance to return.
+            limit: the largest number of scans to return.
+            kinds: the kinds of scan to return, or None for all of them.
+        """
+        results = []
+        for distance, (kind, owner, name) in self.tree(algorithm).search(
+                value, max_distance):
+            if kinds and kind not in kinds:
+                continue
+            results.append({'kind': kind, 'owner': owner, 'name': name,
+                            'distance': distance})
+            if len(results) >= limit:
+                break
+        return results
+
+
+index = SimilarityIndex() # pylint: disable=invalid-name
+
+
+def find_similar(image_file, algorithm=DEFAULT_ALGORITHM,
+                 max_distance=DEFAULT_DISTANCE, limit=DEFAULT_LIMIT,
+                 kinds=None):
+    """
+    Hash an image, and find the stored scans most similar to it. Returns the
+    image's hash and the results of :meth:`SimilarityIndex.search`.
+
+    Args:
+        image_file: a path or file object.
+        algorithm: the name of the hash algorithm.
+        max_distance: the largest Hamming distance to return.
+        limit: the largest number of scans to return.
+        kinds: the kinds of scan to return, or None for all of them.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Unknown hash algorithm '{}'".format(algorithm))
+    value = image_hashes(image_file)[algorithm]
+    return value, index.search(value, algorithm, max_distance, limit, kinds)
@@ -0,0 +1,84 @@
+"""
+File storage for the photo application.
+"""
+import errno
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .uploads import hash_file
+
+BLOB_DIRECTORY = 'blobs'
+
+
+@deconstructible
+class DeduplicatingStorage(FileSystemStorage):
+    """
+    File system storage that stores identical files once.
+
+    Each distinct file is stored as a blob named by its content hash, under
+    ``blobs/``, and every saved name is a hard link to its blob. Names chosen
+    by upload_to, such as the UUID names from
+    :class:`photo.utils.UploadToPathAndRename`, keep working unchanged. The
+    file system's link count is the blob's reference count: deleting a name
+    removes the link, and the blob is removed with its last reference.
+    """
+
+    @staticmethod
+    def blob_name(content_hash):
+        """
+        Get the name of the blob for a content hash.
+
+        Args:
+            content_hash: the hex digest of the file's content.
+        """
+        return os.path.join(BLOB_DIRECTORY, content_hash[:2], content_hash)
+
+    def _save(self, name, content):
+        blob_name = self.blob_name(hash_file(content))
+        blob_path = self.path(blob_name)
+        if not os.path.exists(blob_path):
+            saved_name = super()._save(blob_name, content)
+            if saved_name != blob_name:
+                # the same content was saved concurrently, so use that blob
+                os.remove(self.path(saved_name))
+
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            try:
+                os.link(blob_path, self.path(name))
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+                name = self.get_available_name(name)
+            else:
+                return name
+
+    def delete(self, name):
+        path = self.path(name)
+        try:
+            links = os.stat(path).st_nlink
+        except FileNotFoundError:
+            return
+        blob_path = None
+        if links == 2:
+            # this is the last name for the blob, so find it to remove it too
+            with self.open(name) as file_object:
+                blob_path = self.path(self.blob_name(hash_file(file_object)))
+        super().delete(name)
+        if blob_path is not None and os.path.exists(blob_path) and \
+                os.stat(blob_path).st_nlink == 1:
+            os.remove(blob_path)
+
+    def references(self, name):
+        """
+        Count the names that refer to the same stored file as a name.
+
+        Args:
+            name: the name of a saved file.
+        """
+        links = os.stat(self.path(name)).st_nlink
+        # files saved before deduplication are not linked to a blob
+        return links - 1 if links > 1 else links
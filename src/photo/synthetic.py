@@ -0,0 +1,339 @@
+"""
+Synthetic catalog data, for benchmarks.
+
+The generated catalog is deterministic for a given seed. Rolls are shot every
+few days, mostly on 35mm, and are developed a week or so later; about one
+frame in twelve is printed, some of them several times, mostly on a couple of
+favourite papers. Rows are inserted with bulk_create a chunk of rolls at a
+time, so catalogs of millions of frames can be built in bounded memory.
+"""
+import datetime
+import random
+
+from django.db import transaction
+
+from .models import Developer, Enlarger, Film, FilmFormat, FilmRoll, Frame, \
+    Manufacturer, PhotoPaper, PhotoPaperFinish, Print
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 1000
+
+# (name, roll film, ((frames per roll, weight), ...), weight)
+FORMATS = (
+    ("35mm", True, ((36, 7), (24, 3)), 6),
+    ("120", True, ((12, 5), (10, 3), (16, 2)), 3),
+    ("4x5", False, ((1, 1),), 1),
+)
+FRAME_COUNTS = {name: counts for name, _, counts, _ in FORMATS}
+SPEEDS = (25, 50, 100, 125, 160, 200, 400, 800, 1600, 3200)
+FINISHES = ("glossy", "pearl", "lustre", "matte")
+
+
+def _weighted_choice(rng, choices):
+    """
+    Choose a value from a sequence of ``(value, weight)`` pairs.
+    """
+    target = rng.uniform(0, sum(weight for _, weight in choices))
+    for value, weight in choices:
+        target -= weight
+        if target <= 0:
+            return value
+    return choices[-1][0]
+
+def _skewed_choice(rng, items):
+    """
+    Choose an item, favouring those at the start of the sequence.
+    """
+    return items[min(int(rng.expovariate(0.7)), len(items) - 1)]
+
+def _pairs(related, *columns):
+    """
+    List the rows of a many to many relation's table, in a stable order.
+    """
+    return related.through.objects.order_by('pk').values_list(*columns)
+
+def _bulk_create(model, objects):
+    """
+    Save objects with bulk_create, setting display names as saving them
+    would.
+    """
+    for obj in objects:
+        if hasattr(obj, 'build_display_name'):
+            obj.display_name = obj.build_display_name()
+    return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+class CatalogGenerator(object):
+    """
+    Generates a synthetic catalog of film rolls, frames and prints.
+
+    Args:
+        seed: the random seed.
+        name_prefix: the prefix for film roll names.
+        start: the shot date of the first roll.
+        print_rate: the fraction of frames that are printed.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, seed=0, name_prefix='R',
+                 start=datetime.date(2000, 1, 1), print_rate=0.08):
+        self.rng = random.Random(seed)
+        self.name_prefix = name_prefix
+        self.print_rate = print_rate
+        self.shot_date = start
+        self.print_date = start
+        self.session_size = 0
+        self.sequence = 0
+        self.roll_number = 0
+        self.films = None
+        self.formats = None
+        self.developers = None
+        self.papers = None
+        self.paper_finishes = None
+        self.format_enlargers = None
+
+    def reference_data(self):
+        """
+        Load the films, papers and equipment rolls and prints are made with,
+        creating a synthetic set first if there are no films.
+        """
+        if self.films is not None:
+            return
+        if not Film.objects.exists():
+            self._create_reference_data()
+        self.formats = {film_format.pk: film_format for film_format
+                        in FilmFormat.objects.all()}
+        film_formats = {}
+        for film_id, format_id in _pairs(Film.formats, 'film_id',
+                                         'filmformat_id'):
+            film_formats.setdefault(film_id, []).append(
+                self.formats[format_id])
+        self.films = [(film, film_formats[film.pk]) for film
+                      in Film.objects.order_by('pk')
+                      if film.pk in film_formats]
+        self.developers = list(Developer.objects.order_by('pk'))
+        self.papers = list(PhotoPaper.objects.order_by('pk'))
+        finishes = {finish.pk: finish for finish
+                    in PhotoPaperFinish.objects.all()}
+        self.paper_finishes = {}
+        for paper_id, finish_id in _pairs(PhotoPaper.finishes, 'photopaper_id',
+                                          'photopaperfinish_id'):
+            self.paper_finishes.setdefault(paper_id, []).append(
+                finishes[finish_id])
+        self.papers = [paper for paper in self.papers
+                       if paper.pk in self.paper_finishes]
+        enlargers = {enlarger.pk: enlarger for enlarger
+                     in Enlarger.objects.all()}
+        self.format_enlargers = {}
+        for enlarger_id, format_id in _pairs(Enlarger.formats, 'enlarger_id',
+                                             'filmformat_id'):
+            self.format_enlargers.setdefault(format_id, []).append(
+                enlargers[enlarger_id])
+
+    def _create_reference_data(self):
+        """
+        Create manufacturers, formats, films, developers, papers and
+        enlargers.
+        """
+        rng = self.rng
+        _bulk_create(Manufacturer, [
+            Manufacturer(name="Manufacturer {}".format(number),
+                         short_name="M{}".format(number))
+            for number in range(12)])
+        manufacturers = list(Manufacturer.objects.order_by('pk'))
+        _bulk_create(FilmFormat, [FilmFormat(name=name, roll_film=roll_film)
+                                  for name, roll_film, _, _ in FORMATS])
+        formats = list(FilmFormat.objects.order_by('pk'))
+        format_weights = [(film_format, weight) for film_format,
+                          (_, _, _, weight) in zip(formats, FORMATS)]
+        _bulk_create(Film, [
+            Film(name="Film {}".format(number),
+                 manufacturer=_skewed_choice(rng, manufacturers),
+                 speed=rng.choice(SPEEDS),
+                 process=_weighted_choice(rng, (("B&W", 6), ("C41", 3),
+                                                ("E6", 1))))
+            for number in range(60)])
+        for film in Film.objects.all():
+            film.formats.add(*set(_weighted_choice(rng, format_weights)
+                                  for _ in range(2)))
+        _bulk_create(Developer, [
+            Developer(name="Developer {}".format(number),
+                      manufacturer=_skewed_choice(rng, manufacturers),
+                      powder=rng.random() < 0.4)
+            for number in range(15)])
+        _bulk_create(PhotoPaperFinish, [PhotoPaperFinish(name=name)
+                                        for name in FINISHES])
+        finishes = list(PhotoPaperFinish.objects.order_by('pk'))
+        _bulk_create(PhotoPaper, [
+            PhotoPaper(name="Paper {}".format(number),
+                       manufacturer=_skewed_choice(rng, manufacturers),
+                       paper_type=rng.choice(("RC", "FB")),
+                       multigrade=rng.random() < 0.8)
+            for number in range(25)])
+        for paper in PhotoPaper.objects.all():
+            paper.finishes.add(*rng.sample(finishes, rng.randint(1, 3)))
+        _bulk_create(Enlarger, [
+            Enlarger(name="Enlarger {}".format(number), type=number % 2,
+                     color_head=rng.random() < 0.3)
+            for number in range(5)])
+        for number, enlarger in enumerate(Enlarger.objects.order_by('pk')):
+            enlarger.formats.add(*formats[:number % len(formats) + 1])
+
+    def film_roll(self):
+        """
+        Build the next unsaved :model:`photo.FilmRoll`, returning it with
+        its frame indexes.
+        """
+        self.reference_data()
+        rng = self.rng
+        film, formats = _skewed_choice(rng, self.films)
+        film_format = rng.choice(formats)
+        frames = _weighted_choice(rng, FRAME_COUNTS.get(film_format.name,
+                                                        ((1, 1),)))
+        self.shot_date += datetime.timedelta(days=int(rng.expovariate(1 / 3)))
+        developed_date = None
+        if rng.random() < 0.95:
+            developed_date = self.shot_date + datetime.timedelta(
+                days=int(rng.expovariate(1 / 7)))
+        speed = film.speed * (2 if rng.random() < 0.1 else 1)
+        self.roll_number += 1
+        film_roll = FilmRoll(
+            name="{}{:07d}".format(self.name_prefix, self.roll_number),
+            film=film, format=film_format,
+            developer=_skewed_choice(rng, self.developers)
+            if self.developers else None,
+            shot_speed=speed, developed_speed=speed,
+            shot_date=self.shot_date, developed_date=developed_date)
+        indexes = list(range(1, frames + 1))
+        if film_format.roll_film and rng.random() < 0.2:
+            indexes.insert(0, -1)
+        return film_roll, indexes
+
+    def prints(self, film_roll, indexes):
+        """
+        Choose which frames of a roll are printed, returning a list of
+        ``(index, date, sequence, paper, finish, enlarger)`` tuples.
+
+        Args:
+            film_roll: the roll, from :meth:`film_roll`.
+            indexes: the roll's frame indexes.
+        """
+        if film_roll.developed_date is None or not self.papers:
+            return []
+        rng = self.rng
+        prints = []
+        for index in indexes:
+            if rng.random() >= self.print_rate:
+                continue
+            for _ in range(1 + int(rng.expovariate(1.5))):
+                self._next_sequence(film_roll.developed_date)
+                paper = _skewed_choice(rng, self.papers)
+                enlargers = self.format_enlargers.get(film_roll.format_id)
+                enlarger = None
+                if enlargers and rng.random() < 0.85:
+                    enlarger = rng.choice(enlargers)
+                prints.append((index, self.print_date, self.sequence, paper,
+                               rng.choice(self.paper_finishes[paper.pk]),
+                               enlarger))
+        return prints
+
+    def _next_sequence(self, developed_date):
+        """
+        Move on to the next print, starting a new printing session when the
+        current one is full or the negative was developed after it.
+        """
+        self.sequence += 1
+        if self.sequence > self.session_size or \
+                self.print_date <= developed_date:
+            self.print_date = max(self.print_date, developed_date) + \
+                datetime.timedelta(days=1 + int(self.rng.expovariate(1 / 5)))
+            self.session_size = self.rng.randint(5, 30)
+            self.sequence = 1
+
+    def seed(self, rolls, chunk_size=CHUNK_SIZE):
+        """
+        Create film rolls, with their frames and prints, returning the
+        numbers of rolls, frames and prints created.
+
+        Args:
+            rolls: the number of film rolls to create.
+            chunk_size: the number of rolls inserted in each transaction.
+        """
+        self.reference_data()
+        counts = [0, 0, 0]
+        while counts[0] < rolls:
+            film_rolls, frames, prints = [], [], []
+            for _ in range(min(chunk_size, rolls - counts[0])):
+                film_roll, indexes = self.film_roll()
+                film_rolls.append(film_roll)
+                roll_frames = {index: Frame(index=index, film_roll=film_roll)
+                               for index in indexes}
+                frames.extend(roll_frames.values())
+                prints.extend(
+                    Print(date=date, sequence=sequence,
+                          frame=roll_frames[index], paper=paper,
+                          finish=finish, enlarger=enlarger)
+                    for index, date, sequence, paper, finish, enlarger
+                    in self.prints(film_roll, indexes))
+            with transaction.atomic():
+                _bulk_create(FilmRoll, film_rolls)
+                _bulk_create(Frame, frames)
+                _bulk_create(Print, prints)
+            counts[0] += len(film_rolls)
+            counts[1] += len(frames)
+            counts[2] += len(prints)
+        return tuple(counts)
+
+    def import_rows(self, rolls):
+        """
+        Generate rows for :func:`photo.imports.import_film_rolls` and
+        :func:`photo.imports.import_prints`, returning the two lists of rows.
+        Print rows give a date but no sequence.
+
+        Args:
+            rolls: the number of film rolls to generate.
+        """
+        roll_rows = []
+        print_rows = []
+        for _ in range(rolls):
+            film_roll, indexes = self.film_roll()
+            roll_rows.append({
+                'name': film_roll.name,
+                'film': film_roll.film.display_name,
+                'format': film_roll.format.name,
+                'frames': str(len([index for index in indexes
+                                   if index > 0])),
+                'double_zero': 'yes' if -1 in indexes else 'no',
+                'developer': film_roll.developer.display_name
+                             if film_roll.developer else '',
+                'shot_speed': str(film_roll.shot_speed),
+                'developed_speed': str(film_roll.developed_speed),
+                'shot_date': film_roll.shot_date.isoformat(),
+                'developed_date': film_roll.developed_date.isoformat()
+                                  if film_roll.developed_date else '',
+            })
+            for index, date, _, paper, finish, enlarger in self.prints(
+                    film_roll, indexes):
+                print_rows.append({
+                    'film_roll': film_roll.name,
+                    'frame': '00' if index == -1 else str(index),
+                    'paper': paper.display_name,
+                    'finish': finish.name,
+                    'enlarger': enlarger.name if enlarger else '',
+                    'date': date.isoformat(),
+                })
+        return roll_rows, print_rows
+
+
+def seed_catalog(rolls=100, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Create a synthetic catalog of film rolls, with their frames and prints,
+    and the films, papers and equipment they use, returning the numbers of
+    rolls, frames and prints created.
+
+    Args:
+        rolls: the number of film rolls to create.
+        seed: the random seed.
+        chunk_size: the number of rolls inserted in each transaction.
+    """
+    return CatalogGenerator(seed).seed(rolls, chunk_size)
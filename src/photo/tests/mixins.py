@@ -0,0 +1,30 @@
+"""
+Mixins shared by the photo tests
+"""
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+
+class TemporaryRootMixin(object):
+    """
+    Mixin for test cases that write files, giving each test an empty
+    temporary directory as self.root, removed when the test ends.
+    """
+    def setUp(self): # pylint: disable=missing-docstring
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+
+class MediaRootMixin(TemporaryRootMixin):
+    """
+    Mixin for test cases that use the media root, overriding MEDIA_ROOT with
+    the temporary self.root for each test.
+    """
+    def setUp(self): # pylint: disable=missing-docstring
+        super().setUp()
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
@@ -0,0 +1,226 @@
+"""
+Tests for admin classes in the photo application.
+"""
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from photo import models
+from photo.compatibility import compatibility
+
+
+class ChangelistQueryCountTestCase(TestCase):
+    """
+    Verify admin changelists render in a number of queries that does not
+    depend on the number of rows.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        cls.film_format = models.FilmFormat.objects.create(name="35mm",
+                                                           roll_film=True)
+        cls.finish = models.PhotoPaperFinish.objects.create(name="glossy")
+        cls.enlarger = models.Enlarger.objects.create(name="enlarger",
+                                                      type=0,
+                                                      color_head=False)
+        cls.enlarger.formats.add(cls.film_format)
+        cls.count = 0
+
+    def setUp(self):
+        self.client.login(username="admin", password="password")
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    def add_rows(self, rows):
+        """
+        Add a film, paper, roll, frame and print for each row, each with its
+        own manufacturer.
+        """
+        for _ in range(rows):
+            self.__class__.count += 1
+            number = self.count
+            manufacturer = models.Manufacturer.objects.create(
+                name="manufacturer {}".format(number),
+                short_name="m{}".format(number))
+            film = models.Film.objects.create(
+                name="film {}".format(number), manufacturer=manufacturer,
+                speed=100, process="B&W")
+            paper = models.PhotoPaper.objects.create(
+                name="paper {}".format(number), manufacturer=manufacturer,
+                paper_type="RC", multigrade=True)
+            paper.finishes.add(self.finish)
+            film_roll = models.FilmRoll.objects.create(
+                name="roll {}".format(number), film=film,
+                format=self.film_format, shot_speed=100, developed_speed=100)
+            frame = models.Frame.objects.create(index=1, film_roll=film_roll)
+            models.Print.objects.create(
+                date=date(2016, 1, 1), sequence=number, frame=frame,
+                paper=paper, finish=self.finish, enlarger=self.enlarger)
+
+    def changelist_queries(self, model_name):
+        """
+        Count the queries needed to render a changelist.
+        """
+        url = reverse('admin:photo_{}_changelist'.format(model_name))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assert_constant_queries(self, model_name):
+        """
+        Verify a changelist needs the same number of queries for 2 and 10
+        rows.
+        """
+        self.add_rows(2)
+        few_queries = self.changelist_queries(model_name)
+        self.add_rows(8)
+        many_queries = self.changelist_queries(model_name)
+        self.assertEqual(few_queries, many_queries,
+                         "{} changelist queries depend on number of "
+                         "rows".format(model_name))
+
+    def test_film_changelist(self):
+        """
+        Verify query count for the :model:`photo.Film` changelist.
+        """
+        self.assert_constant_queries('film')
+
+    def test_photo_paper_changelist(self):
+        """
+        Verify query count for the :model:`photo.PhotoPaper` changelist.
+        """
+        self.assert_constant_queries('photopaper')
+
+    def test_film_roll_changelist(self):
+        """
+        Verify query count for the :model:`photo.FilmRoll` changelist.
+        """
+        self.assert_constant_queries('filmroll')
+
+    def test_frame_changelist(self):
+        """
+        Verify query count for the :model:`photo.Frame` changelist.
+        """
+        self.assert_constant_queries('frame')
+
+    def test_print_changelist(self):
+        """
+        Verify query count for the :model:`photo.Print` changelist.
+        """
+        self.assert_constant_queries('print')
+
+class FilmRollAdminTestCase(TestCase):
+    """
+    Tests for the :model:`photo.FilmRoll` admin actions.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=400, process="B&W")
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        cls.film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=400,
+            developed_speed=400)
+
+    def test_add_frames(self):
+        """
+        Verify the add frames action creates the frames of selected rolls.
+        """
+        self.client.login(username="admin", password="password")
+        response = self.client.post(
+            reverse('admin:photo_filmroll_changelist'),
+            {'action': 'add_frames_00_36',
+             '_selected_action': [str(self.film_roll.pk)]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.film_roll.frame_set.count(), 37)
+
+class PrintAdminTestCase(TestCase):
+    """
+    Tests for the :model:`photo.Print` admin form choices.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=400, process="B&W")
+        format_35mm = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        format_120 = models.FilmFormat.objects.create(name="120",
+                                                      roll_film=True)
+        cls.glossy = models.PhotoPaperFinish.objects.create(name="glossy")
+        cls.matte = models.PhotoPaperFinish.objects.create(name="matte")
+        cls.paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        cls.paper.finishes.add(cls.glossy)
+        cls.enlarger_35mm = models.Enlarger.objects.create(
+            name="35mm enlarger", type=0, color_head=False)
+        cls.enlarger_35mm.formats.add(format_35mm)
+        cls.enlarger_120 = models.Enlarger.objects.create(
+            name="120 enlarger", type=0, color_head=False)
+        cls.enlarger_120.formats.add(format_120)
+        film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=format_35mm, shot_speed=400,
+            developed_speed=400)
+        cls.frame = models.Frame.objects.create(index=1, film_roll=film_roll)
+        cls.print = models.Print.objects.create(
+            date=date(2016, 1, 1), sequence=1, frame=cls.frame,
+            paper=cls.paper, finish=cls.glossy, enlarger=cls.enlarger_35mm)
+
+    def setUp(self):
+        self.client.login(username="admin", password="password")
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    def test_change_choices(self):
+        """
+        Verify the change form only offers compatible finishes and enlargers.
+        """
+        response = self.client.get(reverse('admin:photo_print_change',
+                                           args=(self.print.pk,)))
+        form = response.context['adminform'].form
+        self.assertEqual(list(form.fields['finish'].queryset), [self.glossy])
+        self.assertEqual(list(form.fields['enlarger'].queryset),
+                         [self.enlarger_35mm])
+        self.assertContains(response, "35mm enlarger")
+        self.assertNotContains(response, "120 enlarger")
+        self.assertNotContains(response, ">matte<")
+
+    def test_add_choices(self):
+        """
+        Verify the add form offers every finish and enlarger.
+        """
+        response = self.client.get(reverse('admin:photo_print_add'))
+        form = response.context['adminform'].form
+        self.assertEqual(form.fields['finish'].queryset.count(), 2)
+        self.assertEqual(form.fields['enlarger'].queryset.count(), 2)
+
+    def test_incompatible_submission(self):
+        """
+        Verify an incompatible finish or enlarger is rejected as an invalid
+        choice.
+        """
+        response = self.client.post(reverse('admin:photo_print_add'), {
+            'date': '2016-01-02', 'sequence': '1', 'frame': self.frame.pk,
+            'paper': self.paper.pk, 'finish': self.matte.pk,
+            'enlarger': self.enlarger_120.pk})
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['adminform'].form.errors
+        self.assertIn('finish', errors)
+        self.assertIn('enlarger', errors)
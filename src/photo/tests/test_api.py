@@ -0,0 +1,142 @@
+"""
+Tests for photo.api
+"""
+from datetime import date
+import json
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from photo import api, models
+
+
+class CatalogListTestCase(TestCase):
+    """
+    Tests for api.catalog_list
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200, process="B&W")
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        finish = models.PhotoPaperFinish.objects.create(name="glossy")
+        paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        for roll_number in range(3):
+            film_roll = models.FilmRoll.objects.create(
+                name="roll {}".format(roll_number), film=film,
+                format=film_format, shot_speed=200, developed_speed=200)
+            for index in range(-1, 4):
+                frame = models.Frame.objects.create(index=index,
+                                                    film_roll=film_roll)
+        for sequence in range(1, 4):
+            for day in (1, 2):
+                models.Print.objects.create(
+                    date=date(2016, 1, day), sequence=sequence, frame=frame,
+                    paper=paper, finish=finish)
+
+    def setUp(self):
+        self.client.login(username="admin", password="password")
+
+    def get_page(self, resource_name, **params):
+        """
+        Get a page of a resource, and decode it.
+        """
+        response = self.client.get(
+            reverse('photo:api-list',
+                    kwargs={'resource_name': resource_name}), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(b''.join(response.streaming_content).decode())
+
+    def get_all(self, resource_name, limit):
+        """
+        Follow cursors through every page of a resource, returning all rows.
+        """
+        rows = []
+        page = self.get_page(resource_name, limit=limit)
+        rows.extend(page['results'])
+        while page['next'] is not None:
+            self.assertEqual(len(page['results']), limit)
+            page = self.get_page(resource_name, limit=limit,
+                                 cursor=page['next'])
+            rows.extend(page['results'])
+        return rows
+
+    def test_frames(self):
+        """
+        Verify frames are paginated in roll name and index order.
+        """
+        rows = self.get_all('frames', 4)
+        self.assertEqual(
+            [(row['film_roll_name'], row['index']) for row in rows],
+            [("roll {}".format(roll), index)
+             for roll in range(3) for index in range(-1, 4)])
+
+    def test_prints(self):
+        """
+        Verify prints are paginated in date and sequence order.
+        """
+        rows = self.get_all('prints', 2)
+        self.assertEqual([(row['date'], row['sequence']) for row in rows],
+                         [("2016-01-0{}".format(day), sequence)
+                          for day in (1, 2) for sequence in range(1, 4)])
+        self.assertEqual(rows[0]['finish'], "glossy")
+        self.assertIsNone(rows[0]['enlarger'])
+
+    def test_other_resources(self):
+        """
+        Verify the other resources are listed.
+        """
+        self.assertEqual(len(self.get_all('film-rolls', 2)), 3)
+        self.assertEqual(self.get_page('films')['results'][0]['manufacturer'],
+                         "test")
+        self.assertEqual(self.get_page('papers')['results'][0]['name'],
+                         "paper")
+
+    def test_page_queries(self):
+        """
+        Verify a page is read with a single query, after the session.
+        """
+        page = self.get_page('frames', limit=2)
+        url = reverse('photo:api-list', kwargs={'resource_name': 'frames'})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'cursor': page['next']})
+            b''.join(response.streaming_content)
+
+    def test_invalid(self):
+        """
+        Verify invalid requests are rejected.
+        """
+        url = reverse('photo:api-list', kwargs={'resource_name': 'prints'})
+        for params in ({'limit': 'x'}, {'limit': 0}, {'cursor': '!!'},
+                       {'cursor': api.encode_cursor(['x'])},
+                       {'cursor': api.encode_cursor(['x', 1])},
+                       {'cursor': api.encode_cursor([[1], [2]])},
+                       {'cursor': api.encode_cursor([{}, 1])}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+        frames_url = reverse('photo:api-list',
+                             kwargs={'resource_name': 'frames'})
+        response = self.client.get(
+            frames_url, {'cursor': api.encode_cursor([[1], [2]])})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse(
+            'photo:api-list', kwargs={'resource_name': 'unknown'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_only(self):
+        """
+        Verify anonymous users can not read the catalog.
+        """
+        self.client.logout()
+        response = self.client.get(reverse(
+            'photo:api-list', kwargs={'resource_name': 'frames'}))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,117 @@
+"""
+Tests for photo.compatibility
+"""
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from photo import models
+from photo.compatibility import Compatibility, compatibility
+
+
+class CompatibilityTestCase(TestCase):
+    """
+    Tests for compatibility.Compatibility, and its invalidation by signals.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        cls.glossy = models.PhotoPaperFinish.objects.create(name="glossy")
+        cls.matte = models.PhotoPaperFinish.objects.create(name="matte")
+        cls.paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        cls.paper.finishes.add(cls.glossy)
+        cls.format_35mm = models.FilmFormat.objects.create(name="35mm",
+                                                           roll_film=True)
+        cls.format_120 = models.FilmFormat.objects.create(name="120",
+                                                          roll_film=True)
+        cls.enlarger = models.Enlarger.objects.create(
+            name="enlarger", type=0, color_head=False)
+        cls.enlarger.formats.add(cls.format_35mm, cls.format_120)
+
+    def setUp(self):
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    def test_lookups(self):
+        """Test the lookups, which only query when the tables are loaded."""
+        tables = Compatibility()
+        with self.assertNumQueries(2):
+            self.assertEqual(tables.finishes_for_paper(self.paper.pk),
+                             {self.glossy.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(tables.formats_for_enlarger(self.enlarger.pk),
+                             {self.format_35mm.pk, self.format_120.pk})
+            self.assertEqual(tables.enlargers_for_format(self.format_120.pk),
+                             {self.enlarger.pk})
+            self.assertTrue(tables.paper_has_finish(self.paper.pk,
+                                                    self.glossy.pk))
+            self.assertFalse(tables.paper_has_finish(self.paper.pk,
+                                                     self.matte.pk))
+            self.assertTrue(tables.enlarger_takes_format(
+                self.enlarger.pk, self.format_35mm.pk))
+            self.assertEqual(tables.finishes_for_paper(None), frozenset())
+            self.assertEqual(tables.enlargers_for_format(None), frozenset())
+
+    def test_m2m_changes(self):
+        """Test that adding, removing and clearing invalidate the tables."""
+        self.assertFalse(compatibility.paper_has_finish(self.paper.pk,
+                                                        self.matte.pk))
+        self.paper.finishes.add(self.matte)
+        self.assertTrue(compatibility.paper_has_finish(self.paper.pk,
+                                                       self.matte.pk))
+        self.paper.finishes.remove(self.glossy)
+        self.assertFalse(compatibility.paper_has_finish(self.paper.pk,
+                                                        self.glossy.pk))
+        self.matte.photopaper_set.clear()
+        self.assertEqual(compatibility.finishes_for_paper(self.paper.pk),
+                         frozenset())
+        self.enlarger.formats.remove(self.format_120)
+        self.assertEqual(compatibility.enlargers_for_format(
+            self.format_120.pk), frozenset())
+
+    def test_delete(self):
+        """Test that deleting a related object invalidates the tables."""
+        compatibility.load()
+        format_id = self.format_120.pk
+        models.FilmFormat.objects.get(pk=format_id).delete()
+        self.assertEqual(compatibility.enlargers_for_format(format_id),
+                         frozenset())
+
+    def test_timeout(self):
+        """Test that the tables are reloaded after the timeout."""
+        tables = Compatibility()
+        tables.load()
+        with self.assertNumQueries(0):
+            tables.load()
+        with override_settings(PHOTO_COMPATIBILITY_TIMEOUT=-1), \
+                self.assertNumQueries(2):
+            tables.load()
+
+class CommitTestCase(TransactionTestCase):
+    """
+    Tests for invalidating the compatibility tables when changes commit.
+    """
+
+    def setUp(self):
+        self.addCleanup(compatibility.invalidate)
+
+    def test_invalidated_on_commit(self):
+        """
+        Test that tables loaded before a change commits, as by another
+        thread, are discarded when it commits.
+        """
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        finish = models.PhotoPaperFinish.objects.create(name="glossy")
+        with transaction.atomic():
+            paper.finishes.add(finish)
+            # another thread loads the tables as they were before the change
+            compatibility.load()[0].clear()
+            self.assertFalse(compatibility.paper_has_finish(paper.pk,
+                                                            finish.pk))
+        self.assertTrue(compatibility.paper_has_finish(paper.pk, finish.pk))
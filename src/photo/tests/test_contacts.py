@@ -0,0 +1,184 @@
+"""
+Tests for photo.contacts
+"""
+import io
+import os
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from PIL import Image, ImageDraw
+
+from photo import contacts, models
+from photo.tests.mixins import MediaRootMixin
+
+# the layout of the test contact sheets, in pixels
+MARGIN = 60
+PITCH = 160
+STRIP_HEIGHT = 120
+STRIP_SPACING = 200
+
+
+def frame_color(number):
+    """
+    Get the gray level of a frame on a test contact sheet.
+    """
+    return 30 + 20 * number
+
+def draw_sheet(count, frames_per_strip=6, size=(1200, 900)):
+    """
+    Draw a contact sheet of black strips of negatives on white paper, with
+    each frame a different gray.
+    """
+    sheet = Image.new('L', size, 245)
+    draw = ImageDraw.Draw(sheet)
+    for number in range(count):
+        strip, frame = divmod(number, frames_per_strip)
+        upper = MARGIN + strip * STRIP_SPACING
+        if not frame:
+            frames = min(frames_per_strip, count - number)
+            draw.rectangle((MARGIN, upper, MARGIN + frames * PITCH - 1,
+                            upper + STRIP_HEIGHT - 1), fill=0)
+        left = MARGIN + frame * PITCH
+        draw.rectangle((left + 5, upper + 10, left + 154, upper + 109),
+                       fill=frame_color(number))
+    return sheet
+
+def center_value(path):
+    """
+    Read the gray level at the centre of an image.
+    """
+    with open(path, 'rb') as image_file:
+        image = Image.open(image_file).convert('L')
+    return image.getpixel((image.size[0] // 2, image.size[1] // 2))
+
+class DetectGridTestCase(TestCase):
+    """
+    Tests for contacts.detect_grid
+    """
+    def test_strips(self):
+        """
+        Verify the frames of full and short strips are found, in order, and
+        trimmed to the frame shape.
+        """
+        sheet = draw_sheet(8)
+        boxes = contacts.detect_grid(sheet, 8, 6, 36 / 24)
+        self.assertEqual(len(boxes), 8)
+        for number, (left, upper, right, lower) in enumerate(boxes):
+            self.assertAlmostEqual((right - left) / (lower - upper), 1.5)
+            center = (int((left + right) / 2), int((upper + lower) / 2))
+            self.assertEqual(sheet.getpixel(center), frame_color(number))
+        self.assertAlmostEqual(boxes[6][0], boxes[0][0], delta=1)
+
+    def test_even_split(self):
+        """Verify a sheet without strips is divided evenly."""
+        boxes = contacts.detect_grid(Image.new('L', (600, 400), 128), 12, 6)
+        self.assertEqual(len(boxes), 12)
+        self.assertEqual(boxes[0], (0, 0, 100, 200))
+        self.assertEqual(boxes[11], (500, 200, 600, 400))
+        self.assertEqual(contacts.detect_grid(draw_sheet(1), 0, 6), [])
+
+    def test_layout(self):
+        """Verify a format's layout, and the defaults for unknown ones."""
+        film_format = models.FilmFormat(name="6x7", roll_film=True,
+                                        frame_width=70, frame_height=56,
+                                        frames_per_strip=3)
+        self.assertEqual(contacts.sheet_layout(film_format), (3, 1.25))
+        self.assertEqual(contacts.sheet_layout(models.FilmFormat(
+            name="other", roll_film=True)),
+                         (contacts.DEFAULT_FRAMES_PER_STRIP, None))
+        self.assertEqual(contacts.sheet_layout(models.FilmFormat(
+            name="sheet", roll_film=False)), (1, None))
+
+class ContactCropTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for contacts.ContactCropCache, the slice_contact_sheets command,
+    and the crop view.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        cls.film = models.Film.objects.create(name="film",
+                                              manufacturer=manufacturer,
+                                              speed=200, process="B&W")
+        cls.film_format = models.FilmFormat.objects.create(
+            name="35mm", roll_film=True, frame_width=36, frame_height=24,
+            frames_per_strip=6)
+
+    def setUp(self):
+        super().setUp()
+        self.film_roll = self.create_roll(8)
+
+    def create_roll(self, count):
+        """
+        Create a film roll with a test contact sheet and its frames.
+        """
+        name = os.path.join('contacts', '{}.png'.format(uuid.uuid4().hex))
+        os.makedirs(os.path.join(self.root, 'contacts'), exist_ok=True)
+        draw_sheet(count).save(os.path.join(self.root, name))
+        film_roll = models.FilmRoll.objects.create(
+            name=name, film=self.film, format=self.film_format,
+            shot_speed=200, developed_speed=200, contact_sheet=name)
+        for index in range(1, count + 1):
+            models.Frame.objects.create(index=index, film_roll=film_roll)
+        return film_roll
+
+    def slice_contact_sheets(self):
+        """
+        Run the slice_contact_sheets command, returning its output.
+        """
+        output = io.StringIO()
+        call_command('slice_contact_sheets', processes=1, batch_size=1,
+                     stdout=output, stderr=io.StringIO())
+        return output.getvalue()
+
+    def test_command(self):
+        """
+        Verify every roll's sheet is cut once, and again when its frames
+        change.
+        """
+        other_roll = self.create_roll(3)
+        self.assertIn("Sliced 2 of 2 contact sheets",
+                      self.slice_contact_sheets())
+        self.assertIn("Sliced 0 of 0 contact sheets",
+                      self.slice_contact_sheets())
+        cache = contacts.ContactCropCache()
+        path = cache.get(self.film_roll, 8)
+        self.assertEqual(os.path.basename(path), '8.jpg')
+        self.assertAlmostEqual(center_value(path), frame_color(7), delta=8)
+        self.assertAlmostEqual(center_value(cache.get(other_roll, 3)),
+                               frame_color(2), delta=8)
+
+        directory = os.path.dirname(path)
+        models.Frame.objects.create(index=-1, film_roll=self.film_roll)
+        self.assertIn("Sliced 1 of 1 contact sheets",
+                      self.slice_contact_sheets())
+        self.assertFalse(os.path.exists(directory))
+        self.assertTrue(os.path.exists(cache.get(self.film_roll, -1)))
+
+    def test_view(self):
+        """Verify crops are served, cutting the sheet on first request."""
+        frame = self.film_roll.frame_set.get(index=2)
+        response = self.client.get(contacts.crop_url(frame))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response.close()
+
+        for name, number in ((self.film_roll.contact_sheet.name, '9'),
+                             ('contacts/missing.png', '1')):
+            response = self.client.get(reverse(
+                'photo:contact-crop',
+                kwargs={'name': name, 'frame_number': number}))
+            self.assertEqual(response.status_code, 404)
+
+    def test_admin_preview(self):
+        """Verify the frame list shows crops of frames without a scan."""
+        self.client.login(username="admin", password="password")
+        response = self.client.get(reverse('admin:photo_frame_changelist'))
+        self.assertContains(response, contacts.crop_url(
+            self.film_roll.frame_set.get(index=1)))
@@ -0,0 +1,261 @@
+"""
+Tests for photo.derivatives
+"""
+import io
+import os
+import struct
+import uuid
+import zlib
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from PIL import Image
+
+from photo import derivatives, models
+from photo.tests.mixins import MediaRootMixin, TemporaryRootMixin
+
+
+def save_image(root, directory, size=(400, 300), color='red'):
+    """
+    Save a test image under a media root, returning its name.
+    """
+    name = os.path.join(directory, '{}.png'.format(uuid.uuid4().hex))
+    os.makedirs(os.path.join(root, directory), exist_ok=True)
+    Image.new('RGB', size, color).save(os.path.join(root, name))
+    return name
+
+def save_broken_png(root, directory):
+    """
+    Save a PNG whose pixel data ends early, followed by a malformed chunk,
+    which Pillow fails to read with a SyntaxError, returning its name.
+    """
+    def chunk(chunk_type, data):
+        return (struct.pack('>I', len(data)) + chunk_type + data +
+                struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+    compressor = zlib.compressobj()
+    rows = compressor.compress(b'\0' * (64 * 3 + 1)) + \
+        compressor.flush(zlib.Z_SYNC_FLUSH)
+    name = os.path.join(directory, '{}.png'.format(uuid.uuid4().hex))
+    os.makedirs(os.path.join(root, directory), exist_ok=True)
+    with open(os.path.join(root, name), 'wb') as image_file:
+        image_file.write(b'\x89PNG\r\n\x1a\n' + chunk(
+            b'IHDR', struct.pack('>IIBBBBB', 64, 48, 8, 2, 0, 0, 0)) +
+                         chunk(b'IDAT', rows) + chunk(b'I\xaaND', b''))
+    return name
+
+class DerivativeCacheTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for derivatives.DerivativeCache
+    """
+    def setUp(self):
+        super().setUp()
+        self.cache = derivatives.DerivativeCache(
+            self.root, sizes={'thumbnail': (100, 100)}, max_size=10 ** 6)
+
+    def test_render(self):
+        """
+        Verify a derivative is rendered next to its source, within its size.
+        """
+        name = save_image(self.root, 'frames')
+        path = self.cache.get(name, 'thumbnail')
+        self.assertEqual(os.path.dirname(path),
+                         os.path.join(self.root, 'frames', 'derivatives'))
+        self.assertTrue(os.path.basename(path).startswith(
+            os.path.splitext(os.path.basename(name))[0]))
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (100, 75))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_cached(self):
+        """
+        Verify a cached derivative is not rendered again.
+        """
+        name = save_image(self.root, 'prints')
+        path = self.cache.get(name, 'thumbnail')
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'ab') as derivative_file:
+            derivative_file.write(b'cached')
+        self.assertEqual(self.cache.get(name, 'thumbnail'), path)
+        with open(path, 'rb') as derivative_file:
+            self.assertTrue(derivative_file.read().endswith(b'cached'))
+        self.assertGreaterEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_invalidated(self):
+        """
+        Verify a changed source gets a new derivative, and the stale one is
+        removed.
+        """
+        name = save_image(self.root, 'contacts')
+        path = self.cache.get(name, 'thumbnail')
+        Image.new('RGB', (300, 400), 'blue').save(
+            os.path.join(self.root, name))
+        new_path = self.cache.get(name, 'thumbnail')
+        self.assertNotEqual(new_path, path)
+        self.assertFalse(os.path.exists(path))
+        with Image.open(new_path) as image:
+            self.assertEqual(image.size, (75, 100))
+
+    def test_replaced(self):
+        """
+        Verify a replaced source gets a new derivative, even with its length
+        and modification time preserved.
+        """
+        name = save_image(self.root, 'frames')
+        source_path = os.path.join(self.root, name)
+        path = self.cache.get(name, 'thumbnail')
+        replacement = save_image(self.root, 'frames')
+        stat = os.stat(source_path)
+        os.utime(os.path.join(self.root, replacement),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(os.path.join(self.root, replacement), source_path)
+        self.assertNotEqual(self.cache.get(name, 'thumbnail'), path)
+
+    def test_evict(self):
+        """
+        Verify the least recently used derivatives are evicted.
+        """
+        paths = []
+        for index in range(3):
+            name = save_image(self.root, 'frames')
+            path = self.cache.get(name, 'thumbnail')
+            os.utime(path, (index, index))
+            paths.append(path)
+        self.cache.max_size = os.stat(paths[2]).st_size * 2
+        self.cache.evict()
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [False, True, True])
+
+    def test_usage(self):
+        """
+        Verify the running total of the cache's size is kept, and derivatives
+        are only evicted once it is over the maximum size.
+        """
+        paths = [self.cache.get(save_image(self.root, 'frames'), 'thumbnail')
+                 for _ in range(2)]
+        size = os.stat(paths[0]).st_size
+        self.assertEqual(self.cache.usage.add(0), size * 2)
+        os.utime(paths[0], (0, 0))
+        self.cache.max_size = size * 2
+        path = self.cache.get(save_image(self.root, 'frames'), 'thumbnail')
+        self.assertEqual([os.path.exists(path) for path in paths + [path]],
+                         [False, True, True])
+        self.assertEqual(self.cache.usage.add(0), size * 2)
+
+    def test_invalid_source(self):
+        """
+        Verify exception for a file outside the source directories.
+        """
+        with self.assertRaises(ValueError):
+            self.cache.source_path('../frames/test.png')
+        with self.assertRaises(ValueError):
+            self.cache.source_path('other/test.png')
+
+class DerivativeViewTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for views.derivative
+    """
+    def test_view(self):
+        """
+        Verify a derivative is served.
+        """
+        name = save_image(self.root, 'frames')
+        response = self.client.get(reverse(
+            'photo:derivative',
+            kwargs={'size_name': 'thumbnail', 'name': name}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response.close()
+
+    def test_not_found(self):
+        """
+        Verify a missing source or unknown size is not found.
+        """
+        response = self.client.get(reverse(
+            'photo:derivative',
+            kwargs={'size_name': 'thumbnail', 'name': 'frames/missing.png'}))
+        self.assertEqual(response.status_code, 404)
+        name = save_image(self.root, 'frames')
+        response = self.client.get(reverse(
+            'photo:derivative', kwargs={'size_name': 'huge', 'name': name}))
+        self.assertEqual(response.status_code, 404)
+
+class RenderDerivativesTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for queueing derivatives, and the render_derivatives command.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200)
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        cls.film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=200,
+            developed_speed=200)
+
+    def test_queue_on_save(self):
+        """
+        Verify saving an object with a scan queues it, and one without does
+        not.
+        """
+        models.Frame.objects.create(index=1, film_roll=self.film_roll)
+        self.assertEqual(models.PendingDerivative.objects.count(), 0)
+        name = save_image(self.root, 'frames')
+        frame = models.Frame.objects.create(index=2, film_roll=self.film_roll,
+                                            scan=name)
+        frame.save()
+        self.assertEqual(
+            list(models.PendingDerivative.objects.values_list('name',
+                                                              flat=True)),
+            [name])
+
+    def test_render_queued(self):
+        """
+        Verify queued files are rendered and removed from the queue.
+        """
+        name = save_image(self.root, 'frames')
+        models.Frame.objects.create(index=1, film_roll=self.film_roll,
+                                    scan=name)
+        call_command('render_derivatives', processes=1, stdout=io.StringIO())
+        self.assertTrue(derivatives.DerivativeCache().is_cached(name))
+        self.assertEqual(models.PendingDerivative.objects.count(), 0)
+
+    def test_backfill(self):
+        """
+        Verify backfill renders files that are not queued.
+        """
+        names = [save_image(self.root, directory) for directory
+                 in derivatives.SOURCE_DIRECTORIES]
+        output = io.StringIO()
+        call_command('render_derivatives', backfill=True, processes=2,
+                     stdout=output)
+        cache = derivatives.DerivativeCache()
+        self.assertTrue(all(cache.is_cached(name) for name in names))
+        self.assertIn("3 of 3", output.getvalue())
+        output = io.StringIO()
+        call_command('render_derivatives', backfill=True, processes=2,
+                     stdout=output)
+        self.assertIn("0 of 0", output.getvalue())
+
+    def test_broken_file(self):
+        """
+        Verify a file Pillow fails to read is reported, and the rest of the
+        queue is still rendered.
+        """
+        broken_name = save_broken_png(self.root, 'frames')
+        name = save_image(self.root, 'frames')
+        for index, scan in enumerate((broken_name, name)):
+            models.Frame.objects.create(index=index,
+                                        film_roll=self.film_roll, scan=scan)
+        errors = io.StringIO()
+        call_command('render_derivatives', processes=1,
+                     stdout=io.StringIO(), stderr=errors)
+        self.assertIn("{}: SyntaxError".format(broken_name),
+                      errors.getvalue())
+        self.assertTrue(derivatives.DerivativeCache().is_cached(name))
+        self.assertEqual(models.PendingDerivative.objects.count(), 0)
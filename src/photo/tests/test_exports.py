@@ -0,0 +1,140 @@
+"""
+Tests for photo.exports
+"""
+import csv
+from datetime import date
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from photo import exports, models
+
+
+class ExportTestCase(TestCase):
+    """
+    Tests for exports.export_lines, the export_catalog command and the export
+    view.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200, process="B&W")
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        finish = models.PhotoPaperFinish.objects.create(name="glossy")
+        paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=200,
+            developed_speed=200, shot_date=date(2016, 3, 1))
+        for index in range(-1, 4):
+            frame = models.Frame.objects.create(index=index,
+                                                film_roll=film_roll)
+        models.Print.objects.create(date=date(2016, 3, 2), sequence=1,
+                                    frame=frame, paper=paper, finish=finish)
+
+    def test_rows(self):
+        """
+        Verify rows include related names.
+        """
+        rows = list(exports.TABLES['rolls'].rows())
+        self.assertEqual(rows[0]['film'], "test film")
+        self.assertIsNone(rows[0]['developer'])
+        self.assertEqual(rows[0]['shot_date'], date(2016, 3, 1))
+        rows = list(exports.TABLES['prints'].rows())
+        self.assertEqual(
+            [rows[0][column] for column in
+             ('film_roll', 'frame', 'paper', 'finish', 'enlarger')],
+            ["roll", "3", "test paper", "glossy", None])
+
+    def test_chunks(self):
+        """
+        Verify rows are read in chunks, in order.
+        """
+        with self.assertNumQueries(3):
+            rows = list(exports.TABLES['frames'].rows(chunk_size=2))
+        self.assertEqual([row['frame'] for row in rows],
+                         ["00", "0", "1", "2", "3"])
+
+    def test_chunks_across_rolls(self):
+        """
+        Verify frames are read in chunks by roll and index, without sorting
+        on the joined roll name, and every frame is read once.
+        """
+        film_roll = models.FilmRoll.objects.get(name="roll")
+        film_roll.pk = None
+        film_roll.name = "another roll"
+        film_roll.save()
+        for index in range(3):
+            models.Frame.objects.create(index=index, film_roll=film_roll)
+        table = exports.TABLES['frames']
+        self.assertNotIn('film_roll__name', table.resource.ordering)
+        rows = list(table.rows(chunk_size=3))
+        self.assertEqual(len(rows), 8)
+        # each roll's frames are read together
+        names = [row['film_roll'] for row in rows]
+        self.assertEqual(sum(1 for previous, name in zip(names, names[1:])
+                             if name != previous), 1)
+        self.assertEqual(len({(row['film_roll'], row['frame'])
+                              for row in rows}), 8)
+
+    def test_csv(self):
+        """
+        Verify CSV export.
+        """
+        lines = list(exports.export_lines('frames', 'csv'))
+        rows = list(csv.DictReader(io.StringIO(''.join(lines))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['frame'], "00")
+        self.assertEqual(rows[0]['film'], "test film")
+
+    def test_ndjson(self):
+        """
+        Verify NDJSON export.
+        """
+        lines = list(exports.export_lines('prints', 'ndjson'))
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['date'], "2016-03-02")
+
+    def test_unknown_format(self):
+        """
+        Verify exception for an unknown format.
+        """
+        with self.assertRaises(ValueError):
+            list(exports.export_lines('frames', 'xml'))
+
+    def test_command(self):
+        """
+        Verify the export_catalog command.
+        """
+        output = io.StringIO()
+        call_command('export_catalog', 'rolls', format='ndjson',
+                     stdout=output)
+        self.assertEqual(json.loads(output.getvalue())['name'], "roll")
+
+    def test_view(self):
+        """
+        Verify the export view streams an export to staff.
+        """
+        url = reverse('photo:export', kwargs={'table_name': 'frames',
+                                              'file_format': 'csv'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        self.client.login(username="admin", password="password")
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 6)
+        response = self.client.get(reverse(
+            'photo:export', kwargs={'table_name': 'unknown',
+                                    'file_format': 'csv'}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,276 @@
+"""
+Tests for photo.imports
+"""
+from datetime import date
+import io
+import json
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from photo import imports, models
+from photo.compatibility import compatibility
+
+
+class ReadRowsTestCase(TestCase):
+    """
+    Tests for imports.read_rows
+    """
+    def test_csv(self):
+        """
+        Verify rows are read from CSV with a header.
+        """
+        stream = io.StringIO("film_roll,frame\nroll,00\n")
+        self.assertEqual(imports.read_rows(stream, 'csv'),
+                         [{'film_roll': 'roll', 'frame': '00'}])
+
+    def test_json(self):
+        """
+        Verify rows are read from JSON.
+        """
+        stream = io.StringIO(json.dumps([{'film_roll': 'roll', 'frame': 1}]))
+        self.assertEqual(imports.read_rows(stream, 'json'),
+                         [{'film_roll': 'roll', 'frame': 1}])
+
+    def test_unknown_format(self):
+        """
+        Verify exception for an unknown format.
+        """
+        with self.assertRaises(ValueError):
+            imports.read_rows(io.StringIO(""), 'xml')
+
+    def test_parse_frame_number(self):
+        """
+        Verify frame numbers are converted to indexes.
+        """
+        self.assertEqual(imports.parse_frame_number("00"), -1)
+        self.assertEqual(imports.parse_frame_number("12"), 12)
+        self.assertEqual(imports.parse_frame_number(0), 0)
+
+class ImportPrintsTestCase(TestCase):
+    """
+    Tests for imports.import_prints
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        glossy = models.PhotoPaperFinish.objects.create(name="glossy")
+        models.PhotoPaperFinish.objects.create(name="matte")
+        paper = models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        paper.finishes.add(glossy)
+        film_format_35mm = models.FilmFormat.objects.create(name="35mm",
+                                                            roll_film=True)
+        film_format_120 = models.FilmFormat.objects.create(name="120",
+                                                           roll_film=True)
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200)
+        roll_35mm = models.FilmRoll.objects.create(
+            name="roll_35mm", film=film, format=film_format_35mm,
+            shot_speed=200, developed_speed=200)
+        roll_120 = models.FilmRoll.objects.create(
+            name="roll_120", film=film, format=film_format_120,
+            shot_speed=200, developed_speed=200)
+        cls.frame_00 = models.Frame.objects.create(index=-1,
+                                                   film_roll=roll_35mm)
+        cls.frame_1 = models.Frame.objects.create(index=1,
+                                                  film_roll=roll_35mm)
+        models.Frame.objects.create(index=1, film_roll=roll_120)
+        enlarger = models.Enlarger.objects.create(name="enlarger", type=0,
+                                                  color_head=False)
+        enlarger.formats.add(film_format_35mm)
+        cls.existing = models.Print.objects.create(
+            date=date(2016, 1, 1), sequence=3, frame=cls.frame_1,
+            paper=paper, finish=glossy)
+
+    def setUp(self):
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    @staticmethod
+    def row(**kwargs):
+        """
+        Build a valid import row, overridden by keyword arguments.
+        """
+        row = {'film_roll': 'roll_35mm', 'frame': '1', 'paper': 'test paper',
+               'finish': 'glossy', 'enlarger': 'enlarger'}
+        row.update(kwargs)
+        return row
+
+    def test_import(self):
+        """
+        Verify valid rows are created, with sequences after existing prints.
+        """
+        prints = imports.import_prints(
+            [self.row(frame='00'), self.row(enlarger='')], date(2016, 1, 1))
+        self.assertEqual([str(new_print) for new_print in prints],
+                         ["20160101-4", "20160101-5"])
+        self.assertEqual(models.Print.objects.count(), 3)
+        self.assertEqual(prints[0].frame, self.frame_00)
+        self.assertIsNone(prints[1].enlarger)
+
+    def test_import_queries(self):
+        """
+        Verify the number of queries does not depend on the number of rows.
+        """
+        compatibility.load()
+        with self.assertNumQueries(9):
+            imports.import_prints([self.row()], date(2016, 1, 2))
+        with self.assertNumQueries(9):
+            imports.import_prints([self.row()] * 20, date(2016, 1, 3))
+
+    def test_import_sequences(self):
+        """
+        Verify explicit sequences are kept, and others numbered after them.
+        """
+        prints = imports.import_prints(
+            [self.row(sequence='7'), self.row(),
+             self.row(date='2016-01-02')], date(2016, 1, 1))
+        self.assertEqual([str(new_print) for new_print in prints],
+                         ["20160101-7", "20160101-8", "20160102-1"])
+
+    def test_invalid_rows(self):
+        """
+        Verify invalid rows are all reported, and nothing is created.
+        """
+        rows = [self.row(date='2016-01-01'),
+                self.row(date='2016-01-01', finish='matte'),
+                self.row(date='2016-01-01', film_roll='roll_120'),
+                self.row(date='2016-01-01', paper='unknown'),
+                self.row(date='2016-01-01', frame='2'),
+                self.row(date='')]
+        with self.assertRaises(ValidationError) as context:
+            imports.import_prints(rows)
+        messages = context.exception.messages
+        self.assertEqual(len(messages), 5)
+        self.assertTrue(messages[0].startswith("Row 2: Invalid combination "
+                                               "of paper"))
+        self.assertTrue(messages[1].startswith("Row 3: Invalid combination "
+                                               "of negative"))
+        self.assertEqual(models.Print.objects.count(), 1)
+
+    def test_existing_sequence(self):
+        """
+        Verify a sequence already used on a date is reported.
+        """
+        with self.assertRaises(ValidationError):
+            imports.import_prints([self.row(sequence=3)], date(2016, 1, 1))
+
+    def test_non_string_date(self):
+        """
+        Verify a date that is not a string, as from JSON, is reported as an
+        invalid row.
+        """
+        with self.assertRaises(ValidationError) as context:
+            imports.import_prints([self.row(date=20160101)])
+        self.assertTrue(context.exception.messages[0].startswith("Row 1: "))
+
+    def test_concurrent_import(self):
+        """
+        Verify a print saved by another import after the sequences are
+        numbered is reported, and nothing is created.
+        """
+        # pylint: disable=protected-access
+        assign_sequences = imports._assign_sequences
+
+        def assign_then_save(prints):
+            errors = assign_sequences(prints)
+            models.Print.objects.create(
+                date=prints[0].date, sequence=prints[0].sequence,
+                frame=self.frame_1, paper=self.existing.paper,
+                finish=self.existing.finish)
+            return errors
+
+        with mock.patch('photo.imports._assign_sequences', assign_then_save):
+            with self.assertRaises(ValidationError):
+                imports.import_prints([self.row()], date(2016, 1, 1))
+        self.assertEqual(models.Print.objects.count(), 1)
+
+class FilmRollImportTestCase(TestCase):
+    """
+    Tests for imports.create_frames and imports.import_film_rolls
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        cls.film = models.Film.objects.create(name="film",
+                                              manufacturer=manufacturer,
+                                              speed=400)
+        cls.film_format = models.FilmFormat.objects.create(name="35mm",
+                                                           roll_film=True)
+        models.Developer.objects.create(name="developer",
+                                        manufacturer=manufacturer,
+                                        powder=False)
+
+    def test_frame_indexes(self):
+        """
+        Verify frame indexes, with and without frame 00.
+        """
+        self.assertEqual(imports.frame_indexes(3), [1, 2, 3])
+        self.assertEqual(imports.frame_indexes(3, double_zero=True),
+                         [-1, 1, 2, 3])
+
+    def test_create_frames(self):
+        """
+        Verify frames are created in one insert, skipping existing frames.
+        """
+        film_rolls = [
+            models.FilmRoll.objects.create(
+                name="roll {}".format(number), film=self.film,
+                format=self.film_format, shot_speed=400, developed_speed=400)
+            for number in range(2)]
+        models.Frame.objects.create(index=2, film_roll=film_rolls[0])
+        with self.assertNumQueries(4):
+            frames = imports.create_frames(film_rolls, 12, double_zero=True)
+        self.assertEqual(len(frames), 25)
+        self.assertEqual(film_rolls[0].frame_set.count(), 13)
+        self.assertEqual(
+            list(film_rolls[1].frame_set.values_list('index', flat=True)),
+            [-1] + list(range(1, 13)))
+
+    def test_import_film_rolls(self):
+        """
+        Verify rolls and their frames are created.
+        """
+        rows = [{'name': 'roll 1', 'film': 'test film', 'format': '35mm',
+                 'frames': '36', 'double_zero': 'yes',
+                 'developer': 'test developer', 'shot_date': '2016-03-01'},
+                {'name': 'roll 2', 'film': 'test film', 'format': '35mm',
+                 'frames': 24, 'shot_speed': '800'}]
+        with self.assertNumQueries(8):
+            film_rolls = imports.import_film_rolls(rows)
+        self.assertEqual(len(film_rolls), 2)
+        roll_1 = models.FilmRoll.objects.get(name='roll 1')
+        self.assertEqual(roll_1.frame_set.count(), 37)
+        self.assertEqual(roll_1.shot_speed, 400)
+        self.assertEqual(roll_1.shot_date, date(2016, 3, 1))
+        roll_2 = models.FilmRoll.objects.get(name='roll 2')
+        self.assertEqual(roll_2.frame_set.count(), 24)
+        self.assertEqual(roll_2.developed_speed, 800)
+
+    def test_import_film_rolls_invalid(self):
+        """
+        Verify invalid rows are all reported, and nothing is created.
+        """
+        models.FilmRoll.objects.create(
+            name="existing", film=self.film, format=self.film_format,
+            shot_speed=400, developed_speed=400)
+        rows = [{'name': 'roll', 'film': 'test film', 'format': '35mm',
+                 'frames': 36},
+                {'name': 'roll', 'film': 'test film', 'format': '35mm',
+                 'frames': 36},
+                {'name': 'existing', 'film': 'test film', 'format': '35mm',
+                 'frames': 36},
+                {'name': 'other', 'film': 'unknown', 'format': '35mm',
+                 'frames': 36},
+                {'name': 'other', 'film': 'test film', 'format': '35mm'}]
+        with self.assertRaises(ValidationError) as context:
+            imports.import_film_rolls(rows)
+        self.assertEqual(len(context.exception.messages), 4)
+        self.assertEqual(models.FilmRoll.objects.count(), 1)
+        self.assertEqual(models.Frame.objects.count(), 0)
@@ -0,0 +1,173 @@
+"""
+Tests for photo.metadata
+"""
+import io
+import json
+import os
+import struct
+from unittest import mock
+import uuid
+
+from django.core.management import call_command
+from django.test import TestCase
+from PIL import Image
+
+from photo import metadata, models
+from photo.management.commands.extract_metadata import extract_scan
+from photo.tests.mixins import MediaRootMixin, TemporaryRootMixin
+
+SCANNER_TAGS = {271: "Scanner Co", 272: "Model 9000", 305: "ScanSoft 1.0"}
+
+
+def save_scan(root, directory, mode='I;16', size=(60, 40), extension='tif',
+              **params):
+    """
+    Save a test scan under a media root, returning its name.
+    """
+    name = os.path.join(directory, '{}.{}'.format(uuid.uuid4().hex,
+                                                  extension))
+    os.makedirs(os.path.join(root, directory), exist_ok=True)
+    Image.new(mode, size).save(os.path.join(root, name), **params)
+    return name
+
+class ExtractTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for metadata.extract
+    """
+    def test_tiff(self):
+        """Verify the size, depth, resolution and tags of a TIFF are read."""
+        name = save_scan(self.root, 'frames', dpi=(2400, 2400),
+                         tiffinfo=SCANNER_TAGS)
+        with mock.patch.object(Image.Image, 'load',
+                               side_effect=AssertionError("decoded")):
+            result = metadata.extract(os.path.join(self.root, name))
+        self.assertEqual((result['format'], result['mode'], result['bits'],
+                          result['channels']), ('TIFF', 'I;16', 16, 1))
+        self.assertEqual((result['width'], result['height'],
+                          result['long_edge']), (60, 40, 60))
+        self.assertEqual((result['dpi_x'], result['dpi_y']), (2400, 2400))
+        self.assertEqual(result['scanner'], "Scanner Co Model 9000")
+        self.assertEqual(result['software'], "ScanSoft 1.0")
+        self.assertEqual(result['tags']['BitsPerSample'], [16])
+        json.dumps(result['tags'])
+        self.assertEqual(result['file_size'],
+                         os.path.getsize(os.path.join(self.root, name)))
+        self.assertEqual(len(result['content_hash']), 64)
+
+    def test_jpeg(self):
+        """Verify an 8-bit RGB JPEG without EXIF is read."""
+        name = save_scan(self.root, 'prints', mode='RGB', extension='jpg',
+                         dpi=(300, 300))
+        result = metadata.extract(os.path.join(self.root, name))
+        self.assertEqual((result['format'], result['mode'], result['bits'],
+                          result['channels']), ('JPEG', 'RGB', 8, 3))
+        self.assertEqual(result['dpi_x'], 300)
+        self.assertEqual(result['scanner'], "")
+        self.assertEqual(result['tags'], {})
+
+    def test_long_scanner(self):
+        """Verify a long make and model are cut to fit the scanner field."""
+        name = save_scan(self.root, 'frames',
+                         tiffinfo={271: "M" * 150, 272: "N" * 150})
+        result = metadata.extract(os.path.join(self.root, name))
+        self.assertEqual(len(result['scanner']), 200)
+
+    def test_tag_values(self):
+        """Verify only rational tags are converted from pairs."""
+        image = mock.Mock(spec=['_getexif'])
+        image._getexif.return_value = {282: (300, 1), 33434: (1, 125),
+                                       37386: (0, 0), 258: (8, 8)}
+        # pylint: disable=protected-access
+        self.assertEqual(metadata._tags(image),
+                         {'XResolution': 300, 'ExposureTime': 0.008,
+                          'BitsPerSample': [8, 8]})
+        name = save_scan(self.root, 'frames', mode='LA')
+        result = metadata.extract(os.path.join(self.root, name))
+        self.assertEqual(result['tags']['BitsPerSample'], [8, 8])
+
+    def test_not_an_image(self):
+        """Verify a file that is not an image raises an error."""
+        path = os.path.join(self.root, 'scan.tif')
+        with open(path, 'wb') as scan:
+            scan.write(b'not an image')
+        self.assertRaises(OSError, metadata.extract, path)
+
+class ExtractMetadataCommandTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for the extract_metadata command.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200, process="B&W")
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        cls.film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=200,
+            developed_speed=200)
+
+    def extract(self):
+        """
+        Run the command, returning its output.
+        """
+        output = io.StringIO()
+        call_command('extract_metadata', processes=1, stdout=output,
+                     stderr=io.StringIO())
+        return output.getvalue()
+
+    def test_incremental(self):
+        """
+        Verify only new and changed files are read, and metadata of removed
+        scans is deleted.
+        """
+        large = models.Frame.objects.create(
+            index=1, film_roll=self.film_roll,
+            scan=save_scan(self.root, 'frames', size=(5000, 3000)))
+        models.Frame.objects.create(
+            index=2, film_roll=self.film_roll,
+            scan=save_scan(self.root, 'frames', mode='RGB', size=(5000, 10)))
+        models.Frame.objects.create(index=3, film_roll=self.film_roll)
+        self.film_roll.contact_sheet = save_scan(self.root, 'contacts',
+                                                 mode='L')
+        self.film_roll.save()
+
+        self.assertIn("3 of 3 changed files, removed 0", self.extract())
+        self.assertEqual(
+            list(models.ScanMetadata.objects.filter(
+                kind=models.ScanMetadata.FRAME, bits=16,
+                long_edge__gt=4000).values_list('owner', flat=True)),
+            [large.pk])
+        self.assertEqual(models.ScanMetadata.objects.get(
+            owner=self.film_roll.pk).kind, models.ScanMetadata.CONTACT_SHEET)
+        self.assertIn("0 of 0 changed files", self.extract())
+
+        large.scan = save_scan(self.root, 'frames', size=(100, 100))
+        large.save()
+        self.assertIn("1 of 1 changed files", self.extract())
+        self.assertEqual(models.ScanMetadata.objects.get(
+            owner=large.pk).long_edge, 100)
+
+        large.delete()
+        self.assertIn("0 of 0 changed files, removed 1", self.extract())
+        self.assertEqual(models.ScanMetadata.objects.count(), 2)
+
+    def test_missing_file(self):
+        """Verify a missing file is reported and skipped."""
+        models.Frame.objects.create(index=1, film_roll=self.film_roll,
+                                    scan='frames/missing.tif')
+        self.assertIn("0 of 0 changed files", self.extract())
+
+    def test_corrupt_file(self):
+        """
+        Verify any error reading a file is returned by the worker, rather
+        than raised.
+        """
+        name = save_scan(self.root, 'frames')
+        with mock.patch.object(metadata.Image, 'open',
+                               side_effect=struct.error("unpack")):
+            result = extract_scan(('frame', 1, name,
+                                   os.path.join(self.root, name)))
+        self.assertEqual(result, ('frame', 1, name, "error: unpack"))
@@ -0,0 +1,121 @@
+"""
+Tests for photo.middleware
+"""
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from photo import middleware, models
+
+
+class RequestTimingMiddlewareTestCase(TestCase):
+    """
+    Tests for middleware.RequestTimingMiddleware and the request_report
+    command.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        for number in range(3):
+            models.Film.objects.create(name="film {}".format(number),
+                                       manufacturer=manufacturer, speed=200,
+                                       process="B&W")
+
+    def setUp(self):
+        self.client.login(username="admin", password="password")
+        handle, self.log = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.log)
+
+    def read_log(self):
+        """
+        Read the records from the timing log.
+        """
+        with open(self.log) as log:
+            return [json.loads(line) for line in log]
+
+    def test_disabled(self):
+        """Test that nothing is recorded when timing is off."""
+        response = self.client.get(reverse('admin:photo_film_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing(self):
+        """Test that query counts and times are sent in a header, and
+        logged."""
+        with override_settings(PHOTO_REQUEST_TIMING=True,
+                               PHOTO_REQUEST_TIMING_LOG=self.log), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:photo_film_changelist'))
+        self.assertEqual(response.status_code, 200)
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[\d.]+;desc="{} queries", '
+                         r'total;dur=[\d.]+$'.format(len(queries)))
+        self.assertNotIn('make_cursor', connection.__dict__)
+        self.assertNotIn('make_debug_cursor', connection.__dict__)
+
+        records = self.read_log()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['view'], 'admin:photo_film_changelist')
+        self.assertEqual(records[0]['status'], 200)
+        self.assertEqual(records[0]['queries'], len(queries))
+        self.assertEqual(len(records[0]['slowest']),
+                         min(len(queries), middleware.DEFAULT_SLOWEST))
+        for query in records[0]['slowest']:
+            self.assertFalse(query['call_site'].startswith(
+                middleware.DJANGO_DIRECTORY))
+
+    def test_no_log(self):
+        """Test that the header is sent without a log."""
+        with override_settings(PHOTO_REQUEST_TIMING=True,
+                               PHOTO_REQUEST_TIMING_LOG=None):
+            response = self.client.get(reverse('admin:photo_film_changelist'))
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(self.read_log(), [])
+
+    def test_report(self):
+        """Test that the log is aggregated by view."""
+        with override_settings(PHOTO_REQUEST_TIMING=True,
+                               PHOTO_REQUEST_TIMING_LOG=self.log):
+            for _ in range(3):
+                self.client.get(reverse('admin:photo_film_changelist'))
+            self.client.get(reverse('admin:index'))
+        views, call_sites = middleware.summarize_timings(self.read_log())
+        self.assertEqual(sorted((view['view'], view['requests'])
+                                for view in views),
+                         [('admin:index', 1),
+                          ('admin:photo_film_changelist', 3)])
+        self.assertTrue(call_sites)
+
+        output = StringIO()
+        call_command('request_report', log=self.log, stdout=output)
+        self.assertIn('admin:photo_film_changelist', output.getvalue())
+
+
+class QueryRecorderTestCase(TestCase):
+    """
+    Tests for middleware.QueryRecorder
+    """
+
+    def test_slowest(self):
+        """Test that only the slowest queries are kept, slowest first."""
+        recorder = middleware.QueryRecorder(slowest=3)
+        for duration in (0.2, 0.1, 0.5, 0.3, 0.05, 0.4):
+            recorder.record("SELECT {}".format(duration), duration)
+        self.assertEqual(recorder.count, 6)
+        self.assertAlmostEqual(recorder.time, 1.55)
+        self.assertEqual([query['sql'] for query in recorder.slowest()],
+                         ["SELECT 0.5", "SELECT 0.4", "SELECT 0.3"])
+        self.assertEqual(recorder.slowest()[0]['call_site'].split(':')[0],
+                         __file__)
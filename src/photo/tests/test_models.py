@@ -2,11 +2,15 @@
 Tests for models in the photo application.
 """
 from datetime import date
+import io
 
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from photo import models
+from photo import models, signals
+from photo.compatibility import compatibility
 
 
 # Model tests
@@ -312,6 +316,10 @@ class PrintTestCase(TestCase):
         cls.enlarger.formats.add(cls.film_format_35mm)
         cls.enlarger.save()
 
+    def setUp(self):
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
     def test_clean_valid_finish(self):
         """
         Test Print.clean, for valid combination of paper and finish.
@@ -354,6 +362,53 @@ class PrintTestCase(TestCase):
                                   enlarger=self.enlarger)
         self.assertRaises(ValidationError, test_print.clean)
 
+    def test_clean_queries(self):
+        """
+        Test Print.clean checks the rules against the cached compatibility
+        tables, only querying for the format of a frame that is not loaded.
+        """
+        compatibility.load()
+        test_print = models.Print(paper=self.photo_paper,
+                                  finish=self.finish_glossy)
+        with self.assertNumQueries(0):
+            test_print.clean()
+        test_print = models.Print(paper=self.photo_paper,
+                                  finish=self.finish_glossy,
+                                  frame_id=self.frame_35mm.pk,
+                                  enlarger=self.enlarger)
+        with self.assertNumQueries(1):
+            test_print.clean()
+        test_print.frame = models.Frame.objects.select_related(
+            'film_roll').get(pk=self.frame_35mm.pk)
+        with self.assertNumQueries(0):
+            test_print.clean()
+
+    def test_clean_compatibility_changes(self):
+        """
+        Test Print.clean sees changes to paper finishes and enlarger formats.
+        """
+        test_print = models.Print(paper=self.photo_paper,
+                                  finish=self.finish_matte,
+                                  frame=self.frame_120,
+                                  enlarger=self.enlarger)
+        self.assertRaises(ValidationError, test_print.clean)
+        self.photo_paper.finishes.add(self.finish_matte)
+        self.assertRaises(ValidationError, test_print.clean)
+        self.enlarger.formats.add(self.frame_120.film_roll.format)
+        test_print.clean()
+        self.photo_paper.finishes.remove(self.finish_matte)
+        self.assertRaises(ValidationError, test_print.clean)
+
+    def test_clean_missing_fields(self):
+        """
+        Test Print.clean skips rules whose fields are not set, leaving them to
+        field validation.
+        """
+        test_print = models.Print(paper=self.photo_paper,
+                                  enlarger=self.enlarger)
+        with self.assertNumQueries(0):
+            test_print.clean()
+
     def test_str(self):
         """
         Test the __str__ method on :model:`photo.Print`
@@ -373,3 +428,128 @@ class EnlargerTestCase(TestCase):
         test_enlarger = models.Enlarger(name="test enlarger")
         self.assertEqual(str(test_enlarger), "test enlarger",
                          "Enlarger.__str__ return unexpected value.")
+
+class DisplayNameTestCase(TestCase):
+    """
+    Tests for the display_name columns maintained by
+    :class:`photo.models.DisplayNameMixin` and :mod:`photo.signals`.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = models.Manufacturer.objects.create(
+            name="test manufacturer", short_name="test")
+        film = models.Film.objects.create(
+            name="film", manufacturer=manufacturer, speed=200,
+            process="B&W")
+        models.Developer.objects.create(
+            name="developer", manufacturer=manufacturer, powder=False)
+        models.PhotoPaper.objects.create(
+            name="paper", manufacturer=manufacturer, paper_type="RC",
+            multigrade=True)
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=200,
+            developed_speed=200)
+        for index in (-1, 1, 12):
+            models.Frame.objects.create(index=index, film_roll=film_roll)
+
+    def display_names(self):
+        """
+        Read the stored display names of the test objects.
+        """
+        return (
+            [model.objects.get().display_name for model
+             in (models.Film, models.Developer, models.PhotoPaper)],
+            list(models.Frame.objects.order_by('index')
+                 .values_list('display_name', flat=True)))
+
+    def test_saved(self):
+        """
+        Test display names are stored when objects are saved.
+        """
+        self.assertEqual(self.display_names(),
+                         (["test film", "test developer", "test paper"],
+                          ["roll-00", "roll-1", "roll-12"]))
+
+    def test_update_fields(self):
+        """
+        Test display names are stored when only some fields are saved.
+        """
+        film = models.Film.objects.get()
+        film.name = "renamed"
+        film.save(update_fields=['name'])
+        self.assertEqual(models.Film.objects.get().display_name,
+                         "test renamed")
+
+    def test_str_uses_display_name(self):
+        """
+        Test __str__ of a fetched object does not query related objects.
+        """
+        frame = models.Frame.objects.get(index=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(frame), "roll-1")
+
+    def test_manufacturer_renamed(self):
+        """
+        Test renaming a manufacturer updates its products.
+        """
+        manufacturer = models.Manufacturer.objects.get()
+        manufacturer.short_name = "new"
+        manufacturer.save()
+        self.assertEqual(self.display_names()[0],
+                         ["new film", "new developer", "new paper"])
+
+    def test_film_roll_renamed(self):
+        """
+        Test renaming a film roll updates its frames.
+        """
+        film_roll = models.FilmRoll.objects.get()
+        film_roll.name = "new"
+        film_roll.save()
+        self.assertEqual(self.display_names()[1],
+                         ["new-00", "new-1", "new-12"])
+
+    def test_rebuild(self):
+        """
+        Test the rebuild_display_names command.
+        """
+        models.Film.objects.update(display_name="")
+        models.Frame.objects.update(display_name="")
+        call_command('rebuild_display_names', stdout=io.StringIO())
+        self.assertEqual(self.display_names(),
+                         (["test film", "test developer", "test paper"],
+                          ["roll-00", "roll-1", "roll-12"]))
+
+
+class SQLitePragmaTestCase(TestCase):
+    """
+    Test cases for the SQLite connection pragmas.
+    """
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+
+    def query_pragma(self, name):
+        """
+        Read a pragma from the default connection.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA {}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Test that connections get the pragmas."""
+        self.assertEqual(self.query_pragma('synchronous'), 1)
+        self.assertEqual(self.query_pragma('temp_store'), 2)
+        self.assertEqual(self.query_pragma('cache_size'), -20000)
+
+    def test_setting(self):
+        """Test that PHOTO_SQLITE_PRAGMAS overrides the pragmas."""
+        for cache_size in (-1000, -20000):
+            with self.settings(PHOTO_SQLITE_PRAGMAS=(('cache_size',
+                                                      cache_size),)):
+                signals.configure_sqlite(sender=type(connection),
+                                         connection=connection)
+            self.assertEqual(self.query_pragma('cache_size'), cache_size)
@@ -0,0 +1,188 @@
+"""
+Tests for photo.scans
+"""
+import os
+import struct
+from unittest import mock
+
+from django.test import TestCase
+from PIL import Image
+
+from photo import derivatives, scans
+from photo.tests.mixins import TemporaryRootMixin
+from photo.tests.test_tiles import save_striped_tiff
+
+
+def pattern_image(mode='RGB', size=(90, 70)):
+    """
+    Draw a test image whose pixels vary along both axes.
+    """
+    width, height = size
+    bands = len(mode)
+    data = bytes((x * 3 + y * 5 + band * 40) % 256 for y in range(height)
+                 for x in range(width) for band in range(bands))
+    return Image.frombytes(mode, size, data)
+
+def save_pgm16(path, size=(40, 30), maximum=65535):
+    """
+    Save a 16 bit PGM with a comment in its header, returning its samples.
+    """
+    width, height = size
+    samples = [(x * 1000 + y * 37) % (maximum + 1) for y in range(height)
+               for x in range(width)]
+    with open(path, 'wb') as pgm:
+        pgm.write('P5\n# scanned\n{} {}\n{}\n'.format(
+            width, height, maximum).encode())
+        pgm.write(struct.pack('>{}H'.format(len(samples)), *samples))
+    return samples
+
+class MappedScanTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for scans.MappedScan
+    """
+    def test_tiff(self):
+        """
+        Verify a TIFF's bands are viewed as arrays without copying, and
+        match the image.
+        """
+        path = os.path.join(self.root, 'scan.tif')
+        image = pattern_image()
+        image.save(path)
+        with scans.open_scan(path) as scan:
+            self.assertEqual((scan.width, scan.height, scan.channels,
+                              scan.bits), (90, 70, 3, 8))
+            self.assertTrue(scan.contiguous)
+            bands = list(scan.bands(rows=32))
+            self.assertEqual([start for start, _ in bands], [0, 32, 64])
+            samples = scan.array(bands[1][1])
+            self.assertEqual(samples.shape, (32, 90, 3))
+            self.assertFalse(samples.flags.owndata)
+            self.assertFalse(samples.flags.writeable)
+            self.assertEqual(tuple(samples[3, 10]),
+                             image.getpixel((10, 35)))
+            del samples, bands
+
+    def test_strips(self):
+        """
+        Verify bands spanning strips that are apart in the file are copied
+        together, and those that are not are viewed in place.
+        """
+        image = pattern_image('L')
+        for gap, contiguous in ((0, True), (7, False)):
+            path = os.path.join(self.root, 'scan{}.tif'.format(gap))
+            save_striped_tiff(path, image, rows_per_strip=16, gap=gap)
+            with scans.open_scan(path) as scan:
+                self.assertEqual(scan.contiguous, contiguous)
+                data = b''.join(bytes(buffer) for _, buffer
+                                in scan.bands(rows=10))
+                self.assertEqual(data, image.tobytes())
+                self.assertEqual(bytes(scan.rows(20, 30)),
+                                 image.crop((0, 20, 90, 30)).tobytes())
+
+    def test_pgm(self):
+        """Verify 16 bit samples of a PGM are read in their byte order."""
+        path = os.path.join(self.root, 'scan.pgm')
+        samples = save_pgm16(path)
+        with scans.open_scan(path) as scan:
+            self.assertEqual((scan.width, scan.height, scan.channels,
+                              scan.bits, scan.dtype), (40, 30, 1, 16, '>u2'))
+            array = scan.array(scan.rows(0, 30))
+            self.assertEqual(array.ravel().tolist(), samples)
+            del array
+
+            saved_numpy = scans.numpy
+            scans.numpy = None
+            try:
+                self.assertEqual(list(scan.array(scan.rows(2, 3))),
+                                 samples[80:120])
+            finally:
+                scans.numpy = saved_numpy
+
+    def test_unsupported(self):
+        """
+        Verify compressed, truncated and other files cannot be mapped.
+        """
+        image = pattern_image()
+        for name in ('scan.png', 'scan.jpg'):
+            image.save(os.path.join(self.root, name))
+        image.save(os.path.join(self.root, 'scan.tif'))
+        with open(os.path.join(self.root, 'scan.tif'), 'rb') as scan_file:
+            data = scan_file.read()
+        with open(os.path.join(self.root, 'short.tif'), 'wb') as scan_file:
+            scan_file.write(data[:len(data) // 2])
+        with open(os.path.join(self.root, 'empty.tif'), 'wb'):
+            pass
+        for name in ('scan.png', 'scan.jpg', 'short.tif', 'empty.tif'):
+            with self.assertRaises(ValueError, msg=name):
+                scans.open_scan(os.path.join(self.root, name))
+
+class BatchTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for scans.histogram, scans.reduce and the derivatives rendered
+    from mapped scans.
+    """
+    def setUp(self):
+        super().setUp()
+        self.image = pattern_image(size=(300, 200))
+        self.path = os.path.join(self.root, 'scan.tif')
+        save_striped_tiff(self.path, self.image, rows_per_strip=7, gap=3)
+
+    def test_histogram(self):
+        """Verify histograms match Pillow's, with and without numpy."""
+        expected = self.image.histogram()
+        with scans.open_scan(self.path) as scan:
+            counts = scans.histogram(scan, rows=16)
+            self.assertEqual(sum(counts, []), expected)
+            saved_numpy = scans.numpy
+            scans.numpy = None
+            try:
+                self.assertEqual(sum(scans.histogram(scan), []), expected)
+            finally:
+                scans.numpy = saved_numpy
+
+        pgm_path = os.path.join(self.root, 'scan.pgm')
+        samples = save_pgm16(pgm_path)
+        with scans.open_scan(pgm_path) as scan:
+            counts = scans.histogram(scan)[0]
+        self.assertEqual(counts[samples[1] >> 8], sum(
+            1 for sample in samples if sample >> 8 == samples[1] >> 8))
+
+    def test_maximum(self):
+        """
+        Verify samples of a PGM are scaled to 8 bits by its maximum value.
+        """
+        path = os.path.join(self.root, 'scan.pgm')
+        samples = save_pgm16(path, size=(40, 32), maximum=4095)
+        with scans.open_scan(path) as scan:
+            self.assertEqual(scan.maximum, 4095)
+            counts = scans.histogram(scan)[0]
+            reduced = scans.reduce(scan, 8)
+        self.assertEqual(counts[samples[1] >> 4], sum(
+            1 for sample in samples if sample >> 4 == samples[1] >> 4))
+        square = [samples[y * 40 + x] for y in range(8) for x in range(8)]
+        self.assertEqual(reduced[0, 0, 0], sum(square) // 64 >> 4)
+
+    def test_reduce(self):
+        """Verify squares of pixels are averaged, a band at a time."""
+        with scans.open_scan(self.path) as scan:
+            reduced = scans.reduce(scan, 4, rows=10)
+        self.assertEqual(reduced.shape, (50, 75, 3))
+        square = [self.image.getpixel((x, y))[1] for y in range(8, 12)
+                  for x in range(20, 24)]
+        self.assertEqual(reduced[2, 5, 1], sum(square) // 16)
+
+    def test_derivative(self):
+        """
+        Verify derivatives of large uncompressed scans are rendered from
+        the mapping, and small ones with Pillow.
+        """
+        destination = os.path.join(self.root, 'thumbnail.jpg')
+        with mock.patch.object(derivatives.Image, 'open',
+                               side_effect=AssertionError("decoded")):
+            derivatives.render(self.path, destination, (40, 40))
+        with open(destination, 'rb') as image_file:
+            self.assertEqual(max(Image.open(image_file).size), 40)
+        self.assertIsNone(scans.reduced_image(self.path, (200, 200)))
+        derivatives.render(self.path, destination, (200, 200))
+        with open(destination, 'rb') as image_file:
+            self.assertEqual(Image.open(image_file).size, (200, 133))
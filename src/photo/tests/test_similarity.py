@@ -0,0 +1,251 @@
+"""
+Tests for photo.similarity
+"""
+import io
+import os
+import random
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from PIL import Image, ImageDraw, ImageFilter
+
+from photo import models, similarity
+from photo.tests.mixins import MediaRootMixin
+from photo.tests.test_derivatives import save_broken_png
+from photo.tests.test_metadata import save_scan
+
+
+def draw_scene(seed, size=(240, 160)):
+    """
+    Draw a random grayscale scene of rectangles and ellipses.
+    """
+    generator = random.Random(seed)
+    image = Image.new('L', size, generator.randrange(256))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x_1, x_2 = sorted(generator.randrange(size[0]) for _ in range(2))
+        y_1, y_2 = sorted(generator.randrange(size[1]) for _ in range(2))
+        shape = generator.choice((draw.rectangle, draw.ellipse))
+        shape((x_1, y_1, x_2, y_2), fill=generator.randrange(256))
+    return image
+
+def image_file(image, image_format='PNG'):
+    """
+    Save an image into a file object.
+    """
+    output = io.BytesIO()
+    image.save(output, image_format)
+    output.seek(0)
+    return output
+
+class HashTestCase(TestCase):
+    """
+    Tests for the hash functions.
+    """
+    def test_similar_images(self):
+        """
+        Verify a resized, blurred JPEG of an image hashes close to it, and a
+        different image far from it.
+        """
+        original = draw_scene(1)
+        copy = original.resize((600, 400)).filter(ImageFilter.GaussianBlur(2))
+        hashes = similarity.image_hashes(image_file(original))
+        copy_hashes = similarity.image_hashes(image_file(copy.convert('RGB'),
+                                                         'JPEG'))
+        other_hashes = similarity.image_hashes(image_file(draw_scene(2)))
+        for algorithm in similarity.ALGORITHMS:
+            self.assertLess(
+                similarity.hamming(hashes[algorithm],
+                                   copy_hashes[algorithm]), 8, algorithm)
+            self.assertGreater(
+                similarity.hamming(hashes[algorithm],
+                                   other_hashes[algorithm]), 12, algorithm)
+
+    def test_format(self):
+        """Verify hashes are formatted as 16 hexadecimal digits."""
+        self.assertEqual(similarity.format_hash(0xff), '00000000000000ff')
+        self.assertEqual(similarity.hamming(0b1011, 0b0110), 3)
+
+class BKTreeTestCase(TestCase):
+    """
+    Tests for similarity.BKTree
+    """
+    def test_search(self):
+        """
+        Verify searches find the same hashes as comparing every one, without
+        visiting every node.
+        """
+        generator = random.Random(0)
+        hashes = [generator.getrandbits(64) for _ in range(2000)]
+        # near duplicates of the first few hashes
+        hashes += [value ^ (1 << generator.randrange(64))
+                   for value in hashes[:20]]
+        tree = similarity.BKTree()
+        for number, value in enumerate(hashes):
+            tree.add(value, number)
+        self.assertEqual(tree.size, len(hashes))
+
+        visited = []
+        original_hamming = similarity.hamming
+        def counting_hamming(hash_1, hash_2):
+            """Count the comparisons."""
+            visited.append(hash_2)
+            return original_hamming(hash_1, hash_2)
+        for target in hashes[:20]:
+            expected = sorted(
+                (similarity.hamming(target, value), number)
+                for number, value in enumerate(hashes)
+                if similarity.hamming(target, value) <= 4)
+            visited.clear()
+            similarity.hamming = counting_hamming
+            try:
+                results = tree.search(target, 4)
+            finally:
+                similarity.hamming = original_hamming
+            self.assertEqual(sorted(results), expected)
+            self.assertEqual([distance for distance, _ in results],
+                             sorted(distance for distance, _ in results))
+            self.assertLess(len(visited), len(hashes) / 2)
+
+    def test_duplicates(self):
+        """Verify equal hashes are all found."""
+        tree = similarity.BKTree()
+        tree.add(5, 'a')
+        tree.add(5, 'b')
+        self.assertEqual(tree.search(5, 0), [(0, 'a'), (0, 'b')])
+        self.assertEqual(similarity.BKTree().search(5, 10), [])
+
+class SimilarScansTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for the hash_scans and find_similar commands and the similar scans
+    API.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password")
+        manufacturer = models.Manufacturer.objects.create(name="manufacturer",
+                                                          short_name="test")
+        film = models.Film.objects.create(name="film",
+                                          manufacturer=manufacturer,
+                                          speed=200, process="B&W")
+        film_format = models.FilmFormat.objects.create(name="35mm",
+                                                       roll_film=True)
+        cls.film_roll = models.FilmRoll.objects.create(
+            name="roll", film=film, format=film_format, shot_speed=200,
+            developed_speed=200)
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(similarity.index.invalidate)
+        self.frames = []
+        for index in range(3):
+            name = os.path.join('frames', '{}.tif'.format(index))
+            os.makedirs(os.path.join(self.root, 'frames'), exist_ok=True)
+            draw_scene(index).save(os.path.join(self.root, name))
+            self.frames.append(models.Frame.objects.create(
+                index=index + 1, film_roll=self.film_roll, scan=name))
+        self.film_roll.contact_sheet = save_scan(self.root, 'contacts',
+                                                 mode='L')
+        self.film_roll.save()
+
+    def hash_scans(self):
+        """
+        Run the hash_scans command, returning its output.
+        """
+        output = io.StringIO()
+        call_command('hash_scans', processes=1, stdout=output,
+                     stderr=io.StringIO())
+        return output.getvalue()
+
+    def test_hash_scans(self):
+        """
+        Verify frame scans are hashed incrementally, and the index follows
+        changes.
+        """
+        self.assertIn("Hashed 3 of 3 changed files, removed 0",
+                      self.hash_scans())
+        self.assertEqual(models.ScanHash.objects.count(), 3)
+        self.assertFalse(models.ScanHash.objects.filter(
+            owner=self.film_roll.pk).exists())
+        self.assertIn("Hashed 0 of 0 changed files", self.hash_scans())
+
+        query = image_file(draw_scene(1).resize((120, 80)))
+        value, results = similarity.find_similar(query, max_distance=8)
+        self.assertEqual([result['owner'] for result in results],
+                         [self.frames[1].pk])
+        self.assertEqual(results[0]['kind'], models.ScanMetadata.FRAME)
+
+        self.frames[1].delete()
+        self.assertIn("removed 1", self.hash_scans())
+        self.assertEqual(similarity.index.search(value, max_distance=8), [])
+
+    def test_broken_scan(self):
+        """
+        Verify a scan Pillow fails to read is reported, and the others are
+        still hashed.
+        """
+        self.frames[0].scan = save_broken_png(self.root, 'frames')
+        self.frames[0].save()
+        errors = io.StringIO()
+        output = io.StringIO()
+        call_command('hash_scans', processes=1, stdout=output, stderr=errors)
+        self.assertIn("SyntaxError", errors.getvalue())
+        self.assertIn("Hashed 2 of 3 changed files", output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('find_similar', os.path.join(
+                self.root, self.frames[0].scan.name), stdout=io.StringIO())
+
+    def test_find_similar_command(self):
+        """Verify the command lists the nearest scans."""
+        self.hash_scans()
+        path = os.path.join(self.root, 'query.jpg')
+        draw_scene(2).save(path)
+        output = io.StringIO()
+        call_command('find_similar', path, limit=1, stdout=output)
+        self.assertIn('frames/2.tif', output.getvalue())
+        self.assertIn("Found 1 similar scans", output.getvalue())
+
+    def test_api(self):
+        """
+        Verify the API returns the nearest scans for an uploaded image, and
+        rejects invalid requests.
+        """
+        self.hash_scans()
+        url = reverse('photo:api-similar')
+        upload = image_file(draw_scene(0))
+        upload.name = 'query.png'
+        self.assertEqual(self.client.post(url, {'image': upload}).status_code,
+                         302)
+
+        self.client.login(username="admin", password="password")
+        upload.seek(0)
+        response = self.client.post(url, {'image': upload, 'distance': 8,
+                                          'kind': 'frame'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['algorithm'], 'phash')
+        self.assertEqual(len(data['hash']), 16)
+        self.assertEqual([result['owner'] for result in data['results']],
+                         [str(self.frames[0].pk)])
+
+        upload.seek(0)
+        response = self.client.post(url, {'image': upload, 'kind': 'print'})
+        self.assertEqual(response.json()['results'], [])
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        not_image = io.BytesIO(b'not an image')
+        not_image.name = 'query.png'
+        self.assertEqual(self.client.post(url, {'image': not_image})
+                         .status_code, 400)
+        with open(os.path.join(self.root, save_broken_png(
+                self.root, 'frames')), 'rb') as broken_image:
+            self.assertEqual(self.client.post(url, {'image': broken_image})
+                             .status_code, 400)
+        upload.seek(0)
+        self.assertEqual(self.client.post(url, {'image': upload,
+                                                'algorithm': 'md5'})
+                         .status_code, 400)
@@ -0,0 +1,91 @@
+"""
+Tests for photo.storage and photo.uploads
+"""
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from photo import storage, uploads
+from photo.tests.mixins import TemporaryRootMixin
+
+
+class HashingUploadHandlerTestCase(TestCase):
+    """
+    Tests for uploads.HashingUploadHandler
+    """
+    def test_hash(self):
+        """
+        Verify the uploaded file is hashed as it is received.
+        """
+        handler = uploads.HashingUploadHandler()
+        handler.new_file('scan', 'scan.tif', 'image/tiff', 6)
+        handler.receive_data_chunk(b'abc', 0)
+        handler.receive_data_chunk(b'def', 3)
+        uploaded_file = handler.file_complete(6)
+        self.assertEqual(uploaded_file.read(), b'abcdef')
+        self.assertEqual(uploaded_file.content_hash,
+                         hashlib.sha256(b'abcdef').hexdigest())
+        self.assertEqual(uploads.hash_file(uploaded_file),
+                         uploaded_file.content_hash)
+        uploaded_file.close()
+
+    def test_hash_file(self):
+        """
+        Verify files without a stored hash are hashed.
+        """
+        self.assertEqual(uploads.hash_file(ContentFile(b'abcdef')),
+                         hashlib.sha256(b'abcdef').hexdigest())
+
+class DeduplicatingStorageTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for storage.DeduplicatingStorage
+    """
+    def setUp(self):
+        super().setUp()
+        self.storage = storage.DeduplicatingStorage(location=self.root)
+
+    def test_deduplicated(self):
+        """
+        Verify identical files share one stored blob.
+        """
+        name_1 = self.storage.save('frames/1.tif', ContentFile(b'scan'))
+        name_2 = self.storage.save('prints/2.tif', ContentFile(b'scan'))
+        name_3 = self.storage.save('prints/3.tif', ContentFile(b'other'))
+        self.assertEqual((name_1, name_2, name_3),
+                         ('frames/1.tif', 'prints/2.tif', 'prints/3.tif'))
+        self.assertTrue(os.path.samefile(self.storage.path(name_1),
+                                         self.storage.path(name_2)))
+        self.assertEqual(self.storage.references(name_1), 2)
+        self.assertEqual(self.storage.references(name_3), 1)
+        with self.storage.open(name_2) as stored_file:
+            self.assertEqual(stored_file.read(), b'scan')
+        self.assertTrue(self.storage.exists(storage.DeduplicatingStorage
+                                            .blob_name(hashlib.sha256(
+                                                b'scan').hexdigest())))
+
+    def test_existing_name(self):
+        """
+        Verify saving over an existing name gets a new name.
+        """
+        self.storage.save('frames/1.tif', ContentFile(b'scan'))
+        name = self.storage.save('frames/1.tif', ContentFile(b'scan'))
+        self.assertNotEqual(name, 'frames/1.tif')
+        self.assertEqual(self.storage.references(name), 2)
+
+    def test_delete(self):
+        """
+        Verify the blob is removed with its last reference.
+        """
+        name_1 = self.storage.save('frames/1.tif', ContentFile(b'scan'))
+        name_2 = self.storage.save('frames/2.tif', ContentFile(b'scan'))
+        blob_name = storage.DeduplicatingStorage.blob_name(
+            hashlib.sha256(b'scan').hexdigest())
+        self.storage.delete(name_1)
+        self.assertFalse(self.storage.exists(name_1))
+        self.assertTrue(self.storage.exists(blob_name))
+        self.assertEqual(self.storage.references(name_2), 1)
+        self.storage.delete(name_2)
+        self.assertFalse(self.storage.exists(blob_name))
+        self.storage.delete(name_2)
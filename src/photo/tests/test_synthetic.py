@@ -0,0 +1,148 @@
+"""
+Tests for photo.synthetic and the benchmarks
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils.six import StringIO
+
+from photo import benchmarks
+from photo.compatibility import compatibility
+from photo.imports import import_film_rolls, import_prints
+from photo.models import FilmRoll, Frame, Print
+from photo.synthetic import CatalogGenerator, seed_catalog
+
+
+class SeedCatalogTestCase(TestCase):
+    """
+    Test cases for seed_catalog and CatalogGenerator.
+    """
+
+    def setUp(self):
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    def test_seed_catalog(self):
+        """Test that a valid catalog is created with frames for every
+        roll."""
+        counts = seed_catalog(rolls=20, chunk_size=7)
+        self.assertEqual(counts, (FilmRoll.objects.count(),
+                                  Frame.objects.count(),
+                                  Print.objects.count()))
+        self.assertEqual(counts[0], 20)
+        for film_roll in FilmRoll.objects.select_related('format'):
+            self.assertIn(film_roll.frame_set.count(),
+                          (36, 37, 24, 25, 12, 13, 10, 11, 16, 17, 1))
+        for print_obj in Print.objects.all():
+            print_obj.full_clean()
+            self.assertGreater(print_obj.date,
+                               print_obj.frame.film_roll.developed_date)
+
+    def test_deterministic(self):
+        """Test that a seed always generates the same rolls and prints."""
+        seed_catalog(rolls=5)
+        self.assertEqual(CatalogGenerator(seed=3).import_rows(10),
+                         CatalogGenerator(seed=3).import_rows(10))
+        self.assertNotEqual(CatalogGenerator(seed=3).import_rows(10),
+                            CatalogGenerator(seed=4).import_rows(10))
+
+    def test_import_rows(self):
+        """Test that generated import rows can be imported."""
+        seed_catalog(rolls=5)
+        roll_rows, print_rows = CatalogGenerator(
+            seed=1, name_prefix='I', print_rate=0.5).import_rows(5)
+        self.assertEqual(len(import_film_rolls(roll_rows)), 5)
+        self.assertEqual(len(import_prints(print_rows)), len(print_rows))
+
+
+class BenchmarkTestCase(TestCase):
+    """
+    Test cases for the database benchmarks and the benchmark command.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(rolls=3)
+
+    def setUp(self):
+        # changes are rolled back without signals after each test
+        self.addCleanup(compatibility.invalidate)
+
+    def test_changelists(self):
+        """Test that every changelist is timed."""
+        results = benchmarks.changelist_times(repeat=1)
+        self.assertEqual(len(results), len(benchmarks.CHANGELISTS) * 2)
+        self.assertEqual(results[0][0], benchmarks.CHANGELISTS[0][0])
+
+    def test_without_admin_indexes(self):
+        """Test that only the admin indexes are dropped, and are restored."""
+        def index_count():
+            with connection.schema_editor() as editor:
+                # pylint: disable=protected-access
+                return [len(benchmarks._index_names(editor, model, fields))
+                        for model, fields, _ in benchmarks.ADMIN_INDEXES]
+
+        self.assertEqual(index_count(), [1] * len(benchmarks.ADMIN_INDEXES))
+        with benchmarks.without_admin_indexes():
+            self.assertEqual(index_count(),
+                             [0] * len(benchmarks.ADMIN_INDEXES))
+            # the rest of the schema is still migrated
+            benchmarks.changelist_times(repeat=1)
+        self.assertEqual(index_count(), [1] * len(benchmarks.ADMIN_INDEXES))
+
+    def test_model_clean(self):
+        """Test that model validation is timed."""
+        self.assertEqual([label for label, _ in benchmarks.model_clean(2)],
+                         ['FilmRoll.clean', 'FilmRoll.full_clean',
+                          'Print.clean', 'Print.full_clean'])
+
+    def test_bulk_ingest(self):
+        """Test that ingest is timed, and imports the rolls."""
+        rolls = FilmRoll.objects.count()
+        results = benchmarks.bulk_ingest(rolls=2, repeat=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(FilmRoll.objects.count(), rolls + 4)
+
+    def test_command_output(self):
+        """Test that the benchmark command appends JSON results."""
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        for _ in range(2):
+            call_command('benchmark', 'point_multiplier_table', output=path,
+                         stdout=StringIO())
+        with open(path) as output:
+            records = [json.loads(line) for line in output]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(list(records[0]['results']),
+                         ['point_multiplier_table'])
+        self.assertEqual(len(records[0]['results']['point_multiplier_table']),
+                         2)
+
+
+class ChangelistsCommandTestCase(SimpleTestCase):
+    """
+    Test cases for the benchmark_changelists command.
+    """
+
+    def test_command(self):
+        """
+        Test that the command runs against the whole migration history.
+
+        The command creates its own test database, so it is run in a
+        separate process.
+        """
+        output = subprocess.check_output(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+             'benchmark_changelists', '--rolls', '2', '--repeat', '1'],
+            stderr=subprocess.STDOUT, universal_newlines=True)
+        lines = output.splitlines()
+        self.assertEqual(len(lines), len(benchmarks.CHANGELISTS) * 2 + 1)
+        self.assertIn('frames by format', lines[3])
@@ -0,0 +1,279 @@
+"""
+Tests for photo.tiles
+"""
+import os
+import struct
+import uuid
+from unittest import mock
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from PIL import Image, ImageChops
+
+from photo import tiles
+from photo.tests.mixins import MediaRootMixin, TemporaryRootMixin
+
+
+def save_gradient(root, directory, size=(1000, 600), extension='tif',
+                  **params):
+    """
+    Save a test image with a different colour in every pixel under a media
+    root, returning its name.
+    """
+    name = os.path.join(directory, '{}.{}'.format(uuid.uuid4().hex,
+                                                  extension))
+    os.makedirs(os.path.join(root, directory), exist_ok=True)
+    ramp = bytes(range(256))
+    image = Image.merge('RGB', (
+        Image.frombytes('L', (256, 1), ramp).resize(size, Image.BILINEAR),
+        Image.frombytes('L', (1, 256), ramp).resize(size, Image.BILINEAR),
+        Image.new('L', size, 128)))
+    image.save(os.path.join(root, name), **params)
+    return name
+
+def save_striped_tiff(path, image, rows_per_strip=16, gap=0):
+    """
+    Save an 8-bit grayscale or RGB image as an uncompressed little-endian
+    TIFF, split into strips as scanner software writes them, which Pillow
+    does not, with a gap of a number of bytes after each strip.
+    """
+    width, height = image.size
+    samples = len(image.getbands())
+    data = image.tobytes()
+    row_bytes = width * samples
+    strips = [data[row * row_bytes:(row + rows_per_strip) * row_bytes]
+              for row in range(0, height, rows_per_strip)]
+    tags = 10
+    # header, then the directory, the strip offsets and byte counts, and
+    # the bits of each sample
+    offsets_at = 8 + 2 + tags * 12 + 4
+    counts_at = offsets_at + 4 * len(strips)
+    bits_at = counts_at + 4 * len(strips)
+    data_at = bits_at + 2 * samples
+    offsets = []
+    for strip in strips:
+        offsets.append(data_at)
+        data_at += len(strip) + gap
+    entries = [
+        (256, 4, 1, width), (257, 4, 1, height),
+        (258, 3, samples, 8 if samples == 1 else bits_at),
+        (259, 3, 1, 1), (262, 3, 1, 2 if samples == 3 else 1),
+        (273, 4, len(strips), offsets_at), (277, 3, 1, samples),
+        (278, 4, 1, rows_per_strip), (279, 4, len(strips), counts_at),
+        (284, 3, 1, 1)]
+    with open(path, 'wb') as tiff:
+        tiff.write(b'II*\x00' + struct.pack('<I', 8))
+        tiff.write(struct.pack('<H', tags))
+        for tag, field_type, count, value in entries:
+            tiff.write(struct.pack('<HHII', tag, field_type, count, value))
+        tiff.write(struct.pack('<I', 0))
+        tiff.write(struct.pack('<{}I'.format(len(strips)), *offsets))
+        tiff.write(struct.pack('<{}I'.format(len(strips)),
+                               *(len(strip) for strip in strips)))
+        tiff.write(struct.pack('<{}H'.format(samples), *[8] * samples))
+        for strip in strips:
+            tiff.write(strip + b'\x00' * gap)
+
+def read_image(path):
+    """
+    Read an image, closing its file.
+    """
+    with open(path, 'rb') as image_file:
+        image = Image.open(image_file)
+        image.load()
+    return image
+
+class TilePyramidTestCase(TestCase):
+    """
+    Tests for tiles.TilePyramid
+    """
+    def test_levels(self):
+        """Verify the levels and tiles follow the Deep Zoom layout."""
+        pyramid = tiles.TilePyramid(1000, 600, tile_size=254, overlap=1)
+        self.assertEqual(pyramid.max_level, 10)
+        self.assertEqual(pyramid.level_size(10), (1000, 600))
+        self.assertEqual(pyramid.level_size(9), (500, 300))
+        self.assertEqual(pyramid.level_size(0), (1, 1))
+        self.assertEqual(pyramid.tile_counts(10), (4, 3))
+        self.assertEqual(pyramid.tile_box(10, 0, 0), (0, 0, 255, 255))
+        self.assertEqual(pyramid.tile_box(10, 1, 2), (253, 507, 509, 600))
+        self.assertEqual(pyramid.tile_box(10, 3, 0), (761, 0, 1000, 255))
+        for level, column, row in ((11, 0, 0), (10, 4, 0), (9, 0, 2),
+                                   (-1, 0, 0)):
+            with self.assertRaises(ValueError):
+                pyramid.tile_box(level, column, row)
+        self.assertIn('TileSize="254" Overlap="1" Format="jpg">'
+                      '<Size Width="1000" Height="600"/>',
+                      pyramid.descriptor())
+
+class LoadRegionTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for tiles.load_region
+    """
+    def test_striped_tiff(self):
+        """
+        Verify only the strips of a TIFF overlapping a region are decoded,
+        and the region matches the full image.
+        """
+        path = os.path.join(self.root, save_gradient(self.root, 'frames'))
+        full = read_image(path)
+        save_striped_tiff(path, full)
+        full = full.crop((100, 250, 400, 300))
+        with open(path, 'rb') as image_file:
+            image = Image.open(image_file)
+            strips = len(image.tile)
+            self.assertGreater(strips, 1)
+            region = tiles.load_region(image, (100, 250, 400, 300))
+            self.assertLess(len(image.tile), strips)
+            self.assertLess(image.size[1], 600)
+            self.assertEqual(region.size, (300, 50))
+            self.assertIsNone(ImageChops.difference(region, full).getbbox())
+
+    def test_single_part(self):
+        """Verify an image in one part is cropped after a full decode."""
+        path = os.path.join(self.root, save_gradient(self.root, 'frames',
+                                                     extension='png'))
+        with open(path, 'rb') as image_file:
+            image = Image.open(image_file)
+            region = tiles.load_region(image, (10, 20, 30, 40))
+            self.assertEqual(region.size, (20, 20))
+            self.assertEqual(image.size, (1000, 600))
+
+class TileCacheTestCase(TemporaryRootMixin, TestCase):
+    """
+    Tests for tiles.TileCache
+    """
+    def setUp(self):
+        super().setUp()
+        self.cache = tiles.TileCache(self.root, tile_size=254, overlap=1,
+                                     max_size=10 ** 7)
+
+    def test_render_row(self):
+        """
+        Verify a tile's row is rendered and cached next to its source, and
+        matches the source at full size.
+        """
+        name = save_gradient(self.root, 'frames')
+        save_striped_tiff(os.path.join(self.root, name),
+                          read_image(os.path.join(self.root, name)))
+        path = self.cache.get(name, 10, 1, 1)
+        self.assertEqual(os.path.dirname(os.path.dirname(
+            os.path.dirname(path))), os.path.join(self.root, 'frames',
+                                                  'tiles'))
+        row = sorted(os.listdir(os.path.dirname(path)))
+        self.assertEqual(row, ['0_1.jpg', '1_1.jpg', '2_1.jpg', '3_1.jpg'])
+        tile = read_image(path)
+        self.assertEqual(tile.size, (256, 256))
+        self.assertEqual(tile.format, 'JPEG')
+        expected = read_image(os.path.join(self.root, name)).crop(
+            (253, 253, 509, 509))
+        difference = ImageChops.difference(tile.convert('RGB'), expected)
+        self.assertLess(max(high for _, high in difference.getextrema()), 16)
+
+        with open(path, 'ab') as tile_file:
+            tile_file.write(b'cached')
+        self.assertEqual(self.cache.get(name, 10, 1, 1), path)
+        with open(path, 'rb') as tile_file:
+            self.assertTrue(tile_file.read().endswith(b'cached'))
+
+    def test_reduced_levels(self):
+        """Verify lower levels are scaled down, from JPEG sources too."""
+        name = save_gradient(self.root, 'prints', extension='jpg')
+        self.assertEqual(read_image(self.cache.get(name, 9, 1, 0)).size,
+                         (247, 255))
+        self.assertEqual(read_image(self.cache.get(name, 0, 0, 0)).size,
+                         (1, 1))
+        with self.assertRaises(ValueError):
+            self.cache.get(name, 9, 2, 0)
+
+    def test_missing_tile(self):
+        """Verify a tile outside its level is rejected without rendering."""
+        name = save_gradient(self.root, 'frames')
+        with mock.patch('photo.tiles.render_row') as render_row:
+            for level, column, row in ((10, 4, 0), (10, 0, 3), (11, 0, 0)):
+                with self.assertRaises(ValueError):
+                    self.cache.get(name, level, column, row)
+        self.assertFalse(render_row.called)
+
+    def test_invalidated(self):
+        """Verify a changed source gets a new pyramid."""
+        name = save_gradient(self.root, 'contacts')
+        directory = self.cache.pyramid_directory(name)
+        self.cache.get(name, 8, 0, 0)
+        Image.new('RGB', (300, 200)).save(os.path.join(self.root, name))
+        self.cache.get(name, 8, 0, 0)
+        self.assertNotEqual(self.cache.pyramid_directory(name), directory)
+        self.assertFalse(os.path.exists(directory))
+
+    def test_evict(self):
+        """Verify the least recently used pyramids are evicted."""
+        directories = []
+        for index in range(3):
+            name = save_gradient(self.root, 'frames', size=(200, 200))
+            self.cache.get(name, 8, 0, 0)
+            directory = self.cache.pyramid_directory(name)
+            os.utime(directory, (index, index))
+            directories.append(directory)
+        sizes = {directory: size
+                 for _, size, directory in self.cache.cached_pyramids()}
+        self.cache.max_size = sizes[directories[2]] * 2
+        self.cache.evict()
+        self.assertEqual([os.path.exists(directory)
+                          for directory in directories],
+                         [False, True, True])
+
+    def test_usage(self):
+        """
+        Verify the running total of the cache's size is kept, and pyramids
+        are only evicted once it is over the maximum size.
+        """
+        directories = []
+        for _ in range(2):
+            name = save_gradient(self.root, 'frames', size=(200, 200))
+            self.cache.get(name, 8, 0, 0)
+            directories.append(self.cache.pyramid_directory(name))
+        sizes = {directory: size
+                 for _, size, directory in self.cache.cached_pyramids()}
+        self.assertEqual(self.cache.usage.add(0), sum(sizes.values()))
+        os.utime(directories[0], (0, 0))
+        self.cache.max_size = sum(sizes.values())
+        name = save_gradient(self.root, 'frames', size=(200, 200))
+        self.cache.get(name, 8, 0, 0)
+        directories.append(self.cache.pyramid_directory(name))
+        self.assertEqual([os.path.exists(directory)
+                          for directory in directories],
+                         [False, True, True])
+        self.assertEqual(self.cache.usage.add(0), sum(
+            size for _, size, _ in self.cache.cached_pyramids()))
+
+class TileViewTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for views.tile_descriptor and views.tile
+    """
+    def test_views(self):
+        """Verify the descriptor and tiles are served."""
+        name = save_gradient(self.root, 'frames')
+        response = self.client.get(reverse('photo:tile-descriptor',
+                                           kwargs={'name': name}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertIn(b'Width="1000" Height="600"', response.content)
+
+        response = self.client.get(reverse(
+            'photo:tile', kwargs={'name': name, 'level': 10, 'column': 3,
+                                  'row': 2}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response.close()
+
+    def test_not_found(self):
+        """Verify a missing source or tile is not found."""
+        response = self.client.get(reverse(
+            'photo:tile-descriptor', kwargs={'name': 'frames/missing.tif'}))
+        self.assertEqual(response.status_code, 404)
+        name = save_gradient(self.root, 'frames')
+        for level, column, row in ((10, 4, 0), (10, 0, 3), (11, 0, 0)):
+            response = self.client.get(reverse(
+                'photo:tile', kwargs={'name': name, 'level': level,
+                                      'column': column, 'row': row}))
+            self.assertEqual(response.status_code, 404)
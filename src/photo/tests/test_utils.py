@@ -284,3 +284,254 @@ class StopTimeConversionTestCase(TestCase):
             utils.StopTimeConversion.resize_print_in_stops(
                 old_print, new_print),
             - 2)
+
+class StopTimeConversionBatchTestCase(TestCase):
+    """Tests for the batch methods of utils.StopTimeConversion."""
+    def test_exception_times_difference_in_stops(self):
+        """
+        Verify exception for invalid values in
+        StopTimeConversion.times_difference_in_stops.
+        """
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.times_difference_in_stops([1, 0], 1)
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.times_difference_in_stops(1, [1, -1])
+
+    def test_exception_adjust_times(self):
+        """
+        Verify exception for invalid values in
+        StopTimeConversion.adjust_times_by_stops and adjust_times_by_points.
+        """
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.adjust_times_by_stops([12, 0], 1)
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.adjust_times_by_points([12, -1], 1)
+
+    def test_exception_length_mismatch(self):
+        """
+        Verify exception for sequences of different lengths.
+        """
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.adjust_times_by_stops([1, 2], [1, 2, 3])
+
+    def test_times_difference_in_stops(self):
+        """
+        Verify values returned by
+        StopTimeConversion.times_difference_in_stops.
+        """
+        self.assertEqual(
+            list(utils.StopTimeConversion.times_difference_in_stops(
+                [6, 12, 12], [12, 12, 6])),
+            [1, 0, -1])
+
+    def test_times_difference_in_points(self):
+        """
+        Verify values returned by
+        StopTimeConversion.times_difference_in_points.
+        """
+        self.assertEqual(
+            list(utils.StopTimeConversion.times_difference_in_points(
+                12, [24, 12, 6])),
+            [12, 0, -12])
+
+    def test_multipliers(self):
+        """
+        Verify values returned by
+        StopTimeConversion.stop_differences_to_multipliers and
+        point_differences_to_multipliers.
+        """
+        self.assertEqual(
+            list(utils.StopTimeConversion.stop_differences_to_multipliers(
+                [1, 0, -1])),
+            [2, 1, 0.5])
+        self.assertEqual(
+            list(utils.StopTimeConversion.point_differences_to_multipliers(
+                [12, 0, -12])),
+            [2, 1, 0.5])
+
+    def test_adjust_times_match_scalar(self):
+        """
+        Verify StopTimeConversion.adjust_times_by_stops and
+        adjust_times_by_points match their scalar equivalents.
+        """
+        times = [4, 12.5, 30]
+        adjustments = [-1.5, 0.25, 2]
+        by_stops = utils.StopTimeConversion.adjust_times_by_stops(
+            times, adjustments)
+        by_points = utils.StopTimeConversion.adjust_times_by_points(
+            times, adjustments)
+        for index, (time, adjustment) in enumerate(zip(times, adjustments)):
+            self.assertAlmostEqual(
+                by_stops[index],
+                utils.StopTimeConversion.adjust_time_by_stops(
+                    time, adjustment))
+            self.assertAlmostEqual(
+                by_points[index],
+                utils.StopTimeConversion.adjust_time_by_points(
+                    time, adjustment))
+
+    def test_array_fallback(self):
+        """
+        Verify the batch methods work without numpy.
+        """
+        saved_numpy = utils.numpy
+        utils.numpy = None
+        try:
+            self.assertEqual(
+                list(utils.StopTimeConversion.adjust_times_by_stops(
+                    12, [1, 0, -1])),
+                [24, 12, 6])
+            with self.assertRaises(ValueError):
+                utils.StopTimeConversion.adjust_times_by_points([12, 0], 1)
+        finally:
+            utils.numpy = saved_numpy
+
+class PointMultiplierTableTestCase(TestCase):
+    """Tests for utils.PointMultiplierTable."""
+    def test_table_size(self):
+        """
+        Verify the table stores every step in the configured range.
+        """
+        table = utils.PointMultiplierTable(limit=12, steps_per_point=2)
+        self.assertEqual(len(table), 49)
+
+    def test_identical_in_range(self):
+        """
+        Verify table lookups are identical to the exact computation.
+        """
+        table = utils.PointMultiplierTable(limit=12)
+        for step in range(-24, 25):
+            points = step / 2
+            self.assertEqual(table.multiplier(points), 2 ** (points / 12))
+            self.assertEqual(table.multiplier(step), 2 ** (step / 12))
+
+    def test_identical_out_of_range(self):
+        """
+        Verify points outside of the table or off a step are computed.
+        """
+        table = utils.PointMultiplierTable(limit=12)
+        for points in (-13, 13, 100, 0.25, 1 / 3):
+            self.assertEqual(table.multiplier(points), 2 ** (points / 12))
+
+    def test_stop_time_conversion_uses_table(self):
+        """
+        Verify StopTimeConversion.point_difference_to_multiplier gives the
+        same results with and without the table.
+        """
+        saved_table = utils.StopTimeConversion.point_table
+        try:
+            utils.StopTimeConversion.point_table = None
+            exact = [utils.StopTimeConversion.point_difference_to_multiplier(
+                step / 2) for step in range(-200, 201)]
+            exact_times = [utils.StopTimeConversion.adjust_time_by_points(
+                12, step / 2) for step in range(-200, 201)]
+            utils.StopTimeConversion.point_table = (
+                utils.PointMultiplierTable())
+            table = [utils.StopTimeConversion.point_difference_to_multiplier(
+                step / 2) for step in range(-200, 201)]
+            table_times = [utils.StopTimeConversion.adjust_time_by_points(
+                12, step / 2) for step in range(-200, 201)]
+        finally:
+            utils.StopTimeConversion.point_table = saved_table
+        self.assertEqual(exact, table)
+        self.assertEqual(exact_times, table_times)
+
+class ExposureSeriesTestCase(TestCase):
+    """Tests for utils.StopTimeConversion.exposure_series."""
+    def test_exceptions(self):
+        """
+        Verify exceptions for invalid arguments.
+        """
+        with self.assertRaises(ValueError):
+            list(utils.StopTimeConversion.exposure_series(0, 1, 3))
+        with self.assertRaises(ValueError):
+            list(utils.StopTimeConversion.exposure_series(
+                10, 1, 3, unit='seconds'))
+        with self.assertRaises(ValueError):
+            list(utils.StopTimeConversion.exposure_series(
+                10, -1, 3, cumulative=True))
+
+    def test_incremental_stops(self):
+        """
+        Verify an incremental series in stops.
+        """
+        series = list(utils.StopTimeConversion.exposure_series(
+            4, 1, 3, start=-1))
+        self.assertEqual([step.adjustment for step in series], [-1, 0, 1])
+        self.assertEqual([step.time for step in series], [2, 4, 8])
+        self.assertEqual([step.delta for step in series], [2, 4, 8])
+
+    def test_cumulative_points(self):
+        """
+        Verify a cumulative series in points.
+        """
+        series = list(utils.StopTimeConversion.exposure_series(
+            4, 12, 3, unit='points', cumulative=True))
+        self.assertEqual([step.index for step in series], [0, 1, 2])
+        self.assertEqual([step.time for step in series], [4, 8, 16])
+        self.assertEqual([step.delta for step in series], [4, 4, 8])
+
+    def test_unbounded(self):
+        """
+        Verify a series without a number of steps is generated lazily.
+        """
+        series = utils.StopTimeConversion.exposure_series(1, 1)
+        self.assertEqual([next(series).time for _ in range(5)],
+                         [1, 2, 4, 8, 16])
+
+class PrintResizeTestCase(TestCase):
+    """
+    Tests for utils.PrintSize and utils.StopTimeConversion.plan_print_resizes.
+    """
+    def test_coerce(self):
+        """
+        Verify PrintSize.coerce accepts dictionaries, tuples and PrintSizes.
+        """
+        size = utils.PrintSize(4, 6)
+        self.assertIs(utils.PrintSize.coerce(size), size)
+        self.assertEqual(utils.PrintSize.coerce({'x':4, 'y':6}), size)
+        self.assertEqual(utils.PrintSize.coerce((4, 6)), size)
+
+    def test_resize_print_with_print_size(self):
+        """
+        Verify StopTimeConversion.resize_print_in_stops accepts PrintSizes.
+        """
+        self.assertEqual(
+            utils.StopTimeConversion.resize_print_in_stops(
+                utils.PrintSize(4, 6), utils.PrintSize(8, 10)),
+            2)
+
+    def test_plan_print_resizes(self):
+        """
+        Verify values returned by StopTimeConversion.plan_print_resizes.
+        """
+        plans = utils.StopTimeConversion.plan_print_resizes(
+            {'x':4, 'y':6}, 10, [{'x':8, 'y':12}, (4, 5), (3, 6)])
+        self.assertEqual([plan.size for plan in plans],
+                         [(8, 12), (4, 5), (3, 6)])
+        self.assertEqual([plan.stops for plan in plans], [2, 0, 0])
+        self.assertEqual([plan.time for plan in plans], [40, 10, 10])
+
+    def test_plan_print_resizes_matches_resize(self):
+        """
+        Verify StopTimeConversion.plan_print_resizes agrees with
+        resize_print_in_stops and adjust_time_by_stops.
+        """
+        old_size = {'x':5, 'y':7}
+        new_sizes = [{'x':8, 'y':10}, {'x':11, 'y':14}, {'x':3.5, 'y':5}]
+        plans = utils.StopTimeConversion.plan_print_resizes(
+            old_size, 12, new_sizes)
+        for plan, new_size in zip(plans, new_sizes):
+            stops = utils.StopTimeConversion.resize_print_in_stops(
+                old_size, new_size)
+            self.assertEqual(plan.stops, stops)
+            self.assertAlmostEqual(
+                plan.time,
+                utils.StopTimeConversion.adjust_time_by_stops(12, stops))
+
+    def test_exception_plan_print_resizes(self):
+        """
+        Verify exception for invalid base time.
+        """
+        with self.assertRaises(ValueError):
+            utils.StopTimeConversion.plan_print_resizes((4, 6), 0, [(8, 12)])
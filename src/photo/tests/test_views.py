@@ -0,0 +1,134 @@
+"""
+Tests for views in the photo application.
+"""
+import os
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from photo import views
+from photo.tests.mixins import MediaRootMixin
+
+
+class ParseRangeTestCase(TestCase):
+    """
+    Tests for views.parse_range
+    """
+    def test_ranges(self):
+        """
+        Verify byte ranges are parsed.
+        """
+        self.assertEqual(views.parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(views.parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(views.parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(views.parse_range('bytes=500-5000', 1000),
+                         (500, 999))
+
+    def test_ignored(self):
+        """
+        Verify unsupported ranges are ignored.
+        """
+        self.assertIsNone(views.parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(views.parse_range('lines=0-1', 1000))
+        self.assertIsNone(views.parse_range('bytes=-', 1000))
+
+    def test_unsatisfiable(self):
+        """
+        Verify exception for ranges outside the file.
+        """
+        with self.assertRaises(ValueError):
+            views.parse_range('bytes=1000-', 1000)
+        with self.assertRaises(ValueError):
+            views.parse_range('bytes=10-5', 1000)
+
+class MediaViewTestCase(MediaRootMixin, TestCase):
+    """
+    Tests for views.media
+    """
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.root, 'frames'))
+        self.name = 'frames/0123456789abcdef0123456789abcdef.tif'
+        self.content = bytes(range(256)) * 1024
+        with open(os.path.join(self.root, self.name), 'wb') as scan:
+            scan.write(self.content)
+        self.url = reverse('media', kwargs={'name': self.name})
+
+    def test_full(self):
+        """
+        Verify a whole file is served with validators.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/tiff')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith(
+            '"0123456789abcdef0123456789abcdef-'))
+        self.assertIn('Last-Modified', response)
+
+    def test_range(self):
+        """
+        Verify a byte range is served.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[1000:2000])
+        self.assertEqual(response['Content-Range'],
+                         'bytes 1000-1999/{}'.format(len(self.content)))
+        self.assertEqual(response['Content-Length'], '1000')
+
+    def test_unsatisfiable_range(self):
+        """
+        Verify a range outside the file is rejected.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=999999-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range(self):
+        """
+        Verify a range with a stale If-Range gets the whole file.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response.close()
+
+    def test_not_modified(self):
+        """
+        Verify a request with a current ETag is not sent the file again.
+        """
+        response = self.client.get(self.url)
+        response.close()
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_sendfile(self):
+        """
+        Verify sending the file can be offloaded to the web server.
+        """
+        with self.settings(PHOTO_MEDIA_SENDFILE_HEADER='X-Accel-Redirect',
+                           PHOTO_MEDIA_SENDFILE_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected/' + self.name)
+        self.assertEqual(response.content, b'')
+
+    def test_not_found(self):
+        """
+        Verify a missing file is not found.
+        """
+        response = self.client.get(reverse(
+            'media', kwargs={'name': 'prints/missing.tif'}))
+        self.assertEqual(response.status_code, 404)
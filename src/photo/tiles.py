@@ -0,0 +1,347 @@
+"""
+Deep Zoom tile pyramids of scans and contact sheets, for zooming into
+large scans without downloading them.
+
+Level ``n`` of a pyramid is the image scaled to ``ceil(size / 2 ** (max -
+n))``, where the last level is full size and level 0 is one pixel, and each
+level is cut into square tiles of PHOTO_TILE_SIZE pixels, overlapping their
+neighbours by PHOTO_TILE_OVERLAP pixels, as described at
+https://msdn.microsoft.com/library/cc645077.aspx.
+
+Tiles are rendered on first request, a row at a time, and cached under a
+``tiles`` directory next to their source, ie
+``frames/tiles/<uuid>.<key>/<level>/<column>_<row>.jpg`` for
+``frames/<uuid>.tif``, with the same key as derivatives. Only the part of
+the source a row covers is decoded where the format allows it: JPEG sources
+are decoded at a reduced scale, and only the strips or tiles of a TIFF that
+overlap the row are read. As with derivatives, the total size of the cache
+is kept as a running total, and when it goes over the maximum size, the
+least recently used pyramids are evicted.
+
+Settings:
+    PHOTO_TILE_SIZE: the size of the tiles, defaulting to
+        :data:`DEFAULT_TILE_SIZE`.
+    PHOTO_TILE_OVERLAP: the overlap of the tiles, defaulting to
+        :data:`DEFAULT_OVERLAP`.
+    PHOTO_TILE_CACHE_SIZE: the maximum total size of tiles, in bytes,
+        defaulting to :data:`DEFAULT_CACHE_SIZE`.
+"""
+import glob
+import math
+import os
+import shutil
+
+from django.conf import settings
+from PIL import Image
+
+from .derivatives import CacheUsage, DerivativeCache, SOURCE_DIRECTORIES, \
+    derivative_key, save_jpeg
+
+DEFAULT_TILE_SIZE = 254
+DEFAULT_OVERLAP = 1
+DEFAULT_CACHE_SIZE = 4 * 1024 ** 3
+
+TILE_DIRECTORY = 'tiles'
+USAGE_FILE = '.tiles-usage'
+
+DESCRIPTOR = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+              'TileSize="{}" Overlap="{}" Format="jpg">'
+              '<Size Width="{}" Height="{}"/></Image>\n')
+
+
+class TilePyramid(object):
+    """
+    The levels and tiles of a Deep Zoom pyramid of an image.
+    """
+
+    def __init__(self, width, height, tile_size=DEFAULT_TILE_SIZE,
+                 overlap=DEFAULT_OVERLAP):
+        """
+        Args:
+            width: the width of the full size image.
+            height: the height of the full size image.
+            tile_size: the size of the tiles, without their overlap.
+            overlap: the number of pixels tiles overlap their neighbours by.
+        """
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_level = int(math.ceil(math.log(max(width, height, 1), 2)))
+
+    def scale(self, level):
+        """
+        Get how many times smaller than full size a level is.
+        """
+        return 2 ** (self.max_level - level)
+
+    def level_size(self, level):
+        """
+        Get the (width, height) of a level.
+        """
+        scale = self.scale(level)
+        return (int(math.ceil(self.width / scale)),
+                int(math.ceil(self.height / scale)))
+
+    def tile_counts(self, level):
+        """
+        Get the number of (columns, rows) of tiles of a level.
+        """
+        width, height = self.level_size(level)
+        return (int(math.ceil(width / self.tile_size)),
+                int(math.ceil(height / self.tile_size)))
+
+    def tile_box(self, level, column, row):
+        """
+        Get the (left, upper, right, lower) box of a tile in its level,
+        including its overlap, raising ValueError if there is no such tile.
+        """
+        if not 0 <= level <= self.max_level:
+            raise ValueError("No level {}".format(level))
+        columns, rows = self.tile_counts(level)
+        if not (0 <= column < columns and 0 <= row < rows):
+            raise ValueError("No tile {}_{} in level {}".format(column, row,
+                                                               level))
+        width, height = self.level_size(level)
+        left = column * self.tile_size - (self.overlap if column else 0)
+        upper = row * self.tile_size - (self.overlap if row else 0)
+        right = min((column + 1) * self.tile_size + self.overlap, width)
+        lower = min((row + 1) * self.tile_size + self.overlap, height)
+        return left, upper, right, lower
+
+    def descriptor(self):
+        """
+        Get the Deep Zoom XML descriptor of the pyramid.
+        """
+        return DESCRIPTOR.format(self.tile_size, self.overlap, self.width,
+                                 self.height)
+
+
+def load_region(image, box):
+    """
+    Load a region of a lazily opened image, decoding only the parts of the
+    file that overlap it where the file is split into parts, as striped and
+    tiled TIFFs are.
+
+    Args:
+        image: a PIL image that has not been loaded.
+        box: the (left, upper, right, lower) box to load.
+    """
+    left, upper, right, lower = box
+    parts = [part for part in image.tile
+             if part[1][0] < right and part[1][2] > left and
+             part[1][1] < lower and part[1][3] > upper]
+    if 1 < len(image.tile) and parts and len(parts) < len(image.tile):
+        # decode the overlapping parts into an image of their bounding box
+        part_left = min(part[1][0] for part in parts)
+        part_upper = min(part[1][1] for part in parts)
+        part_right = max(part[1][2] for part in parts)
+        part_lower = max(part[1][3] for part in parts)
+        try:
+            image.size = (part_right - part_left, part_lower - part_upper)
+        except AttributeError:
+            # the size cannot be changed in this version of Pillow
+            return image.crop(box)
+        image.tile = [
+            (decoder, (extents[0] - part_left, extents[1] - part_upper,
+                       extents[2] - part_left, extents[3] - part_upper),
+             offset, arguments)
+            for decoder, extents, offset, arguments in parts]
+        return image.crop((left - part_left, upper - part_upper,
+                           right - part_left, lower - part_upper))
+    return image.crop(box)
+
+def render_row(source_path, pyramid, level, row):
+    """
+    Render a row of tiles of a level of a pyramid, returning a list of the
+    tile images in column order.
+
+    Args:
+        source_path: the path of the source image.
+        pyramid: the :class:`TilePyramid` of the source image.
+        level: the level of the row.
+        row: the number of the row.
+    """
+    columns = pyramid.tile_counts(level)[0]
+    boxes = [pyramid.tile_box(level, column, row)
+             for column in range(columns)]
+    left, upper = boxes[0][:2]
+    right, lower = boxes[-1][2:]
+    scale = pyramid.scale(level)
+    with open(source_path, 'rb') as source_file:
+        image = Image.open(source_file)
+        # let JPEG sources decode at a reduced scale
+        image.draft('RGB', pyramid.level_size(level))
+        factor_x = image.size[0] / pyramid.width * scale
+        factor_y = image.size[1] / pyramid.height * scale
+        band = load_region(image, (
+            int(left * factor_x), int(upper * factor_y),
+            min(int(math.ceil(right * factor_x)), image.size[0]),
+            min(int(math.ceil(lower * factor_y)), image.size[1])))
+    if band.mode not in ('RGB', 'L'):
+        band = band.convert('RGB')
+    band = band.resize((right - left, lower - upper), Image.ANTIALIAS)
+    return [band.crop((box_left - left, box_upper - upper,
+                       box_right - left, box_lower - upper))
+            for box_left, box_upper, box_right, box_lower in boxes]
+
+def _directory_size(directory):
+    """
+    Get the total size of the tiles of a pyramid, in bytes.
+    """
+    size = 0
+    for path in glob.glob(os.path.join(directory, '*', '*.jpg')):
+        try:
+            size += os.stat(path).st_size
+        except FileNotFoundError:
+            continue
+    return size
+
+
+class TileCache(object):
+    """
+    Cache of tile pyramids under a media root.
+    """
+
+    def __init__(self, root=None, tile_size=None, overlap=None,
+                 max_size=None):
+        """
+        Args:
+            root: the media root; defaults to the MEDIA_ROOT setting.
+            tile_size: the size of the tiles; defaults to the PHOTO_TILE_SIZE
+                setting.
+            overlap: the overlap of the tiles; defaults to the
+                PHOTO_TILE_OVERLAP setting.
+            max_size: the maximum total size of cached tiles, in bytes;
+                defaults to the PHOTO_TILE_CACHE_SIZE setting.
+        """
+        self.sources = DerivativeCache(root, sizes={}, max_size=0)
+        self.root = self.sources.root
+        if tile_size is None:
+            tile_size = getattr(settings, 'PHOTO_TILE_SIZE',
+                                DEFAULT_TILE_SIZE)
+        if overlap is None:
+            overlap = getattr(settings, 'PHOTO_TILE_OVERLAP', DEFAULT_OVERLAP)
+        if max_size is None:
+            max_size = getattr(settings, 'PHOTO_TILE_CACHE_SIZE',
+                               DEFAULT_CACHE_SIZE)
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_size = max_size
+        self.usage = CacheUsage(os.path.join(self.root, USAGE_FILE))
+
+    def pyramid(self, name):
+        """
+        Get the :class:`TilePyramid` of a source file, reading only its
+        header.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+        """
+        with open(self.sources.source_path(name), 'rb') as source_file:
+            width, height = Image.open(source_file).size
+        return TilePyramid(width, height, self.tile_size, self.overlap)
+
+    def pyramid_directory(self, name):
+        """
+        Get the absolute path of the directory of the current pyramid of a
+        source file.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+        """
+        source_path = self.sources.source_path(name)
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(
+            os.path.dirname(source_path), TILE_DIRECTORY, "{}.{}".format(
+                stem, derivative_key(source_path,
+                                     (self.tile_size, self.overlap))))
+
+    def get(self, name, level, column, row, evict=True):
+        """
+        Get the path of a tile of a source file, rendering its row if it is
+        not cached. Raises ValueError if there is no such tile.
+
+        Args:
+            name: the name of the source file, relative to the media root.
+            level: the level of the tile.
+            column: the column of the tile.
+            row: the row of the tile.
+            evict: whether to evict old pyramids if a row is rendered and
+                the cache is over its maximum size.
+        """
+        directory = self.pyramid_directory(name)
+        path = os.path.join(directory, str(level),
+                            "{}_{}.jpg".format(column, row))
+        if os.path.exists(path):
+            # mark the pyramid as recently used
+            os.utime(directory)
+            return path
+
+        pyramid = self.pyramid(name)
+        # check the tile exists before rendering its whole row
+        pyramid.tile_box(level, column, row)
+        tiles = render_row(self.sources.source_path(name), pyramid, level,
+                           row)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        for tile_column, tile in enumerate(tiles):
+            tile_path = os.path.join(directory, str(level),
+                                     "{}_{}.jpg".format(tile_column, row))
+            save_jpeg(tile, tile_path)
+            size += os.stat(tile_path).st_size
+        os.utime(directory)
+        total = self.usage.add(size - self.remove_stale(directory))
+        if evict and (total is None or total > self.max_size):
+            self.evict()
+        return path
+
+    @staticmethod
+    def remove_stale(directory):
+        """
+        Remove pyramids of the same source as a pyramid, but with a different
+        key, returning the number of bytes removed.
+
+        Args:
+            directory: the directory of the current pyramid.
+        """
+        stem = os.path.basename(directory).split('.')[0]
+        pattern = os.path.join(os.path.dirname(directory),
+                               "{}.*".format(stem))
+        removed = 0
+        for stale_directory in glob.glob(pattern):
+            if stale_directory != directory:
+                removed += _directory_size(stale_directory)
+                shutil.rmtree(stale_directory, ignore_errors=True)
+        return removed
+
+    def cached_pyramids(self):
+        """
+        List the cached pyramids, as (mtime, size, directory) tuples.
+        """
+        pyramids = []
+        for directory in SOURCE_DIRECTORIES:
+            pattern = os.path.join(self.root, directory, TILE_DIRECTORY, '*')
+            for pyramid_directory in glob.glob(pattern):
+                try:
+                    mtime = os.stat(pyramid_directory).st_mtime
+                except FileNotFoundError:
+                    continue
+                pyramids.append((mtime, _directory_size(pyramid_directory),
+                                 pyramid_directory))
+        return pyramids
+
+    def evict(self):
+        """
+        Remove the least recently used pyramids until the cache is no larger
+        than its maximum size.
+        """
+        pyramids = self.cached_pyramids()
+        total = sum(size for _, size, _ in pyramids)
+        for _, size, directory in sorted(pyramids):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+        self.usage.set(total)
@@ -0,0 +1,58 @@
+"""
+Upload handling for scans and contact sheets.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+HASH_ALGORITHM = 'sha256'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_file(file_object):
+    """
+    Compute the content hash of a file, reading it in chunks.
+
+    If the file has already been hashed by :class:`HashingUploadHandler`, the
+    stored hash is returned instead.
+
+    Args:
+        file_object: a django File, or any file object.
+    """
+    content_hash = getattr(file_object, 'content_hash', None)
+    if content_hash is not None:
+        return content_hash
+
+    digest = hashlib.new(HASH_ALGORITHM)
+    if hasattr(file_object, 'chunks'):
+        chunks = file_object.chunks(HASH_CHUNK_SIZE)
+    else:
+        file_object.seek(0)
+        chunks = iter(lambda: file_object.read(HASH_CHUNK_SIZE), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+    file_object.seek(0)
+    return digest.hexdigest()
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler that streams every upload to a temporary file, computing
+    its content hash as the chunks are written.
+
+    The hash is stored as the content_hash attribute of the uploaded file,
+    for :class:`photo.storage.DeduplicatingStorage` to use without reading
+    the file again.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.new(HASH_ALGORITHM) # pylint: disable=attribute-defined-outside-init
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.digest.hexdigest()
+        return uploaded_file
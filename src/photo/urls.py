@@ -0,0 +1,27 @@
+"""
+URL configuration for the photo application.
+"""
+from django.conf.urls import url
+
+from . import api, views
+
+app_name = 'photo' #pylint: disable=invalid-name
+
+urlpatterns = [ #pylint: disable=invalid-name
+    url(r'^derivatives/(?P<size_name>\w+)/'
+        r'(?P<name>(?:contacts|frames|prints)/[\w-]+\.\w+)$',
+        views.derivative, name='derivative'),
+    url(r'^crops/(?P<name>contacts/[\w-]+\.\w+)/'
+        r'(?P<frame_number>\d+)\.jpg$',
+        views.contact_crop, name='contact-crop'),
+    url(r'^tiles/(?P<name>(?:contacts|frames|prints)/[\w-]+\.\w+)\.dzi$',
+        views.tile_descriptor, name='tile-descriptor'),
+    url(r'^tiles/(?P<name>(?:contacts|frames|prints)/[\w-]+\.\w+)_files/'
+        r'(?P<level>\d+)/(?P<column>\d+)_(?P<row>\d+)\.jpg$',
+        views.tile, name='tile'),
+    url(r'^api/similar/$', api.similar_scans, name='api-similar'),
+    url(r'^api/(?P<resource_name>[\w-]+)/$', api.catalog_list,
+        name='api-list'),
+    url(r'^export/(?P<table_name>\w+)\.(?P<file_format>csv|ndjson)$',
+        views.catalog_export, name='export'),
+]
@@ -2,12 +2,53 @@
 Utility classes and functions for the photo application
 '''
 
+import array
+from collections import namedtuple
+import itertools
 import math
 import os
 import uuid
 
 from django.utils.deconstruct import deconstructible
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+# A single step of an exposure series. adjustment is the change from the base
+# time, in the units of the series; time is the total exposure for the step;
+# and delta is the time to set on the timer to reach it.
+ExposureStep = namedtuple('ExposureStep',
+                          ['index', 'adjustment', 'time', 'delta'])
+
+# The result of planning a print resize: the new size, the exposure
+# adjustment in stops, and the new exposure time.
+ResizePlan = namedtuple('ResizePlan', ['size', 'stops', 'time'])
+
+
+class PrintSize(namedtuple('PrintSize', ['x', 'y'])):
+    """
+    A print size, as its x and y dimensions.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def coerce(cls, size):
+        """
+        Convert a print size to a PrintSize.
+
+        Args:
+            size: a PrintSize, a dictionary containing x and y, or an (x, y)
+                tuple.
+        """
+        if isinstance(size, cls):
+            return size
+        if isinstance(size, dict):
+            return cls(size['x'], size['y'])
+        return cls(*size)
+
 
 @deconstructible
 # pylint: disable=too-few-public-methods
@@ -38,9 +79,61 @@ class UploadToPathAndRename(object):
         # return the whole path to the file
         return os.path.join(self.sub_path, filename)
 
+class PointMultiplierTable(dict):
+    """
+    Lookup table of time multipliers for printer's point differences.
+
+    Multipliers are precomputed for every step between -limit and +limit
+    points, by default in half points. Differences outside that range, or
+    not on a step, are computed exactly rather than stored, so results are
+    always identical to ``2 ** (points / 12)``.
+    """
+
+    def __init__(self, limit=60, steps_per_point=2):
+        """
+        Args:
+            limit: the largest point difference, either way, to precompute.
+            steps_per_point: how many table entries to store per point, ie
+                2 for half points.
+        """
+        super().__init__()
+        self.limit = limit
+        self.steps_per_point = steps_per_point
+        for step in range(-limit * steps_per_point,
+                          limit * steps_per_point + 1):
+            points = step / steps_per_point
+            self[points] = self.exact_multiplier(points)
+
+    def __missing__(self, points):
+        return self.exact_multiplier(points)
+
+    @staticmethod
+    def exact_multiplier(points):
+        """
+        Compute the time multiplier for a points difference.
+
+        Args:
+            points: the difference in printer's points.
+        """
+        return 2 ** (points / 12)
+
+    def multiplier(self, points):
+        """
+        Look up the time multiplier for a points difference, computing it if
+        it is not in the table.
+
+        Args:
+            points: the difference in printer's points.
+        """
+        return self[points]
+
 class StopTimeConversion(object):
     """Class for time and stop conversion methods."""
 
+    # lookup table used for points differences; set to None to always
+    # compute multipliers exactly
+    point_table = PointMultiplierTable()
+
     @staticmethod
     def time_difference_in_stops(time_1, time_2):
         """
@@ -90,6 +183,9 @@ class StopTimeConversion(object):
         Args:
             points: the difference in printer's points.
         """
+        table = StopTimeConversion.point_table
+        if table is not None:
+            return table[points]
         return StopTimeConversion.stop_difference_to_multiplier(points / 12)
 
     @staticmethod
@@ -119,6 +215,9 @@ class StopTimeConversion(object):
         if base_time <= 0:
             raise ValueError("Base time must be greater than 0.")
 
+        table = StopTimeConversion.point_table
+        if table is not None:
+            return base_time * table[points]
         multiplier = StopTimeConversion.point_difference_to_multiplier(
             points)
         return base_time * multiplier
@@ -129,38 +228,247 @@ class StopTimeConversion(object):
         Calculates exposure adjustment, in stops, needed to resize a print.
 
         Args:
-            old_size: a dictionary, containing x and y for old print size.
-            new_size: a dictionary, containing x and y for new print size.
-        """
-        old_aspect = old_size['x'] / old_size['y']
-        new_aspect = new_size['x'] / new_size['y']
-
-        aspect_difference = old_aspect - new_aspect
-        if aspect_difference == 0:
-            constant_aspect_new_size = {
-                'x':new_size['x'],
-                'y':new_size['y']}
-            # print("Prints same aspect ratio")
-        elif aspect_difference < 0:
-            # print("new print higher aspect ratio")
-            constant_aspect_new_size = {
-                'x':new_size['x'],
-                'y':old_size['y'] * new_size['x'] / old_size['x']}
-            # print("treating new print as {0}x{1}".format(
-            #    constant_aspect_new_size['x'],
-            #    constant_aspect_new_size['y']))
+            old_size: a PrintSize, or a dictionary containing x and y, for
+                old print size.
+            new_size: a PrintSize, or a dictionary containing x and y, for
+                new print size.
+        """
+        old_x, old_y = PrintSize.coerce(old_size)
+        new_x, new_y = PrintSize.coerce(new_size)
+        return math.log2(_resize_area_ratio(old_x, old_y, new_x, new_y))
+
+    @staticmethod
+    def plan_print_resizes(old_size, base_time, new_sizes):
+        """
+        Calculates exposure adjustments and times to resize one print to
+        several new sizes.
+
+        Returns a list of ResizePlan tuples, in the same order as new_sizes.
+
+        Args:
+            old_size: a PrintSize, or a dictionary containing x and y, for
+                old print size.
+            base_time: the exposure time of the old print.
+            new_sizes: an iterable of PrintSizes, or dictionaries containing
+                x and y, for the new print sizes.
+        """
+        if base_time <= 0:
+            raise ValueError("Base time must be greater than 0.")
+
+        old_x, old_y = PrintSize.coerce(old_size)
+        plans = []
+        for new_size in new_sizes:
+            new_size = PrintSize.coerce(new_size)
+            ratio = _resize_area_ratio(old_x, old_y, new_size.x, new_size.y)
+            # the time multiplier for a change of area is the area ratio
+            # itself, so there is no need to go through stops and back
+            plans.append(ResizePlan(new_size, math.log2(ratio),
+                                    base_time * ratio))
+        return plans
+
+    @staticmethod
+    def times_difference_in_stops(times_1, times_2):
+        """
+        Convert element-wise differences in exposure times to stops.
+
+        Either argument may be a scalar, which is applied to every element of
+        the other.
+
+        Args:
+            times_1: a sequence of base times.
+            times_2: a sequence of new times.
+        """
+        times_1, times_2 = _broadcast(times_1, times_2)
+        if _any_not_positive(times_1) or _any_not_positive(times_2):
+            raise ValueError("Times must be greater than 0.")
+
+        if numpy is not None:
+            return numpy.log2(times_2 / times_1)
+        return array.array('d', (math.log2(new / base) for base, new
+                                 in zip(times_1, times_2)))
+
+    @staticmethod
+    def times_difference_in_points(times_1, times_2):
+        """
+        Convert element-wise differences in exposure times to printer points.
+
+        Args:
+            times_1: a sequence of base times.
+            times_2: a sequence of new times.
+        """
+        stops = StopTimeConversion.times_difference_in_stops(times_1, times_2)
+        return _scale(stops, 12)
+
+    @staticmethod
+    def stop_differences_to_multipliers(stops):
+        """
+        Convert a sequence of stop differences to time multipliers.
+
+        Args:
+            stops: a sequence of differences in stops.
+        """
+        stops = _as_float_array(stops)
+        if numpy is not None:
+            return numpy.power(2.0, stops)
+        return array.array('d', (2 ** stop for stop in stops))
+
+    @staticmethod
+    def point_differences_to_multipliers(points):
+        """
+        Convert a sequence of points differences to time multipliers.
+
+        Args:
+            points: a sequence of differences in printer's points.
+        """
+        return StopTimeConversion.stop_differences_to_multipliers(
+            _scale(_as_float_array(points), 1 / 12))
+
+    @staticmethod
+    def adjust_times_by_stops(base_times, stops):
+        """
+        Adjust exposure times element-wise by differences in stops.
+
+        Either argument may be a scalar, so a single base time can be
+        adjusted by many stop values, or many times by the same adjustment.
+
+        Args:
+            base_times: a sequence of base exposure times to modify.
+            stops: a sequence of changes in exposure, in stops.
+        """
+        base_times, stops = _broadcast(base_times, stops)
+        if _any_not_positive(base_times):
+            raise ValueError("Base time must be greater than 0.")
+
+        multipliers = StopTimeConversion.stop_differences_to_multipliers(
+            stops)
+        return _multiply(base_times, multipliers)
+
+    @staticmethod
+    def adjust_times_by_points(base_times, points):
+        """
+        Adjust exposure times element-wise by differences in points.
+
+        Args:
+            base_times: a sequence of base exposure times to modify.
+            points: a sequence of changes in exposure, in points.
+        """
+        base_times, points = _broadcast(base_times, points)
+        if _any_not_positive(base_times):
+            raise ValueError("Base time must be greater than 0.")
+
+        multipliers = StopTimeConversion.point_differences_to_multipliers(
+            points)
+        return _multiply(base_times, multipliers)
+
+    @staticmethod
+    def exposure_series(base_time, increment, steps=None, start=0,
+                        unit='stops', cumulative=False):
+        """
+        Lazily generate the exposures for a test strip or exposure series.
+
+        Each step is adjusted from the base time by start plus a multiple of
+        increment. For an incremental series every step is exposed
+        separately, so delta is the full time of the step. For a cumulative
+        strip, each step adds to the exposure already given, so delta is the
+        difference from the previous step.
+
+        Args:
+            base_time: the base exposure time.
+            increment: the change in exposure between steps.
+            steps: the number of steps to generate, or None to generate them
+                indefinitely.
+            start: the adjustment of the first step from the base time.
+            unit: 'stops' or 'points', the unit of increment and start.
+            cumulative: whether to generate deltas for a cumulative strip.
+        """
+        if base_time <= 0:
+            raise ValueError("Base time must be greater than 0.")
+        if unit == 'stops':
+            adjust = StopTimeConversion.adjust_time_by_stops
+        elif unit == 'points':
+            adjust = StopTimeConversion.adjust_time_by_points
         else:
-            # print("new print lower aspect ratio")
-            constant_aspect_new_size = {
-                'x':old_size['x'] * new_size['y'] / old_size['y'],
-                'y':new_size['y']}
-            # print("treating new print as {0}x{1}".format(
-            #    constant_aspect_new_size['x'],
-            #    constant_aspect_new_size['y']))
-        old_area = old_size['x'] * old_size['y']
-        new_area = constant_aspect_new_size['x'] * constant_aspect_new_size['y']
-        size_ratio = new_area / old_area
-        return math.log2(size_ratio)
+            raise ValueError("Unit must be 'stops' or 'points'.")
+        if cumulative and increment < 0:
+            raise ValueError("Cumulative series must have increasing times.")
+
+        indexes = itertools.count() if steps is None else range(steps)
+        previous_time = 0
+        for index in indexes:
+            adjustment = start + index * increment
+            time = adjust(base_time, adjustment)
+            if cumulative:
+                delta = time - previous_time
+                previous_time = time
+            else:
+                delta = time
+            yield ExposureStep(index, adjustment, time, delta)
+
+
+def _resize_area_ratio(old_x, old_y, new_x, new_y):
+    """
+    Calculates the ratio of the area of a new print to an old one, cropping
+    the new print to the aspect ratio of the old.
+    """
+    aspect_difference = old_x / old_y - new_x / new_y
+    if aspect_difference == 0:
+        new_area = new_x * new_y
+    elif aspect_difference < 0:
+        # new print higher aspect ratio, so treat it as the width of the new
+        # print at the old aspect ratio
+        new_area = new_x * (old_y * new_x / old_x)
+    else:
+        # new print lower aspect ratio, so treat it as the height of the new
+        # print at the old aspect ratio
+        new_area = (old_x * new_y / old_y) * new_y
+    return new_area / (old_x * old_y)
+
+def _as_float_array(values):
+    """
+    Convert a scalar or sequence to a one-dimensional array of floats, using
+    numpy if it is available and the array module otherwise.
+    """
+    if numpy is not None:
+        return numpy.atleast_1d(numpy.asarray(values, dtype=float))
+    if isinstance(values, (int, float)):
+        values = (values,)
+    return array.array('d', values)
+
+def _broadcast(values_1, values_2):
+    """
+    Convert two arguments to float arrays of the same length, repeating a
+    single-element argument to match the other.
+    """
+    values_1 = _as_float_array(values_1)
+    values_2 = _as_float_array(values_2)
+    if numpy is not None:
+        return numpy.broadcast_arrays(values_1, values_2)
+    if len(values_1) == 1 and len(values_2) != 1:
+        values_1 = values_1 * len(values_2)
+    elif len(values_2) == 1 and len(values_1) != 1:
+        values_2 = values_2 * len(values_1)
+    if len(values_1) != len(values_2):
+        raise ValueError("Sequences must be the same length.")
+    return values_1, values_2
+
+def _any_not_positive(values):
+    """Check whether any element of an array is less than or equal to 0."""
+    if numpy is not None:
+        return bool(numpy.any(values <= 0))
+    return any(value <= 0 for value in values)
+
+def _scale(values, factor):
+    """Multiply every element of an array by a scalar."""
+    if numpy is not None:
+        return values * factor
+    return array.array('d', (value * factor for value in values))
+
+def _multiply(values_1, values_2):
+    """Multiply two arrays of the same length element-wise."""
+    if numpy is not None:
+        return values_1 * values_2
+    return array.array('d', (value_1 * value_2 for value_1, value_2
+                             in zip(values_1, values_2)))
 
 # old_print = {"x":3,"y":6}
 # new_print = {"x":6,"y":12}
@@ -1,6 +1,270 @@
 """
 Views for the photo application.
 """
-from django.shortcuts import render
+import datetime
+import mimetypes
+import os
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, \
+    StreamingHttpResponse
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import condition, require_safe
+
+from .contacts import ContactCropCache
+from .derivatives import DerivativeCache, SOURCE_DIRECTORIES
+from .exports import TABLES, export_lines
+from .models import FilmRoll
+from .tiles import TileCache
+
+# size of the blocks large media files are streamed in
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def derivative(request, size_name, name): # pylint: disable=unused-argument
+    """
+    Serve a derivative image of a scan or contact sheet, rendering it on
+    first request.
+
+    Args:
+        size_name: the name of the derivative size, ie thumbnail.
+        name: the name of the source file, relative to MEDIA_ROOT.
+    """
+    cache = DerivativeCache()
+    if size_name not in cache.sizes:
+        raise Http404("Unknown derivative size")
+    try:
+        path = cache.get(name, size_name)
+    except (ValueError, FileNotFoundError):
+        raise Http404("Source image not found")
+    return FileResponse(open(path, 'rb'), content_type='image/jpeg')
+
+def contact_crop(request, name, frame_number): # pylint: disable=unused-argument
+    """
+    Serve the crop of a frame from its roll's contact sheet, cutting the
+    sheet on first request.
+
+    Args:
+        name: the name of the contact sheet, relative to MEDIA_ROOT.
+        frame_number: the number of the frame, ie 00 or 12.
+    """
+    film_roll = FilmRoll.objects.select_related('format').filter(
+        contact_sheet=name).first()
+    if film_roll is None:
+        raise Http404("Contact sheet not found")
+    index = -1 if frame_number == '00' else int(frame_number)
+    try:
+        path = ContactCropCache().get(film_roll, index)
+    except (ValueError, OSError):
+        raise Http404("Frame not found")
+    return FileResponse(open(path, 'rb'), content_type='image/jpeg')
+
+def tile_descriptor(request, name): # pylint: disable=unused-argument
+    """
+    Serve the Deep Zoom descriptor of the tile pyramid of a scan or contact
+    sheet.
+
+    Args:
+        name: the name of the source file, relative to MEDIA_ROOT.
+    """
+    try:
+        pyramid = TileCache().pyramid(name)
+    except (ValueError, OSError):
+        raise Http404("Source image not found")
+    return HttpResponse(pyramid.descriptor(), content_type='application/xml')
+
+def tile(request, name, level, column, row): # pylint: disable=unused-argument
+    """
+    Serve a tile of the pyramid of a scan or contact sheet, rendering its row
+    on first request.
+
+    Args:
+        name: the name of the source file, relative to MEDIA_ROOT.
+        level: the level of the tile.
+        column: the column of the tile.
+        row: the row of the tile.
+    """
+    try:
+        path = TileCache().get(name, int(level), int(column), int(row))
+    except (ValueError, OSError):
+        raise Http404("Tile not found")
+    return FileResponse(open(path, 'rb'), content_type='image/jpeg')
+
+@require_safe
+@staff_member_required
+def catalog_export(request, table_name, file_format): # pylint: disable=unused-argument
+    """
+    Stream an export of a table of the catalog.
+
+    Args:
+        table_name: the name of the table, ie frames.
+        file_format: 'csv' or 'ndjson'.
+    """
+    if table_name not in TABLES:
+        raise Http404("Unknown table")
+    content_type = {'csv': 'text/csv',
+                    'ndjson': 'application/x-ndjson'}[file_format]
+    response = StreamingHttpResponse(export_lines(table_name, file_format),
+                                     content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+        table_name, file_format)
+    return response
+
+def media_path(name):
+    """
+    Get the absolute path of an uploaded scan or contact sheet, raising
+    Http404 if it is not in one of the upload directories.
+
+    Args:
+        name: the name of the file, relative to MEDIA_ROOT.
+    """
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.relpath(os.path.dirname(path), root) not in SOURCE_DIRECTORIES:
+        raise Http404("File not found")
+    return path
+
+def media_stat(name):
+    """
+    Stat an uploaded file, raising Http404 if it does not exist.
+
+    Args:
+        name: the name of the file, relative to MEDIA_ROOT.
+    """
+    try:
+        return os.stat(media_path(name))
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+def media_etag(request, name): # pylint: disable=unused-argument
+    """
+    Build the ETag of an uploaded file from its UUID filename and its
+    modification time and length, without reading it.
+    """
+    stat = media_stat(name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return "{}-{:x}-{:x}".format(stem, stat.st_mtime_ns, stat.st_size)
+
+def media_last_modified(request, name): # pylint: disable=unused-argument
+    """
+    Get the modification time of an uploaded file, in UTC.
+    """
+    return datetime.datetime.utcfromtimestamp(media_stat(name).st_mtime)
+
+def parse_range(header, length):
+    """
+    Parse a single byte range from a Range header.
+
+    Returns a (start, end) tuple, with end inclusive, or None if the header
+    is not a single byte range, in which case the whole file should be sent.
+    Raises ValueError if the range can not be satisfied.
+
+    Args:
+        header: the value of the Range header.
+        length: the length of the file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # a suffix range, of the last bytes of the file
+        start = max(length - int(end), 0)
+        end = length - 1
+    else:
+        start = int(start)
+        end = length - 1 if end == '' else min(int(end), length - 1)
+    if start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+def read_range(file_object, start, end):
+    """
+    Iterate over the bytes from start to end, inclusive, of a file in
+    chunks, closing it when done.
+    """
+    try:
+        file_object.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file_object.read(min(MEDIA_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_object.close()
+
+def if_range_matches(request, name, stat):
+    """
+    Check whether an If-Range header, if any, matches the current file.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == '"{}"'.format(media_etag(request, name))
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(stat.st_mtime) <= modified
+
+@require_safe
+@condition(etag_func=media_etag, last_modified_func=media_last_modified)
+def media(request, name):
+    """
+    Serve an uploaded scan or contact sheet.
+
+    Files are streamed in chunks, a single byte range may be requested with
+    a Range header, and responses carry an ETag and Last-Modified so they
+    can be revalidated without sending the file again.
+
+    If the PHOTO_MEDIA_SENDFILE_HEADER setting is set, ie to
+    'X-Accel-Redirect' for nginx or 'X-Sendfile' for Apache, sending the
+    file is offloaded to the web server instead. The header's value is the
+    file's name appended to PHOTO_MEDIA_SENDFILE_PREFIX, or its absolute
+    path if that is not set.
+
+    Args:
+        name: the name of the file, relative to MEDIA_ROOT.
+    """
+    path = media_path(name)
+    stat = media_stat(name)
+    content_type = (mimetypes.guess_type(path)[0] or
+                    'application/octet-stream')
+
+    sendfile_header = getattr(settings, 'PHOTO_MEDIA_SENDFILE_HEADER', None)
+    if sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'PHOTO_MEDIA_SENDFILE_PREFIX', None)
+        response[sendfile_header] = path if prefix is None else prefix + name
+        return response
+
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and if_range_matches(request, name,
+                                                         stat):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'],
+                                     stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+            return response
+
+    file_object = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file_object, content_type=content_type)
+        response.block_size = MEDIA_CHUNK_SIZE
+        response['Content-Length'] = stat.st_size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(file_object, start, end), status=206,
+            content_type=content_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end,
+                                                           stat.st_size)
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'photo.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,12 +77,32 @@ WSGI_APPLICATION = 'photo_site.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.9/ref/settings/#databases
 
+# The database is configured from the environment: PHOTO_DB_ENGINE is a
+# backend module, or just its name (sqlite3, postgresql, mysql), and
+# PHOTO_DB_NAME, PHOTO_DB_USER, PHOTO_DB_PASSWORD, PHOTO_DB_HOST and
+# PHOTO_DB_PORT are passed on. Connections are kept open between requests for
+# PHOTO_DB_CONN_MAX_AGE seconds, so each worker thread reuses one connection.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': os.environ.get('PHOTO_DB_ENGINE', 'sqlite3'),
+        'NAME': os.environ.get('PHOTO_DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('PHOTO_DB_USER', ''),
+        'PASSWORD': os.environ.get('PHOTO_DB_PASSWORD', ''),
+        'HOST': os.environ.get('PHOTO_DB_HOST', ''),
+        'PORT': os.environ.get('PHOTO_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('PHOTO_DB_CONN_MAX_AGE', '60')),
     }
 }
+if '.' not in DATABASES['default']['ENGINE']:
+    DATABASES['default']['ENGINE'] = \
+        'django.db.backends.' + DATABASES['default']['ENGINE']
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # seconds to wait for another connection's write lock
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': int(os.environ.get('PHOTO_DB_TIMEOUT', '20')),
+    }
 
 
 # Password validation
@@ -129,3 +150,15 @@ STATIC_URL = '/static/'
 
 MEDIA_ROOT = 'media/'
 MEDIA_URL = '/media/'
+
+# Uploads are streamed to disk and hashed as they arrive, so identical scans
+# can be stored once.
+FILE_UPLOAD_HANDLERS = ['photo.uploads.HashingUploadHandler']
+DEFAULT_FILE_STORAGE = 'photo.storage.DeduplicatingStorage'
+
+# Per-request query counts and timings, sent in a Server-Timing header and
+# logged for the request_report command. The middleware unloads itself when
+# this is off.
+PHOTO_REQUEST_TIMING = False
+PHOTO_REQUEST_TIMING_LOG = os.path.join(os.path.dirname(BASE_DIR), 'metrics',
+                                        'requests.jsonl')
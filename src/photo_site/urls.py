@@ -13,15 +13,23 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
 from django.conf.urls import include, url
 from django.conf.urls.static import static
 from django.contrib import admin
 
+from photo import views as photo_views
+
 
 urlpatterns = [ #pylint: disable=invalid-name
     url(r'^admin/doc/', include('django.contrib.admindocs.urls')),
     url(r'^admin/', admin.site.urls),
+    url(r'^photo/', include('photo.urls')),
+    url(r'^{}(?P<name>(?:contacts|frames|prints)/[\w-]+\.\w+)$'.format(
+        re.escape(settings.MEDIA_URL.lstrip('/'))),
+        photo_views.media, name='media'),
 ]
 
 if settings.DEBUG: